@@ -0,0 +1 @@
+# Benchmarks y stand-ins locales (sin red)
@@ -0,0 +1,57 @@
+"""
+Benchmark: envío uno a uno vs. por lotes contra el stand-in local de recibir-datos.
+
+Ejecutar: python -m bench.bench_batch [--items 200] [--latencia 0.05] [--lote 20] [--ventana 0.2]
+"""
+
+import argparse
+import time
+
+from bench.stub_supabase import StubSupabase
+from services import registraduria_supabase as svc
+from services.result_batcher import ResultBatcher
+
+
+def _payloads(n: int, offset: int):
+    return [
+        svc.construir_payload_resultado(offset + i, str(1000000 + i), True, datos={'mesa': str(i % 30)})
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--latencia', type=float, default=0.05, help='latencia simulada por petición (s)')
+    parser.add_argument('--lote', type=int, default=20)
+    parser.add_argument('--ventana', type=float, default=0.2)
+    args = parser.parse_args()
+
+    stub = StubSupabase(latencia=args.latencia)
+    svc.SUPABASE_FUNCTIONS_URL = stub.start()
+    svc.CONSULTA_API_TOKEN = 'bench'
+    try:
+        t0 = time.perf_counter()
+        oks_uno = [svc.enviar_payload(p) for p in _payloads(args.items, 0)]
+        t_uno = time.perf_counter() - t0
+        peticiones_uno = stub.peticiones['POST recibir-datos']
+
+        batcher = ResultBatcher(svc.enviar_resultados_lote, max_items=args.lote, ventana=args.ventana)
+        t0 = time.perf_counter()
+        futures = [batcher.submit(p) for p in _payloads(args.items, args.items)]
+        oks_lote = [f.result()[0] for f in futures]
+        t_lote = time.perf_counter() - t0
+        batcher.close()
+        peticiones_lote = stub.peticiones['POST recibir-datos'] - peticiones_uno
+    finally:
+        stub.stop()
+
+    print(f"uno a uno: {args.items} items en {t_uno:.2f}s ({args.items / t_uno:.1f} items/s), "
+          f"{peticiones_uno} peticiones, ok={sum(oks_uno)}")
+    print(f"por lotes: {args.items} items en {t_lote:.2f}s ({args.items / t_lote:.1f} items/s), "
+          f"{peticiones_lote} peticiones, ok={sum(oks_lote)}")
+    assert len(stub.recibidos) == 2 * args.items
+
+
+if __name__ == '__main__':
+    main()
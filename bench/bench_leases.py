@@ -0,0 +1,107 @@
+"""
+Benchmark: trabajo duplicado entre réplicas con y sin leases sobre la cola.
+
+Levanta el stand-in local de Supabase y N réplicas (WorkerPipeline en el mismo
+proceso, cada una con su worker_id) con una consulta simulada. Reporta
+consultas ejecutadas vs. filas, y resultados duplicados recibidos.
+
+Ejecutar: python -m bench.bench_leases [--filas 40] [--replicas 3] [--lease 30] [--consulta 0.2]
+"""
+
+import argparse
+import time
+from collections import Counter
+from threading import Lock, Thread
+
+from bench.stub_supabase import StubSupabase
+from services import registraduria_supabase as svc
+from services.lease_manager import LeaseManager
+from services.poller import AdaptivePoller
+from services.worker_pipeline import WorkerPipeline
+
+
+def _correr(filas: int, replicas: int, lease: float, t_consulta: float) -> dict:
+    stub = StubSupabase()
+    svc.SUPABASE_FUNCTIONS_URL = stub.start()
+    svc.CONSULTA_API_TOKEN = 'bench'
+    stub.agregar_consultas([{'id': i, 'cedula': str(1000000 + i)} for i in range(1, filas + 1)])
+    consultas_hechas: Counter = Counter()
+    lock = Lock()
+
+    def procesar(consulta):
+        with lock:
+            consultas_hechas[consulta['id']] += 1
+        time.sleep(t_consulta)
+        return consulta, {'puesto': 'P'}
+
+    def enviar(consulta, _resultado):
+        return svc.enviar_payload(svc.construir_payload_resultado(
+            consulta['id'], consulta['cedula'], True, datos={'puesto_votacion': 'P'}, lease_id=consulta.get('lease_id')))
+
+    pipelines, managers = [], []
+    for r in range(replicas):
+        worker_id = f'replica-{r}'
+        manager = None
+        if lease > 0:
+            manager = LeaseManager(
+                renovar=lambda l: svc.renovar_leases(l, lease),
+                liberar=svc.liberar_leases,
+                lease_seconds=lease,
+            )
+            manager.start()
+
+        def obtener(limit, worker_id=worker_id, manager=manager):
+            consultas = svc.obtener_consultas_pendientes(limit=limit, lease_segundos=lease, worker_id=worker_id)
+            return manager.registrar(consultas) if manager else consultas
+
+        pipelines.append(WorkerPipeline(
+            obtener=obtener, procesar=procesar, enviar=enviar,
+            lookup_workers=2, fetch_limit=2,
+            poller=AdaptivePoller(minimo=0.05, maximo=0.2, jitter=0),
+            espera_duplicados=0.05,
+            al_liberar=manager.soltar if manager else None,
+        ))
+        managers.append(manager)
+
+    t0 = time.perf_counter()
+    threads = [Thread(target=p.run, daemon=True) for p in pipelines]
+    for t in threads:
+        t.start()
+    while stub.pendientes and time.perf_counter() - t0 < 120:
+        time.sleep(0.02)
+    duracion = time.perf_counter() - t0
+    for p in pipelines:
+        p.detener()
+    for t in threads:
+        t.join()
+    for m in managers:
+        if m:
+            m.stop()
+    stub.stop()
+    recibidos = Counter(p['cola_id'] for p in stub.recibidos)
+    return {
+        'duracion': duracion,
+        'consultas': sum(consultas_hechas.values()),
+        'duplicadas': sum(n - 1 for n in consultas_hechas.values() if n > 1),
+        'resultados_duplicados': sum(n - 1 for n in recibidos.values() if n > 1),
+        'conflictos_lease': stub.conflictos,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=40)
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--lease', type=float, default=30.0, help='lease en segundos para la corrida con leases')
+    parser.add_argument('--consulta', type=float, default=0.2, help='duración simulada de cada consulta (s)')
+    args = parser.parse_args()
+
+    for nombre, lease in (('sin leases', 0.0), ('con leases', args.lease)):
+        r = _correr(args.filas, args.replicas, lease, args.consulta)
+        print(f"{nombre}: {args.filas} filas, {args.replicas} réplicas en {r['duracion']:.2f}s | "
+              f"consultas={r['consultas']} duplicadas={r['duplicadas']} "
+              f"resultados duplicados={r['resultados_duplicados']} conflictos lease={r['conflictos_lease']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Verifica el normalizador contra las respuestas grabadas en bench/fixtures/normalizer y mide su costo.
+
+Cada fixture tiene la respuesta cruda de get-information y la salida esperada
+en los formatos 'datos' (recibir-datos) y 'registro' (scraper). Cualquier
+diferencia termina con exit 1.
+
+Ejecutar: python -m bench.bench_normalizer [--iteraciones 200000] [--actualizar]
+"""
+
+import os
+import sys
+import json
+import glob
+import timeit
+import argparse
+
+from services.normalizer import FORMATO_DATOS, FORMATO_REGISTRO, normalizar_respuesta
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'normalizer')
+
+
+def _cargar():
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            yield path, json.load(f)
+
+
+def verificar(actualizar: bool = False) -> int:
+    """Compara cada fixture con la salida actual. Retorna la cantidad de diferencias."""
+    diferencias = 0
+    for path, fixture in _cargar():
+        nombre = os.path.basename(path)
+        for formato in (FORMATO_DATOS, FORMATO_REGISTRO):
+            obtenido = normalizar_respuesta(fixture['respuesta'], fixture.get('cedula', ''), formato)
+            if obtenido == fixture.get(formato):
+                continue
+            if actualizar:
+                fixture[formato] = obtenido
+                continue
+            diferencias += 1
+            print(f"DIFERENCIA {nombre} [{formato}]\n  esperado: {fixture.get(formato)}\n  obtenido: {obtenido}")
+        if actualizar:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(fixture, f, ensure_ascii=False, indent=2)
+                f.write('\n')
+    return diferencias
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iteraciones', type=int, default=200000)
+    parser.add_argument('--actualizar', action='store_true', help='reescribir las salidas esperadas con las actuales')
+    args = parser.parse_args()
+
+    fixtures = list(_cargar())
+    diferencias = verificar(args.actualizar)
+    print(f"{len(fixtures)} fixtures, {diferencias} diferencia(s){' (actualizadas)' if args.actualizar else ''}")
+    if diferencias:
+        sys.exit(1)
+
+    for path, fixture in fixtures:
+        respuesta, cedula = fixture['respuesta'], fixture.get('cedula', '')
+        t = timeit.timeit(lambda: normalizar_respuesta(respuesta, cedula), number=args.iteraciones)
+        print(f"{os.path.basename(path):<32} {t / args.iteraciones * 1e6:8.2f} µs/respuesta")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Verifica el backoff de AdaptivePoller en una racha larga de polls vacíos.
+
+Simula N polls vacíos seguidos (por defecto 2000, ~8 h a 15 s) con la
+configuración de config.py y comprueba que cada espera sea finita y esté
+entre POLL_MIN_INTERVAL*(1-jitter) y POLL_MAX_INTERVAL, que se alcance el
+máximo y que con_trabajo() vuelva al mínimo. Cualquier falla termina con exit 1.
+
+Ejecutar: python -m bench.bench_poller [--polls 2000]
+"""
+
+import sys
+import math
+import argparse
+
+from config import settings
+from services.poller import AdaptivePoller
+
+
+def verificar(polls: int) -> int:
+    """Retorna la cantidad de fallas."""
+    poller = AdaptivePoller(
+        minimo=settings.POLL_MIN_INTERVAL,
+        maximo=settings.POLL_MAX_INTERVAL,
+        factor=settings.POLL_BACKOFF_FACTOR,
+        jitter=settings.POLL_JITTER,
+    )
+    piso = poller.minimo * (1 - poller.jitter)
+    fallas = 0
+    esperas = []
+    for i in range(polls):
+        try:
+            espera = poller.siguiente_espera()
+        except Exception as e:
+            print(f"FALLA poll vacío {i + 1}: {type(e).__name__}: {e}")
+            return fallas + 1
+        if not math.isfinite(espera) or not piso <= espera <= poller.maximo:
+            print(f"FALLA poll vacío {i + 1}: espera {espera!r} fuera de [{piso:g}, {poller.maximo:g}]")
+            fallas += 1
+        esperas.append(espera)
+    if poller.maximo > poller.minimo and max(esperas) < poller.maximo * (1 - poller.jitter):
+        print(f"FALLA la espera nunca llegó al máximo ({max(esperas):.2f}s < {poller.maximo:g}s)")
+        fallas += 1
+    poller.con_trabajo()
+    primera = poller.siguiente_espera()
+    if primera > poller.minimo * (1 + poller.jitter):
+        print(f"FALLA con_trabajo() no volvió al mínimo ({primera:.2f}s)")
+        fallas += 1
+    print(f"{polls} polls vacíos: espera {min(esperas):.2f}s..{max(esperas):.2f}s, "
+          f"{sum(esperas) / 3600:.1f} h de espera simulada, {fallas} falla(s)")
+    return fallas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=2000)
+    args = parser.parse_args()
+    sys.exit(1 if verificar(args.polls) else 0)
+
+
+if __name__ == '__main__':
+    main()
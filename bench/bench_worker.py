@@ -0,0 +1,173 @@
+"""
+Benchmark de punta a punta del worker contra stand-ins locales de Supabase y de la API de consulta.
+
+Modos:
+- main:     ejecuta worker_registraduria.main() (pipeline, leases, envío) hasta vaciar la cola del stand-in.
+- procesar: llama procesar_consulta() con WORKER_MAX_WORKERS threads, sin cola ni envío.
+
+Reporta items/s, p50/p99 por etapa (a partir de las métricas del worker), las
+respuestas de la API y el trabajo desperdiciado en reintentos. 2Captcha se
+reemplaza por un token fijo (con --captcha segundos de latencia simulada) y las
+esperas entre reintentos de la API se escalan con --escala-esperas.
+
+Ejecutar: python -m bench.bench_worker [--modo main] [--filas 100] [--workers 2] [--latencia-api 0.1]
+          [--mezcla ok=0.8,no_censo=0.1,403=0.05,500=0.05] [--escala-esperas 0.01]
+"""
+
+import os
+
+# Antes de importar el worker: sin caches persistentes ni outbox (no tocar data/ ni medir aciertos de cache)
+os.environ.update(STATE_PATH='', OUTBOX_PATH='', RETRY_PATH='', ENABLE_SCRAPER_FALLBACK='false',
+                  RESULT_CACHE_TTL_LUGAR='0', RESULT_CACHE_TTL_NO_CENSO='0', RESULT_CACHE_TTL_NO_HABILITADA='0')
+
+import time
+import signal
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from bench.stub_lookup import StubLookup, parse_mezcla
+from bench.stub_supabase import StubSupabase
+from config import settings
+from services import registraduria_supabase as svc
+from services.metrics import METRICS
+import worker_registraduria as worker
+
+
+class _TiempoEscalado:
+    """Sustituto del módulo time que acorta sleep() y cuenta las esperas pedidas."""
+
+    def __init__(self, escala: float):
+        self.escala = escala
+        self.esperas = 0
+        self.segundos = 0.0
+        self._lock = threading.Lock()
+
+    def sleep(self, segundos: float) -> None:
+        with self._lock:
+            self.esperas += 1
+            self.segundos += segundos
+        time.sleep(segundos * self.escala)
+
+    def __getattr__(self, nombre):
+        return getattr(time, nombre)
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+def _capturar_muestras() -> Dict[str, List[float]]:
+    """Guarda cada observación de worker_stage_seconds además del histograma."""
+    muestras: Dict[str, List[float]] = defaultdict(list)
+    observar = METRICS.observar
+
+    def _observar(nombre, segundos, **labels):
+        observar(nombre, segundos, **labels)
+        if nombre == 'worker_stage_seconds':
+            muestras[labels.get('stage', '?')].append(segundos)
+
+    METRICS.observar = _observar
+    return muestras
+
+
+def _correr_main(stub_supabase: StubSupabase, limite: float) -> None:
+    def _detener_al_vaciar():
+        t0 = time.perf_counter()
+        while stub_supabase.pendientes and time.perf_counter() - t0 < limite:
+            time.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGINT)
+
+    threading.Thread(target=_detener_al_vaciar, daemon=True).start()
+    worker.main()
+
+
+def _correr_procesar(consultas: List[dict], workers: int) -> None:
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker.procesar_consulta, consultas))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modo', choices=('main', 'procesar'), default='main')
+    parser.add_argument('--filas', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=settings.WORKER_MAX_WORKERS)
+    parser.add_argument('--latencia-api', type=float, default=0.1, help='latencia de la API de consulta (s)')
+    parser.add_argument('--latencia-supabase', type=float, default=0.02, help='latencia de las Edge Functions (s)')
+    parser.add_argument('--mezcla', default='ok=0.8,no_censo=0.1,403=0.05,500=0.05',
+                        help='pesos de respuestas de la API: ok, no_censo (404 status_code 13), 403, 500')
+    parser.add_argument('--error-recibir', type=float, default=0.0, help='fracción de 503 en recibir-datos')
+    parser.add_argument('--captcha', type=float, default=0.0, help='latencia simulada de 2Captcha (s)')
+    parser.add_argument('--escala-esperas', type=float, default=0.01, help='factor para las esperas entre reintentos')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--limite', type=float, default=600, help='tiempo máximo de la corrida (s)')
+    parser.add_argument('--verbose', action='store_true', help='mostrar los logs del worker')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    stub_lookup = StubLookup(latencia=args.latencia_api, mezcla=parse_mezcla(args.mezcla), semilla=args.semilla)
+    stub_supabase = StubSupabase(latencia=args.latencia_supabase, tasa_error_recibir=args.error_recibir,
+                                 semilla=args.semilla)
+    svc.API_URL = stub_lookup.start()
+    url = stub_supabase.start()
+    svc.SUPABASE_FUNCTIONS_URL = worker.SUPABASE_FUNCTIONS_URL = url
+    svc.CONSULTA_API_TOKEN = worker.CONSULTA_API_TOKEN = 'bench'
+    worker.TWOCAPTCHA_API_KEY = 'bench'
+    worker._warmup_token_pool = lambda num_tokens=1: None
+    settings.WORKER_MAX_WORKERS = args.workers
+    settings.POLL_MIN_INTERVAL = settings.POLL_MAX_INTERVAL = 0.2
+
+    captchas = [0]
+
+    def _captcha(site_key, page_url):
+        captchas[0] += 1
+        if args.captcha:
+            time.sleep(args.captcha)
+        return 'token-bench'
+
+    svc.solve_recaptcha = _captcha
+    tiempo = _TiempoEscalado(args.escala_esperas)
+    svc.time = tiempo
+    muestras = _capturar_muestras()
+
+    consultas = [{'id': i, 'cedula': str(10000000 + i)} for i in range(1, args.filas + 1)]
+    t0 = time.perf_counter()
+    try:
+        if args.modo == 'main':
+            stub_supabase.agregar_consultas(consultas)
+            _correr_main(stub_supabase, args.limite)
+        else:
+            _correr_procesar(consultas, args.workers)
+    finally:
+        duracion = time.perf_counter() - t0
+        stub_lookup.stop()
+        stub_supabase.stop()
+
+    completadas = len({p['cola_id'] for p in stub_supabase.recibidos}) if args.modo == 'main' else args.filas
+    peticiones_api = stub_lookup.peticiones
+    print(f"modo={args.modo} filas={args.filas} workers={args.workers} latencia_api={args.latencia_api}s mezcla={args.mezcla}")
+    print(f"completadas: {completadas} en {duracion:.2f}s ({completadas / duracion:.2f} items/s)")
+    print(f"{'etapa':<10} {'n':>6} {'p50 ms':>10} {'p99 ms':>10} {'total s':>9}")
+    for etapa in ('fetch', 'cache', 'lookup', 'fallback', 'submit', 'idle'):
+        valores = muestras.get(etapa, [])
+        if valores:
+            print(f"{etapa:<10} {len(valores):>6} {_percentil(valores, 50) * 1000:>10.1f} "
+                  f"{_percentil(valores, 99) * 1000:>10.1f} {sum(valores):>9.2f}")
+    print(f"API: {peticiones_api} peticiones {dict(stub_lookup.respuestas)}")
+    print(f"reintentos desperdiciados: {max(0, peticiones_api - args.filas)} peticiones extra a la API, "
+          f"{max(0, captchas[0] - args.filas)} captchas extra, {tiempo.esperas} esperas "
+          f"({tiempo.segundos:.0f}s sin escalar, x{args.escala_esperas})")
+    if args.modo == 'main':
+        print(f"Supabase: {dict(stub_supabase.peticiones)} pendientes={stub_supabase.pendientes}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Presupuesto de arranque en frío de los entry points (python -X importtime).
+
+Para cada módulo mide el tiempo acumulado de import en un proceso nuevo
+(mejor de N corridas) y verifica:
+- que no supere su presupuesto en ms
+- que no cargue módulos que solo se usan bajo demanda (2captcha, http.server, bs4, ...)
+- que .env se cargue una sola vez
+
+Sale con código 1 si algo falla (para CI o antes de publicar la imagen).
+
+Ejecutar: python -m bench.importtime [--corridas 5] [--presupuesto-ms 250] [modulo ...]
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# módulo -> (presupuesto ms, módulos que no deben importarse al arrancar)
+PRESUPUESTOS: Dict[str, Tuple[float, Tuple[str, ...]]] = {
+    'worker_registraduria': (250.0, ('twocaptcha', 'http.server', 'bs4', 'lxml', 'scrapper.registraduria_scraper_optimizado')),
+    'main': (300.0, ('twocaptcha', 'bs4', 'lxml')),
+}
+
+_LINEA = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+# Cuenta las llamadas a load_dotenv durante el import del módulo
+_CONTAR_DOTENV = """
+import sys, dotenv
+n = [0]
+_original = dotenv.load_dotenv
+def _contar(*a, **k):
+    n[0] += 1
+    return _original(*a, **k)
+dotenv.load_dotenv = _contar
+import {modulo}
+print(n[0])
+"""
+
+
+def _entorno() -> Dict[str, str]:
+    # Con la API key presente main.py no recurre a .env.example
+    return {**os.environ, 'TWOCAPTCHA_API_KEY': os.environ.get('TWOCAPTCHA_API_KEY') or 'importtime',
+            'PYTHONDONTWRITEBYTECODE': '1'}
+
+
+def medir(modulo: str) -> Tuple[float, List[str]]:
+    """(ms acumulados del import de `modulo`, módulos importados) en un proceso nuevo."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+                          cwd=RAIZ, env=_entorno(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {modulo} falló:\n{proc.stderr[-2000:]}")
+    total_us: Optional[int] = None
+    importados = []
+    for linea in proc.stderr.splitlines():
+        m = _LINEA.match(linea)
+        if not m:
+            continue
+        importados.append(m.group(4))
+        if m.group(4) == modulo and not m.group(3):
+            total_us = int(m.group(2))
+    if total_us is None:
+        raise RuntimeError(f"No se encontró {modulo} en la salida de -X importtime")
+    return total_us / 1000, importados
+
+
+def cargas_dotenv(modulo: str) -> int:
+    proc = subprocess.run([sys.executable, '-c', _CONTAR_DOTENV.format(modulo=modulo)],
+                          cwd=RAIZ, env=_entorno(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {modulo} falló:\n{proc.stderr[-2000:]}")
+    return int(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('modulos', nargs='*', default=list(PRESUPUESTOS))
+    parser.add_argument('--corridas', type=int, default=5)
+    parser.add_argument('--presupuesto-ms', type=float, default=None, help='reemplaza el presupuesto de cada módulo')
+    args = parser.parse_args()
+
+    fallas = 0
+    for modulo in args.modulos:
+        presupuesto, prohibidos = PRESUPUESTOS.get(modulo, (250.0, ()))
+        if args.presupuesto_ms is not None:
+            presupuesto = args.presupuesto_ms
+        tiempos, importados = [], []
+        for _ in range(max(1, args.corridas)):
+            ms, importados = medir(modulo)
+            tiempos.append(ms)
+        mejor = min(tiempos)
+        cargados = sorted(set(importados) & set(prohibidos))
+        n_dotenv = cargas_dotenv(modulo)
+        ok = mejor <= presupuesto and not cargados and n_dotenv <= 1
+        fallas += not ok
+        print(f"{'OK  ' if ok else 'FALLA'} {modulo}: {mejor:.1f} ms (presupuesto {presupuesto:.0f} ms, "
+              f"mediana {sorted(tiempos)[len(tiempos) // 2]:.1f} ms), load_dotenv x{n_dotenv}"
+              f"{', importa ' + ', '.join(cargados) if cargados else ''}")
+        if mejor > presupuesto:
+            print(f"      detalle: python -X importtime -c 'import {modulo}' 2>&1 | sort -t'|' -k2 -n | tail")
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == '__main__':
+    main()
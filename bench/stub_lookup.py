@@ -0,0 +1,124 @@
+"""
+Stand-in local de la API de infovotantes (POST /api/v1/citizen/get-information).
+
+Cada petición responde según una mezcla configurable de resultados:
+- 'ok':       200 con lugar de votación
+- 'no_censo': 404 con {"status": false, "status_code": 13}
+- '403':      403 Forbidden
+- '500':      500 Internal Server Error
+
+Uso:
+    stub = StubLookup(latencia=0.1, mezcla={'ok': 0.8, 'no_censo': 0.1, '403': 0.05, '500': 0.05})
+    url = stub.start()          # URL completa del endpoint, para API_URL
+    ...
+    stub.stop()
+"""
+
+import json
+import time
+import random
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, Optional
+
+RUTA = '/api/v1/citizen/get-information'
+MEZCLA_DEFAULT = {'ok': 1.0}
+
+
+def parse_mezcla(texto: str) -> Dict[str, float]:
+    """'ok=0.8,no_censo=0.1,403=0.05,500=0.05' -> dict."""
+    mezcla = {}
+    for parte in texto.split(','):
+        if parte.strip():
+            clave, _, peso = parte.partition('=')
+            mezcla[clave.strip()] = float(peso or 1)
+    return mezcla
+
+
+class StubLookup:
+    """Servidor HTTP local con latencia y mezcla de errores configurables."""
+
+    def __init__(self, latencia: float = 0.0, mezcla: Optional[Dict[str, float]] = None, semilla: int = 0):
+        self.latencia = latencia
+        self.mezcla = dict(mezcla or MEZCLA_DEFAULT)
+        desconocidas = set(self.mezcla) - {'ok', 'no_censo', '403', '500'}
+        if desconocidas:
+            raise ValueError(f"Resultados desconocidos en la mezcla: {sorted(desconocidas)}")
+        self._random = random.Random(semilla)
+        self.lock = Lock()
+        self.respuestas: Counter = Counter()  # resultado -> veces
+        self.por_cedula: Counter = Counter()  # cedula -> peticiones recibidas
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> str:
+        stub = self
+
+        class _Handler(_LookupHandler):
+            pass
+        _Handler.stub = stub
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        Thread(target=self._server.serve_forever, name='stub-lookup', daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{RUTA}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def peticiones(self) -> int:
+        with self.lock:
+            return sum(self.respuestas.values())
+
+    def responder(self, body: Dict[str, Any]) -> tuple:
+        cedula = str(body.get('identification', ''))
+        with self.lock:
+            resultado = self._random.choices(list(self.mezcla), weights=list(self.mezcla.values()))[0]
+            self.respuestas[resultado] += 1
+            self.por_cedula[cedula] += 1
+        if resultado == 'no_censo':
+            return 404, {'status': False, 'status_code': 13, 'message': 'No se encuentra en el censo'}
+        if resultado == '403':
+            return 403, {'message': 'Forbidden'}
+        if resultado == '500':
+            return 500, {'message': 'Internal Server Error'}
+        return 200, {
+            'status': True,
+            'data': {
+                'is_in_census': True,
+                'novelty': [],
+                'voter': {'identification': cedula},
+                'polling_place': {
+                    'stand': 'PUESTO STAND-IN',
+                    'table': int(cedula[-2:]) % 30 + 1 if cedula[-2:].isdigit() else 1,
+                    'place_address': {'state': 'BOGOTA D.C.', 'town': 'BOGOTA D.C.', 'address': 'CALLE 1 # 2-3', 'zone': '01'},
+                },
+            },
+        }
+
+
+class _LookupHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stub: StubLookup = None
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.stub.latencia:
+            time.sleep(self.stub.latencia)
+        if self.path.split('?', 1)[0].rstrip('/') != RUTA:
+            status, resp = 404, {'message': 'not found'}
+        else:
+            status, resp = self.stub.responder(json.loads(raw or b'{}'))
+        data = json.dumps(resp).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
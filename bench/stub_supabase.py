@@ -0,0 +1,223 @@
+"""
+Stand-in local de las Edge Functions de Supabase para pruebas y benchmarks sin red.
+
+Endpoints:
+- GET  /consultas-pendientes?tipo=&limit=[&lease_seconds=&worker_id=]  -> {"consultas": [...]}
+- POST /recibir-datos  (un payload o {"resultados": [...]})
+- POST /lease-consultas  {"accion": "renovar"|"liberar", "leases": [...]}
+
+Las filas siguen pendientes hasta recibir su resultado. Sin lease_seconds, cada
+poll devuelve todas las pendientes (como una cola sin reclamo: dos réplicas
+pueden tomar la misma fila). Con lease_seconds, una fila reclamada no se
+entrega a nadie más hasta que el lease vence o se libera.
+
+Uso:
+    stub = StubSupabase(latencia=0.05)
+    url = stub.start()          # p.ej. http://127.0.0.1:54321
+    stub.agregar_consultas([{'id': 1, 'cedula': '123'}])
+    ...
+    stub.stop()
+"""
+
+import gzip
+import json
+import time
+import uuid
+import random
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class StubSupabase:
+    """Servidor HTTP local que imita consultas-pendientes, recibir-datos y lease-consultas."""
+
+    def __init__(self, latencia: float = 0.0, acepta_lotes: bool = True, token: Optional[str] = None,
+                 fallos_recibir: int = 0, tasa_error_recibir: float = 0.0, semilla: int = 0):
+        self.latencia = latencia
+        self.acepta_lotes = acepta_lotes
+        self.token = token
+        # Las primeras `fallos_recibir` peticiones a recibir-datos responden 503 (caída simulada)
+        self.fallos_recibir = fallos_recibir
+        # Además, cada petición a recibir-datos falla con 503 con esta probabilidad
+        self.tasa_error_recibir = tasa_error_recibir
+        self._random = random.Random(semilla)
+        self.claves_vistas: set = set()
+        self.duplicados_idempotentes = 0
+        self.lock = Lock()
+        self.filas: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self.leases: Dict[Any, tuple] = {}  # cola_id -> (lease_id, worker_id, expira)
+        self.recibidos: List[Dict[str, Any]] = []
+        self.entregas: Counter = Counter()  # cola_id -> veces entregada por consultas-pendientes
+        self.conflictos = 0  # resultados con lease_id distinto al vigente
+        self.peticiones: Counter = Counter()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[Thread] = None
+
+    # --- API del stand-in ---
+
+    def start(self) -> str:
+        stub = self
+
+        class _Handler(_StubHandler):
+            pass
+        _Handler.stub = stub
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever, name='stub-supabase', daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def agregar_consultas(self, consultas: Iterable[Dict[str, Any]]) -> None:
+        with self.lock:
+            for consulta in consultas:
+                self.filas[consulta.get('id') or consulta.get('cola_id')] = dict(consulta)
+
+    @property
+    def pendientes(self) -> int:
+        with self.lock:
+            return len(self.filas)
+
+    # --- Lógica de endpoints (sobrescribible en subclases) ---
+
+    def consultas_pendientes(self, params: Dict[str, str]) -> Dict[str, Any]:
+        limit = int(params.get('limit', '50'))
+        lease_seconds = float(params.get('lease_seconds', '0'))
+        worker_id = params.get('worker_id', '')
+        now = time.time()
+        consultas = []
+        with self.lock:
+            for cid, fila in self.filas.items():
+                if len(consultas) >= limit:
+                    break
+                lease = self.leases.get(cid)
+                if lease_seconds > 0:
+                    if lease and lease[2] > now:
+                        continue
+                    lease_id = uuid.uuid4().hex
+                    self.leases[cid] = (lease_id, worker_id, now + lease_seconds)
+                    consultas.append({**fila, 'lease_id': lease_id})
+                else:
+                    consultas.append(dict(fila))
+                self.entregas[cid] += 1
+        return {'consultas': consultas}
+
+    def recibir_uno(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        cid = payload.get('cola_id')
+        clave = payload.get('idempotency_key')
+        with self.lock:
+            if clave and clave in self.claves_vistas:
+                self.duplicados_idempotentes += 1
+                return {'success': True, 'cola_id': cid, 'duplicado': True}
+            if clave:
+                self.claves_vistas.add(clave)
+            self.recibidos.append(payload)
+            lease = self.leases.pop(cid, None)
+            if payload.get('lease_id') and lease and lease[0] != payload['lease_id']:
+                self.conflictos += 1
+            self.filas.pop(cid, None)
+        return {'success': True, 'cola_id': cid}
+
+    def lease_consultas(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        accion = body.get('accion')
+        lease_seconds = float(body.get('lease_seconds') or 0)
+        now = time.time()
+        resultado = []
+        with self.lock:
+            for item in body.get('leases', []):
+                cid, lease_id = item.get('cola_id'), item.get('lease_id')
+                lease = self.leases.get(cid)
+                ok = bool(lease and lease[0] == lease_id and cid in self.filas)
+                if ok and accion == 'renovar':
+                    self.leases[cid] = (lease_id, lease[1], now + lease_seconds)
+                elif ok and accion == 'liberar':
+                    del self.leases[cid]
+                resultado.append({'cola_id': cid, 'ok': ok})
+        return {'success': True, 'leases': resultado}
+
+    def recibir_datos(self, body: Any) -> tuple:
+        with self.lock:
+            if self.fallos_recibir > 0:
+                self.fallos_recibir -= 1
+                return 503, {'success': False, 'error': 'servicio no disponible'}
+            if self.tasa_error_recibir and self._random.random() < self.tasa_error_recibir:
+                return 503, {'success': False, 'error': 'servicio no disponible'}
+        if isinstance(body, dict) and 'resultados' in body:
+            if not self.acepta_lotes:
+                return 400, {'success': False, 'error': 'lotes no soportados'}
+            items = [self.recibir_uno(p) for p in body['resultados']]
+            return 200, {'success': all(i.get('success') for i in items), 'resultados': items}
+        return 200, self.recibir_uno(body)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    stub: StubSupabase = None
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _responder(self, status: int, body: Any) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _autorizado(self) -> bool:
+        if self.stub.token and self.headers.get('Authorization') != f'Bearer {self.stub.token}':
+            self._responder(401, {'error': 'unauthorized'})
+            return False
+        return True
+
+    def _leer_json(self) -> Any:
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            raw = gzip.decompress(raw)
+        return json.loads(raw or b'{}')
+
+    def do_GET(self) -> None:
+        parsed = urlparse(self.path)
+        ruta = parsed.path.rstrip('/').rsplit('/', 1)[-1]
+        with self.stub.lock:
+            self.stub.peticiones[f'GET {ruta}'] += 1
+        if not self._autorizado():
+            return
+        if self.stub.latencia:
+            time.sleep(self.stub.latencia)
+        if ruta == 'consultas-pendientes':
+            params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+            self._responder(200, self.stub.consultas_pendientes(params))
+        else:
+            self._responder(404, {'error': 'not found'})
+
+    def do_POST(self) -> None:
+        ruta = urlparse(self.path).path.rstrip('/').rsplit('/', 1)[-1]
+        with self.stub.lock:
+            self.stub.peticiones[f'POST {ruta}'] += 1
+        if not self._autorizado():
+            return
+        body = self._leer_json()
+        if self.stub.latencia:
+            time.sleep(self.stub.latencia)
+        if ruta == 'recibir-datos':
+            status, resp = self.stub.recibir_datos(body)
+            self._responder(status, resp)
+        elif ruta == 'lease-consultas':
+            self._responder(200, self.stub.lease_consultas(body))
+        else:
+            self._responder(404, {'error': 'not found'})
@@ -1,11 +1,20 @@
 import os
-from dotenv import load_dotenv
+import socket
 
-# Cargar .env desde el directorio del proyecto
+# Cargar .env desde el directorio del proyecto. Único lugar donde se lee: los
+# entry points (worker, main.py, scraper) importan config en lugar de llamar load_dotenv.
 _dir = os.path.dirname(os.path.abspath(__file__))
-load_dotenv(os.path.join(_dir, '.env'))
+try:
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(_dir, '.env'))
+except ImportError:
+    pass
 
 class Settings:
+    # Logging: nivel, formato ('text' o 'json') y muestreo de eventos de alto volumen (1 de cada N; vacío = todo)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+    LOG_SAMPLE = os.getenv('LOG_SAMPLE', 'consulta=10,cache=10,enviado=10,recibido=10')
     # 2Captcha: preferir TWOCAPTCHA_API_KEY, fallback a APIKEY_2CAPTCHA
     API_KEY_2CAPTCHA = os.getenv('TWOCAPTCHA_API_KEY') or os.getenv('APIKEY_2CAPTCHA')
     # Token para Supabase/Lovable Cloud (consultas pendientes)
@@ -18,5 +27,65 @@ class Settings:
     # Solo congreso: status_code 13 es igual en todas las elecciones, evita 2 tokens extra
     ELECTION_CODES_TO_TRY = os.getenv('ELECTION_CODES', 'congreso').split(',')
     ENABLE_SCRAPER_FALLBACK = os.getenv('ENABLE_SCRAPER_FALLBACK', 'true').lower() in ('true', '1', 'yes')
+    # Consultas simultáneas a la Registraduría (mantener conservador)
+    WORKER_MAX_WORKERS = int(os.getenv('WORKER_MAX_WORKERS', '2'))
+    # Pool de conexiones keep-alive a Supabase: por defecto workers + poll + envío
+    SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', str(WORKER_MAX_WORKERS + 2)))
+    # Comprimir (gzip) cuerpos JSON hacia Supabase desde SUPABASE_GZIP_MIN_BYTES
+    SUPABASE_GZIP = os.getenv('SUPABASE_GZIP', 'false').lower() in ('true', '1', 'yes')
+    SUPABASE_GZIP_MIN_BYTES = int(os.getenv('SUPABASE_GZIP_MIN_BYTES', '1024'))
+    # Envío por lotes a recibir-datos: 1 = un resultado por petición (requiere Edge Function con soporte de lotes)
+    RESULT_BATCH_SIZE = int(os.getenv('RESULT_BATCH_SIZE', '1'))
+    RESULT_BATCH_WINDOW = float(os.getenv('RESULT_BATCH_WINDOW', '1.0'))
+    # Polling adaptativo de la cola: espera mínima/máxima (s) entre polls vacíos, factor de backoff y jitter (fracción)
+    POLL_MIN_INTERVAL = float(os.getenv('POLL_MIN_INTERVAL', '1'))
+    POLL_MAX_INTERVAL = float(os.getenv('POLL_MAX_INTERVAL', '15'))
+    POLL_BACKOFF_FACTOR = float(os.getenv('POLL_BACKOFF_FACTOR', '2'))
+    POLL_JITTER = float(os.getenv('POLL_JITTER', '0.2'))
+    # Long-poll: segundos que consultas-pendientes puede retener la petición si la cola está vacía (0 = desactivado)
+    QUEUE_LONG_POLL = float(os.getenv('QUEUE_LONG_POLL', '0'))
+    # Plazo (s) para drenar al recibir SIGTERM: terminar consultas en curso y enviar lo listo.
+    # Debe ser menor que el tiempo de gracia del contenedor (Docker: 10s por defecto)
+    WORKER_DRAIN_SECONDS = float(os.getenv('WORKER_DRAIN_SECONDS', '8'))
+    # Servidor admin local (POST /wake, ...). Puerto 0 = desactivado
+    WORKER_ADMIN_HOST = os.getenv('WORKER_ADMIN_HOST', '127.0.0.1')
+    WORKER_ADMIN_PORT = int(os.getenv('WORKER_ADMIN_PORT', '0'))
+    WORKER_ADMIN_TOKEN = os.getenv('WORKER_ADMIN_TOKEN', '')
+    # Perfilado bajo demanda (SIGUSR1 = cProfile, SIGUSR2 = snapshot tracemalloc, o POST /profile/... en admin):
+    # directorio de salida, duración (s) de la captura de CPU y frames por traza de tracemalloc
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(_dir, 'data', 'profiles'))
+    PROFILE_SECONDS = float(os.getenv('PROFILE_SECONDS', '30'))
+    PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1'))
+    # Lease sobre filas reclamadas (s): evita que otra réplica procese la misma fila. 0 = sin leases
+    QUEUE_LEASE_SECONDS = float(os.getenv('QUEUE_LEASE_SECONDS', '120'))
+    # Identificador de esta réplica ante la cola
+    WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+    # Outbox local (SQLite) de resultados que no se pudieron enviar. Vacío = sin outbox
+    OUTBOX_PATH = os.getenv('OUTBOX_PATH', os.path.join(_dir, 'data', 'outbox.sqlite3'))
+    OUTBOX_BACKOFF_BASE = float(os.getenv('OUTBOX_BACKOFF_BASE', '5'))
+    OUTBOX_BACKOFF_MAX = float(os.getenv('OUTBOX_BACKOFF_MAX', '300'))
+    OUTBOX_MAX_INTENTOS = int(os.getenv('OUTBOX_MAX_INTENTOS', '100'))
+    # Circuit breaker de la API de consulta: ventana (s), mínimo de llamadas, tasa de error que lo abre,
+    # espera inicial (s) antes de la llamada de prueba y espera máxima (se duplica por cada prueba fallida)
+    API_BREAKER_VENTANA = float(os.getenv('API_BREAKER_VENTANA', '60'))
+    API_BREAKER_MIN_LLAMADAS = int(os.getenv('API_BREAKER_MIN_LLAMADAS', '5'))
+    API_BREAKER_UMBRAL = float(os.getenv('API_BREAKER_UMBRAL', '0.5'))
+    API_BREAKER_ESPERA = float(os.getenv('API_BREAKER_ESPERA', '30'))
+    API_BREAKER_ESPERA_MAX = float(os.getenv('API_BREAKER_ESPERA_MAX', '300'))
+    # Reintentos locales de api_error: consultas por cédula antes de enviar el fallo (1 = sin reintentos),
+    # backoff inicial por clase de error (s, se duplica por intento), tope y archivo de persistencia (vacío = memoria)
+    RETRY_MAX_INTENTOS = int(os.getenv('RETRY_MAX_INTENTOS', '3'))
+    RETRY_BACKOFF = os.getenv('RETRY_BACKOFF', '403=1200,404=1200,bloqueada=1200,error=60')
+    RETRY_BACKOFF_MAX = float(os.getenv('RETRY_BACKOFF_MAX', str(6 * 3600)))
+    RETRY_PATH = os.getenv('RETRY_PATH', os.path.join(_dir, 'data', 'reintentos.json'))
+    # Estado compartido (SQLite WAL) para el cache de resultados, las cédulas bloqueadas tras 403/404 y las
+    # consultas en vuelo: réplicas con el mismo archivo (volumen local compartido) aprovechan lo que sabe cada una.
+    # Vacío = memoria del proceso, con hasta STATE_MEMORY_MAX entradas por tipo
+    STATE_PATH = os.getenv('STATE_PATH', os.path.join(_dir, 'data', 'estado.sqlite3'))
+    STATE_MEMORY_MAX = int(os.getenv('STATE_MEMORY_MAX', '10000'))
+    # TTL (segundos) por clase de resultado: lugar de votación, NO CENSO y NO HABILITADA (0 = no cachear la clase)
+    RESULT_CACHE_TTL_LUGAR = int(os.getenv('RESULT_CACHE_TTL_LUGAR', str(7 * 24 * 3600)))
+    RESULT_CACHE_TTL_NO_CENSO = int(os.getenv('RESULT_CACHE_TTL_NO_CENSO', str(24 * 3600)))
+    RESULT_CACHE_TTL_NO_HABILITADA = int(os.getenv('RESULT_CACHE_TTL_NO_HABILITADA', str(24 * 3600)))
 
 settings = Settings()
\ No newline at end of file
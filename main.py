@@ -14,15 +14,14 @@ Ejecutar: python main.py
 
 import os
 
-# Cargar .env desde el directorio del script
-try:
-    from dotenv import load_dotenv
-    _dir = os.path.dirname(os.path.abspath(__file__))
-    load_dotenv(os.path.join(_dir, '.env'))
-    if not os.getenv('TWOCAPTCHA_API_KEY'):
-        load_dotenv(os.path.join(_dir, '.env.example'))
-except ImportError:
-    pass
+# config carga .env una sola vez; .env.example solo como respaldo si falta la API key
+import config
+if not os.getenv('TWOCAPTCHA_API_KEY'):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env.example'))
+    except ImportError:
+        pass
 
 import sys
 import time
@@ -31,20 +30,19 @@ import logging
 import json
 import signal
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from collections import deque
-from threading import Lock
-from typing import Optional, Dict, Any, List
-
-# Intentar usar librería oficial 2captcha
-try:
-    from twocaptcha import TwoCaptcha
-    from twocaptcha.api import ApiException
-    HAS_2CAPTCHA_LIB = True
-except ImportError:
-    HAS_2CAPTCHA_LIB = False
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Optional, Dict, Any, List, Set
 
 from scraper_pool import get_scraper_pool
+from services.supabase_client import supabase_get, supabase_post_json
+from utils.ttl_cache import TTLCache
+from utils.logging_setup import configurar_logging
+from services.circuit_breaker import CircuitBreaker
+from services.normalizer import NO_CENSO_DATOS, es_no_censo, normalizar_respuesta
+from services.registraduria_supabase import _libreria_2captcha
 
 # Configuración
 TWOCAPTCHA_API_KEY = os.getenv('TWOCAPTCHA_API_KEY')
@@ -138,38 +136,40 @@ class TokenCache:
 
 
 # Cache: cedulas que fallaron recientemente (evitar re-gastar CAPTCHA)
-FAILED_CEDULAS_CACHE: Dict[str, float] = {}
 FAILED_CACHE_TTL = 20 * 60  # 20 minutos
+FAILED_CACHE_MAX = int(os.getenv('FAILED_CACHE_MAX', '10000'))
+# FAILED_CACHE_PATH: (opcional) archivo JSON para conservar el bloqueo entre reinicios
+FAILED_CEDULAS_CACHE = TTLCache(FAILED_CACHE_TTL, maxsize=FAILED_CACHE_MAX, path=os.getenv('FAILED_CACHE_PATH') or None)
 
 
 def _cedula_fallo_reciente(cedula: str) -> bool:
     """True si la cedula fallo hace menos de FAILED_CACHE_TTL segundos."""
-    now = time.time()
-    if cedula in FAILED_CEDULAS_CACHE:
-        if now - FAILED_CEDULAS_CACHE[cedula] < FAILED_CACHE_TTL:
-            return True
-        del FAILED_CEDULAS_CACHE[cedula]
-    return False
+    return str(cedula) in FAILED_CEDULAS_CACHE
 
 
 def _registrar_cedula_fallo(cedula: str) -> None:
     """Registra que la cedula fallo (403/404) para bloquear reintentos."""
-    FAILED_CEDULAS_CACHE[cedula] = time.time()
+    FAILED_CEDULAS_CACHE.add(str(cedula))
     logger.info(f"Cedula {cedula} registrada en cache de fallidas (TTL {FAILED_CACHE_TTL // 60}min)")
 
 
 def _limpiar_cache_fallidas() -> None:
     """Elimina entradas expiradas del cache."""
-    now = time.time()
-    expiradas = [c for c, ts in FAILED_CEDULAS_CACHE.items() if now - ts >= FAILED_CACHE_TTL]
-    for c in expiradas:
-        del FAILED_CEDULAS_CACHE[c]
+    FAILED_CEDULAS_CACHE.purge()
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+# Circuito de la API (vía ScraperAPI): con 5xx/429 repetidos las consultas se difieren en lugar de dormir
+API_BREAKER = CircuitBreaker(
+    'scraperapi',
+    ventana=config.settings.API_BREAKER_VENTANA,
+    min_llamadas=config.settings.API_BREAKER_MIN_LLAMADAS,
+    umbral=config.settings.API_BREAKER_UMBRAL,
+    espera=config.settings.API_BREAKER_ESPERA,
+    espera_max=config.settings.API_BREAKER_ESPERA_MAX,
 )
+
+
+configurar_logging(config.settings.LOG_LEVEL, config.settings.LOG_FORMAT, config.settings.LOG_SAMPLE)
 logger = logging.getLogger(__name__)
 
 
@@ -179,7 +179,9 @@ def _solve_recaptcha_direct(site_key: str, page_url: str) -> Optional[str]:
         logger.error("TWOCAPTCHA_API_KEY no configurado")
         return None
 
-    if HAS_2CAPTCHA_LIB:
+    libreria = _libreria_2captcha()
+    if libreria is not None:
+        TwoCaptcha, ApiException = libreria
         try:
             # 2captcha-python 1.2+ usa timeout/polling_interval; 1.1.x usa defaultTimeout/pollingInterval
             try:
@@ -308,12 +310,15 @@ def _warmup_token_pool(num_tokens: int = 2) -> None:
 
 
 def query_registraduria(cedula: str) -> Optional[Dict[str, Any]]:
-    """Consulta lugar de votación vía API directa"""
+    """Consulta lugar de votación vía API directa. Con el circuito abierto o la API caída retorna status 'diferida'."""
+    if _cedula_fallo_reciente(cedula):
+        logger.info(f"Cedula {cedula} bloqueada: fallo recientemente (cache 20min)")
+        return {"status": "api_error", "error": "Reintento bloqueado 20min"}
+    permitida, prueba = API_BREAKER.permitir()
+    if not permitida:
+        return {"status": "diferida", "error": f"Circuito abierto ({API_BREAKER.segundos_abierto():.0f}s)"}
     try:
-        if _cedula_fallo_reciente(cedula):
-            logger.info(f"Cedula {cedula} bloqueada: fallo recientemente (cache 20min)")
-            return {"status": "api_error", "error": "Reintento bloqueado 20min"}
-        logger.info(f"Consultando Registraduria para cedula: {cedula}")
+        logger.info("Consultando Registraduria para cedula: %(cedula)s", {'cedula': cedula}, extra={'evento': 'consulta'})
 
         session = _get_session()
         payload = {
@@ -344,8 +349,6 @@ def query_registraduria(cedula: str) -> Optional[Dict[str, Any]]:
 
             pool = get_scraper_pool()
             resp = None
-            max_ciclos_500 = 3  # Máx ciclos de 500 antes de dar por perdida la consulta
-            ciclos_500 = 0
             while True:
                 api_key = pool.get_next_key()
                 if not api_key:
@@ -360,139 +363,77 @@ def query_registraduria(cedula: str) -> Optional[Dict[str, Any]]:
                 }
                 if SCRAPER_COUNTRY:
                     scraper_params["country_code"] = SCRAPER_COUNTRY
-                resp = None
-                for intento in range(3):
-                    resp = session.post(
-                        SCRAPER_API_URL,
-                        params=scraper_params,
-                        json=payload,
-                        headers=headers,
-                        timeout=SCRAPER_TIMEOUT,
-                    )
-                    if resp.status_code == 200:
-                        break
-                    if resp.status_code == 404:
-                        break
-                    if resp.status_code == 403:
-                        pool.mark_exhausted(api_key)
-                        logger.warning(f"ScraperAPI 403 (creditos agotados), rotando a siguiente cuenta")
-                        break
-                    if resp.status_code == 401:
-                        pool.mark_exhausted(api_key)
-                        logger.warning(f"ScraperAPI 401 (key invalida), rotando a siguiente cuenta")
-                        break
-                    if resp.status_code == 429:
-                        logger.warning("ScraperAPI 429 (demasiadas peticiones), esperando 5s...")
-                        time.sleep(5)
-                        continue
-                    if resp.status_code == 500 and intento < 2:
-                        delay = 10 + (5 * intento)
-                        logger.warning(f"ScraperAPI 500, reintentando en {delay}s...")
-                        time.sleep(delay)
-                        continue
-                    if resp.status_code == 500:
-                        logger.warning("ScraperAPI 500 persistente, rotando a siguiente cuenta")
-                        break
-                    if resp.status_code not in (403, 401):
-                        resp.raise_for_status()
-                        break
-
-                if resp and resp.status_code == 200:
-                    break
-                if resp and resp.status_code == 404:
+                resp = session.post(
+                    SCRAPER_API_URL,
+                    params=scraper_params,
+                    json=payload,
+                    headers=headers,
+                    timeout=SCRAPER_TIMEOUT,
+                )
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    # Sin sleep ni reintento en el thread: cuenta para el circuito y la fila queda en la cola
+                    logger.warning(f"ScraperAPI {resp.status_code}, consulta diferida cedula {cedula}")
+                    API_BREAKER.fallo()
+                    return {"status": "diferida", "error": f"API no disponible ({resp.status_code})"}
+                if resp.status_code in (403, 401):
+                    pool.mark_exhausted(api_key)
+                    motivo = 'creditos agotados' if resp.status_code == 403 else 'key invalida'
+                    logger.warning(f"ScraperAPI {resp.status_code} ({motivo}), rotando a siguiente cuenta")
+                    if pool.get_pool_size() == 0:
+                        logger.info("ScraperAPI: todas las cuentas agotadas, reiniciando ciclo...")
+                        time.sleep(2)
+                    continue
+                API_BREAKER.exito()
+                if resp.status_code == 404:
                     try:
-                        data_404 = resp.json()
-                        if data_404.get('status_code') == 13:
-                            return {"status": "not_found"}
+                        if es_no_censo(resp.json()):
+                            return {"status": "not_found", "no_censo": True}
                     except Exception:
                         pass
                     logger.warning("API 404 inesperado - sin retry")
                     _registrar_cedula_fallo(cedula)
                     return {"status": "api_error", "error": "API no disponible (404)"}
-                if resp and resp.status_code in (403, 401, 500):
-                    if resp.status_code == 500:
-                        ciclos_500 += 1
-                        if ciclos_500 >= max_ciclos_500:
-                            logger.warning(f"ScraperAPI 500 tras {max_ciclos_500} ciclos, cedula {cedula} - api_error")
-                            _registrar_cedula_fallo(cedula)
-                            return {"status": "api_error", "error": "API temporalmente no disponible (500)"}
-                    if pool.get_pool_size() == 0:
-                        logger.info("ScraperAPI: todas las cuentas agotadas, reiniciando ciclo...")
-                        time.sleep(2)
-                    continue
-                if resp and resp.status_code != 200:
+                if resp.status_code != 200:
                     resp.raise_for_status()
+                break
+            if resp is not None and resp.status_code == 200:
+                break
 
         if not resp or resp.status_code != 200:
             return None
 
-        data = resp.json()
-
-        if data.get('status') is False and data.get('status_code') == 13:
-            return {"status": "not_found"}
-
-        if not data.get('status') or not data.get('data'):
-            return None
-
-        inner = data.get('data', {})
-        voter = inner.get('voter', {}) or {}
-        polling_place = inner.get('polling_place', {}) or {}
-        place_address = (polling_place.get('place_address') or {}) if polling_place else {}
-
-        # Validar: si no hay datos de votante, puesto ni novelty, la cedula no existe
-        has_voter = bool(voter.get('identification'))
-        has_place = bool(polling_place.get('stand') or place_address.get('address') or place_address.get('state'))
-        has_novelty = bool(inner.get('novelty'))
-        if not has_voter and not has_place and not has_novelty:
-            return {"status": "not_found"}
-
-        if not inner.get('is_in_census', True) and inner.get('novelty'):
-            nov = inner['novelty'][0]
-            return {
-                "nuip": str(voter.get('identification', '')),
-                "departamento": "NO HABILITADA",
-                "municipio": "NO HABILITADA",
-                "puesto": nov.get('name', 'NO HABILITADA'),
-                "direccion": "NO HABILITADA",
-                "mesa": "0",
-                "zona": "",
-            }
-
-        return {
-            "nuip": str(voter.get('identification', cedula)),
-            "departamento": place_address.get('state') or '',
-            "municipio": place_address.get('town') or '',
-            "puesto": polling_place.get('stand') or '',
-            "direccion": place_address.get('address') or '',
-            "mesa": str(polling_place.get('table', '')),
-            "zona": str(place_address.get('zone', '')),
-        }
+        return normalizar_respuesta(resp.json(), cedula)
     except requests.RequestException as e:
         logger.error(f"Error API: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            code = e.response.status_code
-            if code in (403, 404):
-                _registrar_cedula_fallo(cedula)
-            if code == 404:
-                return {"status": "api_error", "error": "API no disponible (404)"}
-            if code == 403:
-                return {"status": "api_error", "error": "API no disponible (403 Forbidden)"}
-            if code == 500:
-                return {"status": "api_error", "error": "API no disponible (500)"}
+        respuesta = getattr(e, 'response', None)
+        if respuesta is None or respuesta.status_code == 429 or respuesta.status_code >= 500:
+            # Timeout / error de conexión / 5xx: cuenta para el circuito y se difiere
+            API_BREAKER.fallo()
+            return {"status": "diferida", "error": str(e)}
+        code = respuesta.status_code
+        if code in (403, 404):
+            _registrar_cedula_fallo(cedula)
+        if code == 404:
+            return {"status": "api_error", "error": "API no disponible (404)"}
+        if code == 403:
+            return {"status": "api_error", "error": "API no disponible (403 Forbidden)"}
         return {"status": "api_error", "error": str(e)}
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
         return None
+    finally:
+        if prueba:
+            API_BREAKER.cancelar()
 
 
 def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50) -> List[Dict]:
     """Obtiene cedulas pendientes de consultar"""
     url = f"{SUPABASE_FUNCTIONS_URL}/consultas-pendientes"
     try:
-        resp = requests.get(
+        resp = supabase_get(
             url,
+            CONSULTA_API_TOKEN,
             params={'tipo': tipo, 'limit': limit},
-            headers={'Authorization': f'Bearer {CONSULTA_API_TOKEN}'},
             timeout=30
         )
         if resp.status_code == 401:
@@ -504,7 +445,7 @@ def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50) -
         data = resp.json()
         consultas = data.get('consultas', [])
         if not consultas:
-            logger.info(f"Supabase OK (HTTP 200) pero 0 consultas pendientes en cola")
+            logger.debug("Supabase OK (HTTP 200) pero 0 consultas pendientes en cola")
         return consultas
     except requests.exceptions.Timeout:
         logger.error(f"Supabase: Timeout al conectar con {url}")
@@ -520,14 +461,14 @@ def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50) -
 def enviar_resultado(cola_id: str, cedula: str, exito: bool, datos: Optional[Dict] = None, error: Optional[str] = None) -> bool:
     """Envia resultado a Lovable Cloud"""
     try:
-        # Usar requests directo para Supabase (evitar headers de Registraduria)
-        resp = requests.post(
+        # Sesión propia de Supabase (keep-alive, sin headers de Registraduria)
+        resp = supabase_post_json(
             f"{SUPABASE_FUNCTIONS_URL}/recibir-datos",
-            json={
+            CONSULTA_API_TOKEN,
+            {
                 'cola_id': cola_id, 'cedula': cedula, 'tipo': 'registraduria',
                 'exito': exito, 'datos': datos, 'error': error
             },
-            headers={'Authorization': f'Bearer {CONSULTA_API_TOKEN}', 'Content-Type': 'application/json'},
             timeout=30
         )
         if resp.status_code in (401, 404):
@@ -548,6 +489,100 @@ def procesar_consulta(consulta: Dict) -> tuple:
     return (consulta, resultado)
 
 
+def enviar_consulta(consulta: Dict, resultado: Optional[Dict[str, Any]]) -> None:
+    """Envía a recibir-datos el resultado de una consulta (las diferidas no se envían)."""
+    cola_id = consulta['id']
+    cedula = consulta['cedula']
+    if resultado and resultado.get('status') == 'diferida':
+        # Sin envío: la fila sigue pendiente y se reintenta cuando la API responda
+        logger.info(f"Diferida cedula={cedula}: {resultado.get('error')}")
+    elif resultado and resultado.get('status') == 'api_error':
+        ok = enviar_resultado(cola_id, cedula, False, error=resultado.get('error', 'Error API'))
+        logger.info(f"Enviado api_error cedula={cedula}: {'OK' if ok else 'FAIL'}")
+    elif resultado and resultado.get('status') == 'not_found' and resultado.get('no_censo'):
+        ok = enviar_resultado(cola_id, cedula, True, datos=NO_CENSO_DATOS)
+        logger.info("Enviado NO CENSO cedula=%(cedula)s: %(ok)s", {'cedula': cedula, 'ok': 'OK' if ok else 'FAIL'},
+                    extra={'evento': 'enviado'} if ok else None)
+    elif resultado and resultado.get('status') == 'not_found':
+        ok = enviar_resultado(cola_id, cedula, False, error='Cedula no encontrada')
+        logger.info(f"Enviado not_found cedula={cedula}: {'OK' if ok else 'FAIL'}")
+    elif resultado is None:
+        ok = enviar_resultado(cola_id, cedula, False, error='Error en consulta (CAPTCHA o API)')
+        logger.info(f"Enviado error_consulta cedula={cedula}: {'OK' if ok else 'FAIL'}")
+    elif resultado and any(v for k, v in resultado.items() if k != 'status' and v):
+        ok = enviar_resultado(cola_id, cedula, True, datos=resultado)
+        logger.info("Enviado exito cedula=%(cedula)s: %(ok)s", {'cedula': cedula, 'ok': 'OK' if ok else 'FAIL'},
+                    extra={'evento': 'enviado'} if ok else None)
+    else:
+        ok = enviar_resultado(cola_id, cedula, False, error='No se encontraron datos')
+        logger.info(f"Enviado sin_datos cedula={cedula}: {'OK' if ok else 'FAIL'}")
+
+
+def _consultar_en_daemons(consultas: List[Dict]) -> Set[Future]:
+    """
+    Lanza procesar_consulta sobre el lote en MAX_WORKERS threads daemon y retorna un Future por consulta.
+    Los threads de ThreadPoolExecutor se esperan al salir del intérprete: una consulta abandonada
+    al vencer el drenado retendría el proceso. `future.cancel()` sigue sirviendo para las que no empezaron.
+    """
+    pendientes: Queue = Queue()
+    futures = set()
+    for consulta in consultas:
+        future: Future = Future()
+        futures.add(future)
+        pendientes.put((future, consulta))
+
+    def trabajar():
+        while True:
+            try:
+                future, consulta = pendientes.get_nowait()
+            except Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(procesar_consulta(consulta))
+            except BaseException as e:
+                future.set_exception(e)
+
+    for i in range(min(MAX_WORKERS, len(consultas))):
+        Thread(target=trabajar, name=f'lote-consulta-{i}', daemon=True).start()
+    return futures
+
+
+def procesar_lote(consultas: List[Dict], detener: Event) -> int:
+    """
+    Consulta y envía un lote. Si se pide detener, no inicia las consultas que faltan (siguen
+    pendientes en la cola) y envía lo que termine dentro de WORKER_DRAIN_SECONDS.
+    Retorna cuántas consultas quedaron en curso al vencer el plazo.
+    """
+    futures = _consultar_en_daemons(consultas)
+    limite = None
+    enviadas = canceladas = 0
+    while futures:
+        if detener.is_set() and limite is None:
+            limite = time.monotonic() + config.settings.WORKER_DRAIN_SECONDS
+            canceladas = sum(f.cancel() for f in futures)
+        restante = 0.2 if limite is None else limite - time.monotonic()
+        if restante <= 0:
+            break
+        hechos, futures = wait(futures, timeout=min(0.2, restante), return_when=FIRST_COMPLETED)
+        for future in hechos:
+            if future.cancelled():
+                continue
+            try:
+                enviar_consulta(*future.result())
+                if limite is not None:
+                    enviadas += 1
+            except Exception as e:
+                logger.error(f"Error procesando consulta: {e}")
+    if limite is None:
+        return 0
+    abandonadas = sum(not f.done() for f in futures)
+    logger.info(f"Drenado: {enviadas} resultado(s) enviados, {canceladas} consulta(s) sin empezar quedan en la cola, "
+                f"{abandonadas} abandonada(s) por plazo")
+    return abandonadas
+
+
 def main():
     """Loop principal: obtener pendientes -> consultar -> enviar"""
     if not TWOCAPTCHA_API_KEY:
@@ -560,70 +595,44 @@ def main():
     logger.info(f"ScraperAPI: {pool.get_total_size()} cuentas | premium={SCRAPER_PREMIUM}")
     if ENABLE_TOKEN_POOL:
         _warmup_token_pool(num_tokens=2)
-    running = True
+    # Las esperas usan detener.wait() para que SIGTERM no espere a que terminen
+    detener = Event()
 
     def stop(sig, frame):
-        nonlocal running
-        running = False
+        detener.set()
         logger.info("Deteniendo...")
 
     signal.signal(signal.SIGINT, stop)
     signal.signal(signal.SIGTERM, stop)
 
-    while running:
+    while not detener.is_set():
         try:
             _limpiar_cache_fallidas()
+            pausa = API_BREAKER.segundos_abierto()
+            if pausa > 0:
+                # Circuito abierto: no reclamar filas que solo se diferirían
+                logger.info(f"API no disponible, próxima prueba en {pausa:.0f}s")
+                detener.wait(min(pausa, 30))
+                continue
             consultas = obtener_consultas_pendientes(tipo='registraduria', limit=2)
 
             if consultas:
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                    futures = {executor.submit(procesar_consulta, c): c for c in consultas}
-                    for future in as_completed(futures):
-                        if not running:
-                            executor.shutdown(wait=False, cancel_futures=True)
-                            break
-                        try:
-                            consulta, resultado = future.result()
-                            cola_id = consulta['id']
-                            cedula = consulta['cedula']
-                            if resultado and resultado.get('status') == 'api_error':
-                                ok = enviar_resultado(cola_id, cedula, False, error=resultado.get('error', 'Error API'))
-                                logger.info(f"Enviado api_error cedula={cedula}: {'OK' if ok else 'FAIL'}")
-                            elif resultado and resultado.get('status') == 'not_found':
-                                ok = enviar_resultado(cola_id, cedula, False, error='Cedula no encontrada')
-                                logger.info(f"Enviado not_found cedula={cedula}: {'OK' if ok else 'FAIL'}")
-                            elif resultado is None:
-                                ok = enviar_resultado(cola_id, cedula, False, error='Error en consulta (CAPTCHA o API)')
-                                logger.info(f"Enviado error_consulta cedula={cedula}: {'OK' if ok else 'FAIL'}")
-                            elif resultado and any(v for k, v in resultado.items() if k != 'status' and v):
-                                datos = {
-                                    'municipio_votacion': resultado.get('municipio'),
-                                    'departamento_votacion': resultado.get('departamento'),
-                                    'puesto_votacion': resultado.get('puesto'),
-                                    'direccion_puesto': resultado.get('direccion'),
-                                    'mesa': resultado.get('mesa'),
-                                    'zona_votacion': resultado.get('zona'),
-                                }
-                                datos = {k: v for k, v in datos.items() if v is not None}
-                                ok = enviar_resultado(cola_id, cedula, True, datos=datos)
-                                logger.info(f"Enviado exito cedula={cedula} puesto={resultado.get('puesto', '')}: {'OK' if ok else 'FAIL'}")
-                            else:
-                                ok = enviar_resultado(cola_id, cedula, False, error='No se encontraron datos')
-                                logger.info(f"Enviado sin_datos cedula={cedula}: {'OK' if ok else 'FAIL'}")
-                        except Exception as e:
-                            logger.error(f"Error procesando consulta: {e}")
-                time.sleep(5)
+                procesar_lote(consultas, detener)
+                detener.wait(5)
 
             if not consultas:
                 logger.info("Sin consultas. Esperando 30s...")
-                time.sleep(30)
+                detener.wait(30)
 
         except KeyboardInterrupt:
             break
         except Exception as e:
             logger.error(f"Error: {e}", exc_info=True)
-            time.sleep(10)
+            detener.wait(10)
 
+    FAILED_CEDULAS_CACHE.close()
+    # Las consultas abandonadas corren en threads daemon: la salida normal no las espera
+    # y los atexit (logging, snapshots) corren igual
     logger.info("Worker finalizado")
 
 
@@ -8,14 +8,11 @@ import re
 from datetime import datetime
 from threading import Thread, Lock
 from collections import deque
-from bs4 import BeautifulSoup
-
-# Cargar variables de entorno desde .env
-from dotenv import load_dotenv
-_dir = os.path.dirname(os.path.abspath(__file__))
-load_dotenv(os.path.join(os.path.dirname(_dir), '.env'))
 
+from config import settings  # carga .env
 from utils.captcha_solver import TwoCaptchaSolver
+from utils.jsonl import JsonlWriter
+from services.normalizer import FORMATO_REGISTRO, NO_HABILITADA, normalizar_respuesta, registro_no_censo
 
 logger = logging.getLogger(__name__)
 
@@ -299,88 +296,19 @@ class RegistraduriaScraperAuto:
                     "timestamp": datetime.now().isoformat()
                 }
             
-            # Manejar caso específico: status_code 13 (NO CENSO)
-            if (api_response.get('status') == False and 
-                api_response.get('status_code') == 13 and 
-                not api_response.get('data')):
-                
+            # Mismo mapeo que el worker (services/normalizer.py), con columnas del registro
+            registro = normalizar_respuesta(api_response, formato=FORMATO_REGISTRO)
+            if registro is not None and registro.get('no_censo'):
                 logger.info("Cédula no encontrada en el censo (status_code: 13)")
-                
-                no_censo_data = [{
-                    'NUIP': 'NO CENSO',
-                    'DEPARTAMENTO': 'NO CENSO',
-                    'MUNICIPIO': 'NO CENSO',
-                    'PUESTO': 'NO CENSO',
-                    'DIRECCIÓN': 'NO CENSO',
-                    'MESA': '0',
-                    'ZONA': 'NO CENSO'
-                }]
-                
+                registro = registro_no_censo()
+            elif registro is not None and registro.get('status') == 'not_found':
                 return {
-                    "status": "success",
-                    "timestamp": datetime.now().isoformat(),
-                    "data": no_censo_data,
-                    "total_records": 1,
-                    "nuip": "NO CENSO"
-                }
-            
-            # Verificar si la respuesta tiene éxito y data
-            if api_response.get('status') and api_response.get('data'):
-                data = api_response.get('data', {})
-                is_in_census = data.get('is_in_census', True)
-                novelty = data.get('novelty', [])
-                voter = data.get('voter', {})
-                
-                # Manejar caso: Cédula no habilitada (is_in_census: false con novelty)
-                if not is_in_census and novelty:
-                    logger.info("Cédula no habilitada en el censo")
-                    
-                    novelty_name = novelty[0].get('name', 'NO HABILITADA').upper()
-                    
-                    no_habilitada_data = [{
-                        'NUIP': str(voter.get('identification', '')),
-                        'DEPARTAMENTO': 'NO HABILITADA',
-                        'MUNICIPIO': 'NO HABILITADA',
-                        'PUESTO': novelty_name,
-                        'DIRECCIÓN': 'NO HABILITADA',
-                        'MESA': '0',
-                        'ZONA': 'NO HABILITADA'
-                    }]
-                    
-                    return {
-                        "status": "success",
-                        "timestamp": datetime.now().isoformat(),
-                        "data": no_habilitada_data,
-                        "total_records": 1,
-                        "nuip": str(voter.get('identification', ''))
-                    }
-                
-                # Caso normal: Cédula habilitada con puesto de votación
-                polling_place = data.get('polling_place', {})
-                place_address = polling_place.get('place_address', {})
-                
-                filtered_data = [{
-                    'NUIP': str(voter.get('identification', '')),
-                    'DEPARTAMENTO': place_address.get('state', ''),
-                    'MUNICIPIO': place_address.get('town', ''),
-                    'PUESTO': polling_place.get('stand', ''),
-                    'DIRECCIÓN': place_address.get('address', ''),
-                    'MESA': str(polling_place.get('table', '')),
-                    'ZONA': str(place_address.get('zone', ''))
-                }]
-                
-                logger.debug("Datos extraídos correctamente")
-                
-                result = {
-                    "status": "success",
+                    "status": "error",
+                    "message": "Cédula no encontrada",
                     "timestamp": datetime.now().isoformat(),
-                    "data": filtered_data,
-                    "total_records": len(filtered_data),
-                    "nuip": str(voter.get('identification', ''))
+                    "api_response": api_response
                 }
-                
-                return result
-            else:
+            elif registro is None:
                 error_msg = api_response.get('message', 'Error desconocido')
                 return {
                     "status": "error",
@@ -388,7 +316,17 @@ class RegistraduriaScraperAuto:
                     "timestamp": datetime.now().isoformat(),
                     "api_response": api_response
                 }
-        
+            elif registro.get('DEPARTAMENTO') == NO_HABILITADA:
+                logger.info("Cédula no habilitada en el censo")
+
+            return {
+                "status": "success",
+                "timestamp": datetime.now().isoformat(),
+                "data": [registro],
+                "total_records": 1,
+                "nuip": registro['NUIP']
+            }
+
         except Exception as e:
             logger.warning(f"Error al extraer datos: {e}")
             return {
@@ -442,24 +380,46 @@ class RegistraduriaScraperAuto:
                 "nuip": str(nuip)
             }
     
-    def scrape_multiple_nuips(self, nuips, delay=2):
-        """Consulta múltiples NUIPs con delay entre cada una"""
+    def scrape_multiple_nuips(self, nuips, delay=2, writer=None, en_memoria=False):
+        """
+        Consulta múltiples NUIPs con delay entre cada una.
+
+        Cada resultado se escribe apenas se obtiene en un JSONL (writer, o uno nuevo de
+        abrir_writer_resultados() que se cierra al terminar) y no se acumula en memoria:
+        el retorno trae el resumen y el archivo. Con en_memoria=True se acumulan en
+        "results" sin escribir nada (listas cortas).
+        """
         results = {
             "status": "success",
             "timestamp": datetime.now().isoformat(),
             "total_nuips": len(nuips),
-            "results": []
         }
+        propio = writer is None and not en_memoria
+        if propio:
+            writer = abrir_writer_resultados()
+        if writer is None:
+            results["results"] = []
+        else:
+            results["archivo"] = writer.path
+            results["exitosos"] = 0
         
-        for i, nuip in enumerate(nuips, 1):
-            logger.info(f"Consultando NUIP {i}/{len(nuips)}: {nuip}")
-            
-            result = self.scrape_nuip(nuip)
-            results["results"].append(result)
-            
-            if i < len(nuips):
-                logger.debug(f"Esperando {delay} segundos...")
-                time.sleep(delay)
+        try:
+            for i, nuip in enumerate(nuips, 1):
+                logger.info(f"Consultando NUIP {i}/{len(nuips)}: {nuip}")
+                
+                result = self.scrape_nuip(nuip)
+                if writer is None:
+                    results["results"].append(result)
+                else:
+                    writer.escribir(result)
+                    results["exitosos"] += result.get("status") == "success"
+                
+                if i < len(nuips):
+                    logger.debug(f"Esperando {delay} segundos...")
+                    time.sleep(delay)
+        finally:
+            if propio:
+                writer.close()
         
         return results
     
@@ -469,25 +429,32 @@ class RegistraduriaScraperAuto:
             self.session.close()
             logger.debug("Sesión cerrada")
 
-# Función para guardar resultados
-def save_registraduria_results(data, filename=None):
-    """Guarda los resultados en un archivo JSON"""
+def abrir_writer_resultados(filename=None, **kwargs):
+    """JsonlWriter para resultados del scraper (por defecto resultados/consulta_registraduria_<timestamp>.jsonl)"""
     if filename is None:
         timestamp = time.strftime("%Y%m%d_%H%M%S")
-        results_dir = "resultados"
-        os.makedirs(results_dir, exist_ok=True)
-        filename = os.path.join(results_dir, f"consulta_registraduria_{timestamp}.json")
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        filename = os.path.join("resultados", f"consulta_registraduria_{timestamp}.jsonl")
+    return JsonlWriter(filename, **kwargs)
+
+
+# Función para guardar resultados
+def save_registraduria_results(data, filename=None):
+    """
+    Guarda resultados en JSON Lines, un resultado por línea.
+    Si data trae "results" (scrape_multiple_nuips con en_memoria=True), cada resultado va en su línea.
+    """
+    with abrir_writer_resultados(filename) as writer:
+        for result in (data.get("results") if isinstance(data, dict) and "results" in data else [data]):
+            writer.escribir(result)
     
-    logger.info(f"Resultados guardados en: {filename}")
-    return filename
+    logger.info(f"Resultados guardados en: {writer.path}")
+    return writer.path
 
 # Ejemplo de uso
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-    API_KEY = os.getenv('TWOCAPTCHA_API_KEY') or os.getenv('APIKEY_2CAPTCHA')
+    from utils.logging_setup import configurar_logging
+    configurar_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE)
+    API_KEY = settings.API_KEY_2CAPTCHA
     
     if not API_KEY:
         logger.error("No se encontró la API key de 2captcha (TWOCAPTCHA_API_KEY o APIKEY_2CAPTCHA)")
@@ -0,0 +1,82 @@
+"""
+Servidor HTTP admin opcional del worker (WORKER_ADMIN_PORT > 0).
+
+Rutas registradas por el worker, p.ej. POST /wake. Si WORKER_ADMIN_TOKEN está
+configurado, exige 'Authorization: Bearer <token>'.
+"""
+
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# handler(params, cuerpo) -> (status, content_type, cuerpo)
+Handler = Callable[[Dict[str, str], bytes], Tuple[int, str, bytes]]
+
+
+def respuesta_json(data, status: int = 200) -> Tuple[int, str, bytes]:
+    return status, 'application/json', json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class AdminServer:
+    """ThreadingHTTPServer con tabla de rutas (método, path) -> handler."""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, token: str = ''):
+        self.host = host
+        self.port = port
+        self.token = token
+        self._rutas: Dict[Tuple[str, str], Handler] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def ruta(self, metodo: str, path: str, handler: Handler) -> None:
+        self._rutas[(metodo.upper(), path.rstrip('/') or '/')] = handler
+
+    def start(self) -> None:
+        admin = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _atender(self, metodo: str) -> None:
+                parsed = urlparse(self.path)
+                handler = admin._rutas.get((metodo, parsed.path.rstrip('/') or '/'))
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if admin.token and self.headers.get('Authorization') != f'Bearer {admin.token}':
+                    status, ctype, data = respuesta_json({'error': 'unauthorized'}, 401)
+                elif handler is None:
+                    status, ctype, data = respuesta_json({'error': 'not found'}, 404)
+                else:
+                    try:
+                        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+                        status, ctype, data = handler(params, cuerpo)
+                    except Exception as e:
+                        logger.error(f"Admin {metodo} {parsed.path}: {e}", exc_info=True)
+                        status, ctype, data = respuesta_json({'error': str(e)}, 500)
+                self.send_response(status)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self) -> None:
+                self._atender('GET')
+
+            def do_POST(self) -> None:
+                self._atender('POST')
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        Thread(target=self._server.serve_forever, name='admin-server', daemon=True).start()
+        logger.info(f"Admin HTTP escuchando en {self.host}:{self.port} ({', '.join(f'{m} {p}' for m, p in self._rutas)})")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
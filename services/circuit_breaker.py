@@ -0,0 +1,133 @@
+"""
+Circuit breaker de proceso para la API remota de consulta.
+
+- closed: las llamadas pasan; se registra el resultado en una ventana de
+  `ventana` segundos. Con al menos `min_llamadas` y una tasa de error >=
+  `umbral`, el circuito se abre.
+- open: las llamadas se rechazan sin tocar la red durante `espera` segundos
+  (el worker difiere la consulta a la cola en lugar de dormir en el thread).
+- half_open: pasado el plazo se deja pasar una llamada de prueba; si responde,
+  el circuito se cierra; si falla, se vuelve a abrir con espera doble (hasta
+  `espera_max`).
+
+Un "fallo" es que el servicio no responda: 5xx, 429, timeout o error de
+conexión. Respuestas como 403/404 cuentan como éxito (el servicio está arriba).
+"""
+
+import time
+import logging
+from collections import deque
+from threading import Lock
+from typing import Deque, Tuple
+
+logger = logging.getLogger(__name__)
+
+CERRADO = 'closed'
+ABIERTO = 'open'
+SEMI_ABIERTO = 'half_open'
+
+
+class CircuitBreaker:
+    """Breaker thread-safe por tasa de error en ventana deslizante, con backoff compartido."""
+
+    def __init__(self, nombre: str, ventana: float = 60.0, min_llamadas: int = 5, umbral: float = 0.5,
+                 espera: float = 30.0, espera_max: float = 300.0):
+        self.nombre = nombre
+        self.ventana = ventana
+        self.min_llamadas = max(1, min_llamadas)
+        self.umbral = umbral
+        self.espera_base = espera
+        self.espera_max = max(espera, espera_max)
+        self._lock = Lock()
+        self._llamadas: Deque[Tuple[float, bool]] = deque()
+        self._fallos = 0
+        self._estado = CERRADO
+        self._espera = espera
+        self._reabre = 0.0
+        self._prueba_en_curso = False
+        self.rechazadas = 0
+
+    def codigo_estado(self) -> int:
+        """0 closed, 1 open, 2 half_open (para el gauge de métricas)."""
+        return {CERRADO: 0, ABIERTO: 1, SEMI_ABIERTO: 2}[self.estado]
+
+    @property
+    def estado(self) -> str:
+        with self._lock:
+            if self._estado == ABIERTO and time.monotonic() >= self._reabre:
+                return SEMI_ABIERTO
+            return self._estado
+
+    def permitir(self) -> Tuple[bool, bool]:
+        """
+        (permitida, es_prueba): si la llamada puede ir a la red y si ocupa el turno de prueba.
+        En half_open solo pasa una prueba a la vez; solo quien la tiene debe llamar `cancelar()`.
+        """
+        with self._lock:
+            if self._estado == CERRADO:
+                return True, False
+            if self._estado == ABIERTO and time.monotonic() >= self._reabre:
+                self._estado = SEMI_ABIERTO
+                self._prueba_en_curso = False
+                logger.info(f"Circuito {self.nombre}: semi-abierto, probando la API")
+            if self._estado == SEMI_ABIERTO and not self._prueba_en_curso:
+                self._prueba_en_curso = True
+                return True, True
+            self.rechazadas += 1
+            return False, False
+
+    def segundos_abierto(self) -> float:
+        """Segundos hasta la próxima prueba (0 si el circuito deja pasar llamadas)."""
+        with self._lock:
+            if self._estado == CERRADO:
+                return 0.0
+            if self._estado == SEMI_ABIERTO:
+                return 0.0 if not self._prueba_en_curso else 1.0
+            return max(0.0, self._reabre - time.monotonic())
+
+    def exito(self) -> None:
+        with self._lock:
+            if self._estado != CERRADO:
+                logger.info(f"Circuito {self.nombre}: cerrado (la API volvió a responder)")
+                self._estado = CERRADO
+                self._espera = self.espera_base
+                self._prueba_en_curso = False
+                self._llamadas.clear()
+                self._fallos = 0
+            self._registrar(True)
+
+    def fallo(self) -> None:
+        with self._lock:
+            if self._estado == SEMI_ABIERTO:
+                self._espera = min(self.espera_max, self._espera * 2)
+                self._abrir('falló la prueba')
+                return
+            if self._estado == ABIERTO:
+                return
+            self._registrar(False)
+            total = len(self._llamadas)
+            if total >= self.min_llamadas and self._fallos / total >= self.umbral:
+                self._abrir(f"{self._fallos}/{total} fallos en {self.ventana:g}s")
+
+    def cancelar(self) -> None:
+        """La llamada de prueba terminó sin llegar a la API (p.ej. sin captcha): libera su turno."""
+        with self._lock:
+            if self._estado == SEMI_ABIERTO:
+                self._prueba_en_curso = False
+
+    def _registrar(self, ok: bool) -> None:
+        now = time.monotonic()
+        self._llamadas.append((now, ok))
+        self._fallos += not ok
+        limite = now - self.ventana
+        while self._llamadas and self._llamadas[0][0] < limite:
+            _, viejo_ok = self._llamadas.popleft()
+            self._fallos -= not viejo_ok
+
+    def _abrir(self, motivo: str) -> None:
+        self._estado = ABIERTO
+        self._prueba_en_curso = False
+        self._reabre = time.monotonic() + self._espera
+        self._llamadas.clear()
+        self._fallos = 0
+        logger.warning(f"Circuito {self.nombre}: abierto {self._espera:g}s ({motivo})")
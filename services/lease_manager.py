@@ -0,0 +1,127 @@
+"""
+Leases sobre filas de la cola de consultas.
+
+consultas-pendientes reclama las filas para este worker por QUEUE_LEASE_SECONDS
+y devuelve un lease_id por fila. Mientras la consulta está en proceso, un
+thread renueva los leases cada tercio del plazo; al detener el worker se
+liberan los que queden para que otra réplica los tome sin esperar a que venzan.
+"""
+
+import time
+import logging
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _cola_id(consulta: Dict[str, Any]) -> Optional[Hashable]:
+    return consulta.get('id') or consulta.get('cola_id')
+
+
+class LeaseManager:
+    """Registro thread-safe de leases vigentes con renovación en background."""
+
+    def __init__(self,
+                 renovar: Callable[[List[Dict[str, Any]]], Dict[Hashable, bool]],
+                 liberar: Callable[..., bool],
+                 lease_seconds: float):
+        # liberar(leases, timeout=None) -> True si la cola aceptó la liberación
+        self.renovar = renovar
+        self.liberar = liberar
+        self.lease_seconds = lease_seconds
+        self._leases: Dict[Hashable, str] = {}
+        self._lock = Lock()
+        self._detener = Event()
+        self._thread: Optional[Thread] = None
+
+    def registrar(self, consultas: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Registra los leases de las filas recibidas. Retorna las mismas filas."""
+        consultas = list(consultas)
+        with self._lock:
+            for consulta in consultas:
+                cid = _cola_id(consulta)
+                lease_id = consulta.get('lease_id')
+                if cid is not None and lease_id:
+                    self._leases[cid] = lease_id
+        return consultas
+
+    def soltar(self, consulta: Dict[str, Any]) -> None:
+        """Deja de renovar el lease de la fila (resultado ya enviado)."""
+        cid = _cola_id(consulta)
+        if cid is not None:
+            with self._lock:
+                self._leases.pop(cid, None)
+
+    def devolver(self, consulta: Dict[str, Any]) -> bool:
+        """Libera el lease de una fila que no se procesó (consulta diferida) para que vuelva a la cola ya."""
+        cid = _cola_id(consulta)
+        if cid is None:
+            return False
+        with self._lock:
+            lease_id = self._leases.pop(cid, None)
+        if not lease_id:
+            return False
+        try:
+            return bool(self.liberar([{'cola_id': cid, 'lease_id': lease_id}]))
+        except Exception as e:
+            logger.warning(f"Error devolviendo la fila {cid} a la cola: {e}")
+            return False
+
+    def vigentes(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{'cola_id': cid, 'lease_id': lid} for cid, lid in self._leases.items()]
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='lease-renovacion', daemon=True)
+            self._thread.start()
+
+    def stop(self, liberar: bool = True, timeout: Optional[float] = None) -> int:
+        """
+        Detiene la renovación y (opcional) libera los leases restantes. Retorna cuántos se liberaron.
+        `timeout` acota la espera total (renovación en curso + petición de liberación).
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        self._detener.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5 if limite is None else min(5, max(0.0, limite - time.monotonic())))
+        if not liberar:
+            return 0
+        return self.liberar_todos(timeout=None if limite is None else max(0.5, limite - time.monotonic()))
+
+    def liberar_todos(self, timeout: Optional[float] = None) -> int:
+        leases = self.vigentes()
+        if not leases:
+            return 0
+        ok = False
+        try:
+            ok = self.liberar(leases) if timeout is None else self.liberar(leases, timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Error liberando {len(leases)} lease(s): {e}")
+        if ok:
+            with self._lock:
+                for lease in leases:
+                    if self._leases.get(lease['cola_id']) == lease['lease_id']:
+                        del self._leases[lease['cola_id']]
+            logger.info(f"Liberados {len(leases)} lease(s) de la cola")
+        return len(leases) if ok else 0
+
+    def _run(self) -> None:
+        intervalo = max(0.1, self.lease_seconds / 3)
+        while not self._detener.wait(intervalo):
+            leases = self.vigentes()
+            if not leases:
+                continue
+            try:
+                renovados = self.renovar(leases)
+            except Exception as e:
+                logger.warning(f"Error renovando {len(leases)} lease(s): {e}")
+                continue
+            perdidos = [l for l in leases if renovados.get(l['cola_id']) is False]
+            if perdidos:
+                logger.warning(f"Leases perdidos (otra réplica puede tomar la fila): {[l['cola_id'] for l in perdidos]}")
+                with self._lock:
+                    for lease in perdidos:
+                        if self._leases.get(lease['cola_id']) == lease['lease_id']:
+                            del self._leases[lease['cola_id']]
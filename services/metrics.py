@@ -0,0 +1,184 @@
+"""
+Métricas del worker en memoria (contadores, histogramas y gauges) con salida
+en formato de texto de Prometheus.
+
+Las etapas del worker registran su duración con etiquetas `stage` y `outcome`:
+
+    with METRICS.medir('worker_stage_seconds', stage='lookup') as m:
+        resultado = query_registraduria(cedula)
+        m.outcome = clase_resultado(resultado)
+
+El worker las expone en GET /metrics del servidor admin (WORKER_ADMIN_PORT).
+"""
+
+import time
+import bisect
+from threading import Lock
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Consultas a la Registraduría: de milisegundos (cache) a minutos (2Captcha)
+BUCKETS_DEFAULT: Tuple[float, ...] = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> _Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: _Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pares = list(labels) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    escapar = lambda v: v.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+    return '{' + ','.join(f'{k}="{escapar(v)}"' for k, v in pares) + '}'
+
+
+def _fmt_num(v: float) -> str:
+    if v == float('inf'):
+        return '+Inf'
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Histograma:
+    __slots__ = ('conteos', 'suma', 'total')
+
+    def __init__(self, n_buckets: int):
+        self.conteos = [0] * n_buckets
+        self.suma = 0.0
+        self.total = 0
+
+
+class _Medicion:
+    """Context manager de METRICS.medir(); `outcome` se puede fijar dentro del bloque."""
+
+    def __init__(self, registro: 'Metrics', nombre: str, labels: Dict[str, object], outcome: str):
+        self._registro = registro
+        self._nombre = nombre
+        self._labels = labels
+        self.outcome = outcome
+        self._inicio = 0.0
+
+    def __enter__(self) -> '_Medicion':
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None and self.outcome == 'ok':
+            self.outcome = 'exception'
+        self._registro.observar(self._nombre, time.perf_counter() - self._inicio,
+                                outcome=self.outcome, **self._labels)
+
+
+class Metrics:
+    """Registro thread-safe de métricas."""
+
+    def __init__(self, buckets: Sequence[float] = BUCKETS_DEFAULT):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self._ayuda: Dict[str, str] = {}
+        self._contadores: Dict[str, Dict[_Labels, float]] = {}
+        self._histogramas: Dict[str, Dict[_Labels, _Histograma]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+
+    def describir(self, nombre: str, ayuda: str) -> None:
+        self._ayuda[nombre] = ayuda
+
+    def incrementar(self, nombre: str, valor: float = 1, **labels) -> None:
+        clave = _labels(labels)
+        with self._lock:
+            serie = self._contadores.setdefault(nombre, {})
+            serie[clave] = serie.get(clave, 0) + valor
+
+    def observar(self, nombre: str, segundos: float, **labels) -> None:
+        clave = _labels(labels)
+        idx = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._histogramas.setdefault(nombre, {})
+            h = serie.get(clave)
+            if h is None:
+                h = serie[clave] = _Histograma(len(self.buckets))
+            if idx < len(h.conteos):
+                h.conteos[idx] += 1
+            h.suma += segundos
+            h.total += 1
+
+    def medir(self, nombre: str, outcome: str = 'ok', **labels) -> _Medicion:
+        return _Medicion(self, nombre, labels, outcome)
+
+    def gauge(self, nombre: str, fn: Callable[[], float], ayuda: str = '') -> None:
+        """Registra un gauge calculado al exportar (p.ej. tamaño de una cola)."""
+        with self._lock:
+            self._gauges[nombre] = fn
+        if ayuda:
+            self.describir(nombre, ayuda)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+            self._gauges.clear()
+
+    def snapshot(self) -> Dict[str, Dict[_Labels, Tuple[int, float]]]:
+        """{nombre: {labels: (total, suma)}} de los histogramas (para benchmarks)."""
+        with self._lock:
+            return {n: {k: (h.total, h.suma) for k, h in serie.items()} for n, serie in self._histogramas.items()}
+
+    def render(self) -> str:
+        """Texto en formato de exposición de Prometheus (version 0.0.4)."""
+        with self._lock:
+            contadores = {n: dict(s) for n, s in self._contadores.items()}
+            histogramas = {
+                n: {k: (list(h.conteos), h.suma, h.total) for k, h in s.items()}
+                for n, s in self._histogramas.items()
+            }
+            gauges = dict(self._gauges)
+        lineas: List[str] = []
+
+        def _cabecera(nombre: str, tipo: str) -> None:
+            if nombre in self._ayuda:
+                lineas.append(f'# HELP {nombre} {self._ayuda[nombre]}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+
+        for nombre in sorted(contadores):
+            _cabecera(nombre, 'counter')
+            for labels, valor in sorted(contadores[nombre].items()):
+                lineas.append(f'{nombre}{_fmt_labels(labels)} {_fmt_num(valor)}')
+        for nombre in sorted(histogramas):
+            _cabecera(nombre, 'histogram')
+            for labels, (conteos, suma, total) in sorted(histogramas[nombre].items()):
+                acumulado = 0
+                for limite, n in zip(self.buckets, conteos):
+                    acumulado += n
+                    lineas.append(f'{nombre}_bucket{_fmt_labels(labels, ("le", _fmt_num(limite)))} {acumulado}')
+                lineas.append(f'{nombre}_bucket{_fmt_labels(labels, ("le", "+Inf"))} {total}')
+                lineas.append(f'{nombre}_sum{_fmt_labels(labels)} {_fmt_num(suma)}')
+                lineas.append(f'{nombre}_count{_fmt_labels(labels)} {total}')
+        for nombre in sorted(gauges):
+            try:
+                valor = float(gauges[nombre]())
+            except Exception:
+                continue
+            _cabecera(nombre, 'gauge')
+            lineas.append(f'{nombre} {_fmt_num(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+
+def clase_resultado(resultado: Optional[dict]) -> str:
+    """Clase de resultado de una consulta: success, not_found, no_censo, api_error, diferida o empty."""
+    if not resultado:
+        return 'empty'
+    status = resultado.get('status')
+    if status in ('api_error', 'diferida'):
+        return status
+    if status == 'not_found':
+        return 'no_censo' if resultado.get('no_censo') else 'not_found'
+    if any(v for k, v in resultado.items() if k != 'status' and v):
+        return 'success'
+    return 'empty'
+
+
+METRICS = Metrics()
+METRICS.describir('worker_stage_seconds', 'Duración de cada etapa del worker por resultado')
+METRICS.describir('worker_consultas_total', 'Consultas terminadas por clase de resultado y origen')
+METRICS.describir('worker_envios_total', 'Resultados enviados a recibir-datos por resultado')
@@ -0,0 +1,109 @@
+"""
+Normalización de respuestas de la API de infovotantes (get-information).
+
+Una sola tabla define cómo cada campo de la respuesta llega a:
+- 'datos':    el dict `datos` que recibe recibir-datos (worker, main.py)
+- 'registro': la fila del scraper (NUIP, DEPARTAMENTO, ..., DIRECCIÓN) que se guarda en JSON
+
+El resultado se arma en una sola pasada sobre la tabla, directamente con las
+claves del formato pedido. Resultados que no son un lugar de votación:
+- {"status": "not_found", "no_censo": True}: status_code 13 (no está en el censo)
+- {"status": "not_found"}: respuesta sin votante, puesto ni novedad
+- None: respuesta sin `status`/`data` utilizable (probar otro election_code)
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+FORMATO_DATOS = 'datos'
+FORMATO_REGISTRO = 'registro'
+
+NO_CENSO = 'NO CENSO'
+NO_HABILITADA = 'NO HABILITADA'
+
+# Valor especial: en NO HABILITADA el puesto es el nombre de la novedad
+_NOVEDAD = object()
+
+# (clave en datos, columna del registro, ruta en data, valor si NO HABILITADA)
+CAMPOS: Tuple[Tuple[str, str, Tuple[str, ...], Any], ...] = (
+    ('municipio_votacion', 'MUNICIPIO', ('polling_place', 'place_address', 'town'), NO_HABILITADA),
+    ('departamento_votacion', 'DEPARTAMENTO', ('polling_place', 'place_address', 'state'), NO_HABILITADA),
+    ('puesto_votacion', 'PUESTO', ('polling_place', 'stand'), _NOVEDAD),
+    ('direccion_puesto', 'DIRECCIÓN', ('polling_place', 'place_address', 'address'), NO_HABILITADA),
+    ('mesa', 'MESA', ('polling_place', 'table'), '0'),
+    ('zona_votacion', 'ZONA', ('polling_place', 'place_address', 'zone'), ''),
+)
+# El NUIP solo va en el registro del scraper; recibir-datos ya conoce la cédula
+CAMPO_NUIP = ('nuip', 'NUIP', ('voter', 'identification'))
+
+NO_CENSO_DATOS = {clave: NO_CENSO for clave, _, _, _ in CAMPOS}
+
+_COLUMNA = {FORMATO_DATOS: 0, FORMATO_REGISTRO: 1}
+# Campos que, con valor, indican que la respuesta trae un puesto de votación
+_INDICAN_LUGAR = frozenset(('puesto_votacion', 'direccion_puesto', 'departamento_votacion'))
+_DATOS_POR_COLUMNA = {columna: clave for clave, columna, _, _ in CAMPOS}
+
+
+def _valor(data: Dict[str, Any], ruta: Tuple[str, ...]) -> str:
+    v: Any = data
+    for parte in ruta:
+        if not isinstance(v, dict):
+            return ''
+        v = v.get(parte)
+    return '' if v is None else str(v)
+
+
+def es_no_censo(respuesta: Optional[Dict[str, Any]]) -> bool:
+    """True si la respuesta (200 o cuerpo de un 404) es status_code 13."""
+    return bool(respuesta) and respuesta.get('status') is False and respuesta.get('status_code') == 13
+
+
+def normalizar_respuesta(respuesta: Optional[Dict[str, Any]], cedula: str = '',
+                         formato: str = FORMATO_DATOS) -> Optional[Dict[str, Any]]:
+    """Convierte el JSON de get-information al formato pedido ('datos' o 'registro')."""
+    if es_no_censo(respuesta):
+        return {"status": "not_found", "no_censo": True}
+    if not respuesta or not respuesta.get('status') or not respuesta.get('data'):
+        return None
+    data = respuesta['data']
+    if not isinstance(data, dict):
+        return None
+    col = _COLUMNA[formato]
+    nuip = _valor(data, CAMPO_NUIP[2])
+    novedades = data.get('novelty') or []
+
+    if not data.get('is_in_census', True) and novedades:
+        novedad = (novedades[0] or {}).get('name') or NO_HABILITADA
+        resultado = {CAMPO_NUIP[col]: nuip} if formato == FORMATO_REGISTRO else {}
+        for campo in CAMPOS:
+            resultado[campo[col]] = novedad if campo[3] is _NOVEDAD else campo[3]
+        return resultado
+
+    resultado = {CAMPO_NUIP[col]: nuip or str(cedula)} if formato == FORMATO_REGISTRO else {}
+    hay_lugar = False
+    for campo in CAMPOS:
+        v = _valor(data, campo[2])
+        resultado[campo[col]] = v
+        hay_lugar = hay_lugar or (bool(v) and campo[0] in _INDICAN_LUGAR)
+    if not nuip and not hay_lugar and not novedades:
+        return {"status": "not_found"}
+    return resultado
+
+
+def registro_no_censo() -> Dict[str, str]:
+    """Fila del scraper para status_code 13."""
+    fila = {CAMPO_NUIP[1]: NO_CENSO}
+    for _, columna, _, _ in CAMPOS:
+        fila[columna] = NO_CENSO
+    return fila
+
+
+def datos_desde_registro(registro: Dict[str, Any]) -> Dict[str, str]:
+    """`datos` de recibir-datos a partir de una fila del scraper (fallback)."""
+    datos = {}
+    for columna, v in registro.items():
+        clave = _DATOS_POR_COLUMNA.get(columna)
+        if clave is None and columna == 'DIRECCION':
+            clave = 'direccion_puesto'
+        if clave is not None:
+            datos[clave] = '' if v is None else str(v)
+    return datos
@@ -0,0 +1,165 @@
+"""
+Outbox local (SQLite) para resultados que no se pudieron enviar a Supabase.
+
+Cada payload se guarda con su idempotency_key; un thread en background lo
+reenvía con backoff exponencial hasta que recibir-datos lo acepta, la
+respuesta indica que no tiene sentido reintentar, o se agota OUTBOX_MAX_INTENTOS.
+Sobrevive reinicios: lo pendiente se reenvía al arrancar.
+
+`al_resolver(payload)` se llama cuando un payload sale del outbox (enviado,
+rechazado o descartado): el worker lo usa para dejar de renovar el lease de
+la fila, que se mantiene mientras el resultado espera aquí.
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResultOutbox:
+    """Cola persistente de payloads pendientes de envío con reintento en background."""
+
+    def __init__(self, path: str,
+                 enviar: Callable[[Dict[str, Any]], Tuple[bool, bool]],
+                 backoff_base: float = 5.0, backoff_max: float = 300.0,
+                 max_intentos: int = 100, lote: int = 20,
+                 al_resolver: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.path = path
+        # enviar(payload) -> (ok, reintentable)
+        self.enviar = enviar
+        self.al_resolver = al_resolver
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_intentos = max_intentos
+        self.lote = lote
+        self._lock = Lock()
+        self._detener = Event()
+        self._despertar = Event()
+        self._thread: Optional[Thread] = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            ' clave TEXT PRIMARY KEY,'
+            ' cola_id TEXT,'
+            ' payload TEXT NOT NULL,'
+            ' intentos INTEGER NOT NULL DEFAULT 0,'
+            ' proximo REAL NOT NULL,'
+            ' creado REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS outbox_proximo ON outbox (proximo)')
+        pendientes = self.pendientes()
+        if pendientes:
+            logger.info(f"Outbox: {pendientes} resultado(s) pendiente(s) de envío desde {path}")
+
+    def agregar(self, payload: Dict[str, Any], espera: Optional[float] = None) -> None:
+        """Guarda un payload para reenvío. Un payload con la misma idempotency_key no se duplica."""
+        clave = payload.get('idempotency_key') or f"{payload.get('cola_id')}"
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR IGNORE INTO outbox (clave, cola_id, payload, intentos, proximo, creado) VALUES (?, ?, ?, 0, ?, ?)',
+                (clave, str(payload.get('cola_id')), json.dumps(payload, ensure_ascii=False),
+                 now + (self.backoff_base if espera is None else espera), now),
+            )
+        logger.warning(f"Outbox: resultado guardado para reenvío cola_id={payload.get('cola_id')}")
+        self._despertar.set()
+
+    def contiene(self, cola_id: Hashable) -> bool:
+        """True si hay un resultado pendiente de envío para la fila."""
+        with self._lock:
+            row = self._conn.execute('SELECT 1 FROM outbox WHERE cola_id = ? LIMIT 1', (str(cola_id),)).fetchone()
+        return row is not None
+
+    def cola_ids(self) -> Set[str]:
+        """Filas (cola_id como texto) con un resultado pendiente de envío."""
+        with self._lock:
+            return {r[0] for r in self._conn.execute('SELECT DISTINCT cola_id FROM outbox')}
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='outbox-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._detener.set()
+        self._despertar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Reenvío en curso: lo pendiente ya está en disco, no cerrar la conexión bajo el flusher
+                return
+        with self._lock:
+            self._conn.close()
+
+    def flush(self) -> int:
+        """Reenvía los payloads vencidos. Retorna cuántos se enviaron con éxito."""
+        with self._lock:
+            filas = self._conn.execute(
+                'SELECT clave, payload, intentos FROM outbox WHERE proximo <= ? ORDER BY proximo LIMIT ?',
+                (time.time(), self.lote),
+            ).fetchall()
+        enviados = 0
+        for clave, payload_json, intentos in filas:
+            if self._detener.is_set():
+                break
+            payload = json.loads(payload_json)
+            try:
+                ok, reintentable = self.enviar(payload)
+            except Exception as e:
+                logger.warning(f"Outbox: error reenviando cola_id={payload.get('cola_id')}: {e}")
+                ok, reintentable = False, True
+            intentos += 1
+            if ok or not reintentable or intentos >= self.max_intentos:
+                if ok:
+                    enviados += 1
+                    logger.info(f"Outbox: reenviado cola_id={payload.get('cola_id')} (intento {intentos})")
+                else:
+                    logger.error(f"Outbox: descartado cola_id={payload.get('cola_id')} tras {intentos} intento(s)"
+                                 f"{'' if reintentable else ' (rechazado por recibir-datos)'}")
+                with self._lock:
+                    self._conn.execute('DELETE FROM outbox WHERE clave = ?', (clave,))
+                if self.al_resolver is not None:
+                    try:
+                        self.al_resolver(payload)
+                    except Exception as e:
+                        logger.warning(f"Outbox: error en al_resolver cola_id={payload.get('cola_id')}: {e}")
+                continue
+            espera = min(self.backoff_max, self.backoff_base * (2 ** intentos)) * random.uniform(0.8, 1.2)
+            with self._lock:
+                self._conn.execute(
+                    'UPDATE outbox SET intentos = ?, proximo = ? WHERE clave = ?',
+                    (intentos, time.time() + espera, clave),
+                )
+            # Si sigue fallando, Supabase probablemente está caído: no insistir con el resto del lote
+            break
+        return enviados
+
+    def _proximo(self) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute('SELECT MIN(proximo) FROM outbox').fetchone()
+        return row[0] if row else None
+
+    def _run(self) -> None:
+        while not self._detener.is_set():
+            try:
+                self.flush()
+                proximo = self._proximo()
+            except Exception as e:
+                logger.error(f"Outbox: error en flusher: {e}", exc_info=True)
+                proximo = None
+            espera = 5.0 if proximo is None else min(5.0, max(0.1, proximo - time.time()))
+            self._despertar.wait(espera)
+            self._despertar.clear()
@@ -0,0 +1,52 @@
+"""
+Polling adaptativo de la cola de consultas.
+
+Con la cola vacía la espera crece exponencialmente (con jitter) desde
+POLL_MIN_INTERVAL hasta POLL_MAX_INTERVAL; apenas llega trabajo vuelve al
+mínimo. despertar() interrumpe la espera en curso (hook para notificaciones
+de la Edge Function vía el endpoint admin /wake).
+"""
+
+import random
+import logging
+from threading import Event
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptivePoller:
+    """Calcula la espera entre polls y permite despertar al que espera."""
+
+    def __init__(self, minimo: float = 1.0, maximo: float = 15.0, factor: float = 2.0, jitter: float = 0.2):
+        self.minimo = max(0.0, minimo)
+        self.maximo = max(self.minimo, maximo)
+        self.factor = max(1.0, factor)
+        self.jitter = min(max(0.0, jitter), 1.0)
+        self._vacios = 0
+        self._despertar = Event()
+
+    def con_trabajo(self) -> None:
+        """El último poll trajo filas: volver a polling rápido."""
+        self._vacios = 0
+
+    def siguiente_espera(self) -> float:
+        """Registra un poll vacío y retorna cuánto esperar antes del siguiente."""
+        base = min(self.maximo, self.minimo * (self.factor ** self._vacios))
+        if base < self.maximo:
+            # Ya en el máximo no se cuenta más: factor ** n desbordaría (OverflowError) tras horas sin trabajo
+            self._vacios += 1
+        if self.jitter:
+            base *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(self.maximo, base)
+
+    def esperar(self, segundos: float) -> bool:
+        """Espera hasta `segundos` o hasta despertar(). Retorna True si fue despertado."""
+        despertado = self._despertar.wait(segundos)
+        self._despertar.clear()
+        if despertado:
+            self._vacios = 0
+        return despertado
+
+    def despertar(self) -> None:
+        """Interrumpe la espera en curso (nuevas filas en la cola o detención)."""
+        self._despertar.set()
@@ -0,0 +1,195 @@
+"""
+Perfilado bajo demanda del worker en ejecución (cProfile y tracemalloc).
+
+- CPU: `iniciar_cpu(segundos)` perfila con cProfile las llamadas envueltas con
+  `envolver()` (etapas del pipeline) durante `segundos`. En Python 3.11 cProfile
+  solo mide el thread que lo activa, así que cada thread usa su propio
+  Profile y al terminar se combinan en un solo `.prof` (pstats / snakeviz)
+  más un `.txt` con las funciones de mayor tiempo acumulado.
+- Memoria: `snapshot_memoria()` activa tracemalloc en la primera llamada y
+  guarda una línea base; las siguientes escriben las líneas con más memoria
+  asignada y la diferencia contra el snapshot anterior. `detener_memoria()`
+  lo apaga (tracemalloc tiene costo mientras está activo).
+
+Sin captura activa, el costo es una lectura de atributo por llamada envuelta.
+Los archivos quedan en PROFILE_DIR con nombre <tipo>-<fecha>-<pid>.
+"""
+
+import os
+import time
+import logging
+from functools import wraps
+from threading import Lock, Thread, current_thread, get_ident
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Espera máxima (s) a que terminen las llamadas en curso al cerrar una captura de CPU
+ESPERA_LLAMADAS = 60.0
+
+
+class _Captura:
+    __slots__ = ('inicio', 'segundos', 'ruta', 'perfiles', 'activos', 'cerrada')
+
+    def __init__(self, segundos: float, ruta: str):
+        self.inicio = time.time()
+        self.segundos = segundos
+        self.ruta = ruta
+        # thread id -> (nombre del thread, cProfile.Profile)
+        self.perfiles: Dict[int, Any] = {}
+        # threads con una llamada perfilada en curso
+        self.activos: Dict[int, int] = {}
+        self.cerrada = False
+
+
+class Perfilador:
+    """Capturas de cProfile por thread y snapshots de tracemalloc, escritos en `directorio`."""
+
+    def __init__(self, directorio: str, frames: int = 1, top: int = 40):
+        self.directorio = directorio
+        self.frames = max(1, frames)
+        self.top = top
+        self._lock = Lock()
+        self._captura: Optional[_Captura] = None
+        self._snapshot_anterior = None
+
+    def _ruta(self, tipo: str, extension: str) -> str:
+        os.makedirs(self.directorio, exist_ok=True)
+        return os.path.join(self.directorio, f"{tipo}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.{extension}")
+
+    # --- CPU ---
+
+    def envolver(self, fn: F) -> F:
+        """Envuelve `fn` para que se perfile mientras haya una captura de CPU activa."""
+        @wraps(fn)
+        def _envuelta(*args, **kwargs):
+            captura = self._captura
+            if captura is None:
+                return fn(*args, **kwargs)
+            perfil = self._entrar(captura)
+            if perfil is None:
+                return fn(*args, **kwargs)
+            try:
+                return perfil.runcall(fn, *args, **kwargs)
+            finally:
+                with self._lock:
+                    captura.activos[get_ident()] -= 1
+        return _envuelta  # type: ignore[return-value]
+
+    def _entrar(self, captura: _Captura):
+        ident = get_ident()
+        with self._lock:
+            if captura.cerrada:
+                return None
+            if ident not in captura.perfiles:
+                import cProfile
+                captura.perfiles[ident] = (current_thread().name, cProfile.Profile())
+            captura.activos[ident] = captura.activos.get(ident, 0) + 1
+            return captura.perfiles[ident][1]
+
+    def iniciar_cpu(self, segundos: float) -> str:
+        """Inicia una captura de `segundos`; retorna la ruta del .prof. ValueError si ya hay una en curso."""
+        if segundos <= 0:
+            raise ValueError("segundos debe ser mayor que 0")
+        with self._lock:
+            if self._captura is not None:
+                raise ValueError(f"Ya hay una captura de CPU en curso ({self._captura.ruta})")
+            self._captura = _Captura(segundos, self._ruta('cpu', 'prof'))
+            captura = self._captura
+        Thread(target=self._terminar_cpu, args=(captura,), name='perfil-cpu', daemon=True).start()
+        logger.info(f"Perfil de CPU iniciado por {segundos:g}s -> {captura.ruta}")
+        return captura.ruta
+
+    def _terminar_cpu(self, captura: _Captura) -> None:
+        time.sleep(captura.segundos)
+        with self._lock:
+            captura.cerrada = True
+        # Un Profile solo puede leerse cuando su thread terminó la llamada (runcall lo desactiva)
+        limite = time.monotonic() + ESPERA_LLAMADAS
+        while time.monotonic() < limite:
+            with self._lock:
+                if not any(captura.activos.values()):
+                    break
+            time.sleep(0.2)
+        with self._lock:
+            listos = [(nombre, p) for ident, (nombre, p) in captura.perfiles.items() if not captura.activos.get(ident)]
+            en_curso = len(captura.perfiles) - len(listos)
+            self._captura = None
+        try:
+            self._escribir_cpu(captura, listos, en_curso)
+        except Exception as e:
+            logger.error(f"No se pudo escribir el perfil de CPU {captura.ruta}: {e}")
+
+    def _escribir_cpu(self, captura: _Captura, perfiles, en_curso: int) -> None:
+        import io
+        import pstats
+        if not perfiles:
+            logger.warning(f"Perfil de CPU sin llamadas en {captura.segundos:g}s (worker inactivo); no se escribió archivo")
+            return
+        stats = pstats.Stats(perfiles[0][1])
+        for _, perfil in perfiles[1:]:
+            stats.add(perfil)
+        stats.dump_stats(captura.ruta)
+        texto = io.StringIO()
+        texto.write(f"# {captura.segundos:g}s desde {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(captura.inicio))}, "
+                    f"threads: {', '.join(sorted(n for n, _ in perfiles))}")
+        if en_curso:
+            texto.write(f" ({en_curso} thread(s) omitidos: llamada aún en curso)")
+        texto.write('\n')
+        stats.stream = texto
+        stats.sort_stats('cumulative').print_stats(self.top)
+        ruta_txt = captura.ruta[:-len('.prof')] + '.txt'
+        with open(ruta_txt, 'w', encoding='utf-8') as f:
+            f.write(texto.getvalue())
+        logger.info(f"Perfil de CPU escrito: {captura.ruta} ({len(perfiles)} thread(s)), resumen en {ruta_txt}")
+
+    # --- Memoria ---
+
+    def snapshot_memoria(self) -> Dict[str, Any]:
+        """
+        Primera llamada: activa tracemalloc y toma la línea base.
+        Siguientes: escribe top por línea y diferencia contra el snapshot anterior.
+        """
+        import tracemalloc
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._snapshot_anterior = tracemalloc.take_snapshot()
+                logger.info(f"tracemalloc activado ({self.frames} frame(s)); el próximo snapshot compara contra este")
+                return {'estado': 'iniciado'}
+            snapshot = tracemalloc.take_snapshot()
+            anterior, self._snapshot_anterior = self._snapshot_anterior, snapshot
+        filtros = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        )
+        snapshot = snapshot.filter_traces(filtros)
+        actual, pico = tracemalloc.get_traced_memory()
+        ruta = self._ruta('mem', 'txt')
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(f"# tracemalloc: {actual / 1024 / 1024:.1f} MiB actual, {pico / 1024 / 1024:.1f} MiB pico\n")
+            f.write(f"\n## Top {self.top} por línea\n")
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                f.write(f"{stat}\n")
+            if anterior is not None:
+                f.write(f"\n## Diferencia contra el snapshot anterior (top {self.top})\n")
+                for stat in snapshot.compare_to(anterior.filter_traces(filtros), 'lineno')[:self.top]:
+                    f.write(f"{stat}\n")
+        snapshot.dump(ruta[:-len('.txt')] + '.tracemalloc')
+        logger.info(f"Snapshot de memoria escrito: {ruta} ({actual / 1024 / 1024:.1f} MiB trazados)")
+        return {'estado': 'snapshot', 'archivo': ruta, 'mib': round(actual / 1024 / 1024, 1)}
+
+    def detener_memoria(self) -> bool:
+        """Apaga tracemalloc. Retorna False si no estaba activo."""
+        import tracemalloc
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return False
+            tracemalloc.stop()
+            self._snapshot_anterior = None
+        logger.info("tracemalloc desactivado")
+        return True
@@ -10,22 +10,21 @@ Usa API directa de infovotantes (sin Playwright).
 import os
 import time
 import json
+import uuid
+import hashlib
 import logging
 import requests
 from collections import deque
 from threading import Lock
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
 # Cargar config desde el proyecto
 from config import settings
-
-# Intentar librería 2captcha
-try:
-    from twocaptcha import TwoCaptcha
-    from twocaptcha.api import ApiException
-    HAS_2CAPTCHA_LIB = True
-except ImportError:
-    HAS_2CAPTCHA_LIB = False
+from services.circuit_breaker import CircuitBreaker
+from services.supabase_client import supabase_get, supabase_post_json
+from utils.single_flight import SingleFlight
+from services.state_backend import EspacioTTL, StateBackend, crear_backend
+from services.normalizer import NO_CENSO, NO_CENSO_DATOS, datos_desde_registro, es_no_censo, normalizar_respuesta
 
 # Configuración
 TWOCAPTCHA_API_KEY = settings.API_KEY_2CAPTCHA or os.getenv('TWOCAPTCHA_API_KEY')
@@ -41,10 +40,42 @@ ENABLE_TOKEN_POOL = True
 TOKEN_POOL_MAX = 3
 TOKEN_TTL = 90
 FAILED_CACHE_TTL = 20 * 60  # 20 min
+# Plazo del reclamo de una consulta remota en el estado compartido (captcha + hasta 2 election codes)
+EN_VUELO_TTL = 180
 
 _http_session: Optional[requests.Session] = None
 _session_lock = Lock()
-FAILED_CEDULAS_CACHE: Dict[str, float] = {}
+# Estado compartido entre réplicas (STATE_PATH); se abre al primer uso
+_estado: Optional[StateBackend] = None
+_estado_lock = Lock()
+_ultima_purga = 0.0
+
+
+def _get_estado() -> StateBackend:
+    global _estado
+    with _estado_lock:
+        if _estado is None:
+            _estado = crear_backend(settings.STATE_PATH, settings.STATE_MEMORY_MAX)
+        return _estado
+
+
+FAILED_CEDULAS_CACHE = EspacioTTL(_get_estado, 'fallidas', FAILED_CACHE_TTL)
+_result_cache = None
+_result_cache_lock = Lock()
+# Librería 2captcha: se importa en el primer captcha, no al arrancar el worker
+_twocaptcha = None
+# Una sola consulta remota por cedula a la vez dentro del proceso
+_consultas_en_vuelo = SingleFlight('api')
+_fallbacks_en_vuelo = SingleFlight('scraper')
+# Circuito compartido por todos los threads: con la API caída las consultas se difieren sin dormir
+API_BREAKER = CircuitBreaker(
+    'api',
+    ventana=settings.API_BREAKER_VENTANA,
+    min_llamadas=settings.API_BREAKER_MIN_LLAMADAS,
+    umbral=settings.API_BREAKER_UMBRAL,
+    espera=settings.API_BREAKER_ESPERA,
+    espera_max=settings.API_BREAKER_ESPERA_MAX,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +95,60 @@ def _get_session() -> requests.Session:
         return _http_session
 
 
+def _get_result_cache():
+    """Cache de resultados sobre el estado compartido."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            from services.result_cache import ResultCache, CLASE_LUGAR, CLASE_NO_CENSO, CLASE_NO_HABILITADA
+            _result_cache = ResultCache(_get_estado(), {
+                CLASE_LUGAR: settings.RESULT_CACHE_TTL_LUGAR,
+                CLASE_NO_CENSO: settings.RESULT_CACHE_TTL_NO_CENSO,
+                CLASE_NO_HABILITADA: settings.RESULT_CACHE_TTL_NO_HABILITADA,
+            })
+        return _result_cache
+
+
+def purgar_estado(intervalo: float = 60.0) -> int:
+    """Borra entradas vencidas del estado compartido, como máximo una vez cada `intervalo` s."""
+    global _ultima_purga
+    now = time.monotonic()
+    if now - _ultima_purga < intervalo:
+        return 0
+    _ultima_purga = now
+    try:
+        return _get_estado().purge()
+    except Exception as e:
+        logger.warning(f"Error purgando estado compartido: {e}")
+        return 0
+
+
+def _election_codes() -> List[str]:
+    codes = getattr(settings, 'ELECTION_CODES_TO_TRY', ['congreso', 'presidencial', 'alcaldes'])
+    return [c for c in ((ec.strip() if isinstance(ec, str) else str(ec)) for ec in codes) if c]
+
+
+def obtener_resultado_cacheado(cedula: str) -> Optional[Dict[str, Any]]:
+    """Resultado vigente en cache para la cedula (primer election_code con dato), o None."""
+    try:
+        cache = _get_result_cache()
+        for ec in _election_codes():
+            result = cache.get(cedula, ec)
+            if result is not None:
+                return result
+    except Exception as e:
+        logger.warning(f"Error leyendo cache de resultados: {e}")
+    return None
+
+
+def guardar_resultado_cache(cedula: str, election_code: str, resultado: Optional[Dict[str, Any]]) -> None:
+    """Guarda el resultado en cache si su clase es cacheable (lugar, NO CENSO, NO HABILITADA)."""
+    try:
+        _get_result_cache().put(cedula, election_code, resultado)
+    except Exception as e:
+        logger.warning(f"Error guardando cache de resultados: {e}")
+
+
 class TokenCache:
     _instance = None
     _lock = Lock()
@@ -102,22 +187,69 @@ class TokenCache:
 
 
 def _cedula_fallo_reciente(cedula: str) -> bool:
-    now = time.time()
-    if cedula in FAILED_CEDULAS_CACHE:
-        if now - FAILED_CEDULAS_CACHE[cedula] < FAILED_CACHE_TTL:
-            return True
-        del FAILED_CEDULAS_CACHE[cedula]
-    return False
+    try:
+        return str(cedula) in FAILED_CEDULAS_CACHE
+    except Exception as e:
+        logger.warning(f"Error leyendo cédulas bloqueadas: {e}")
+        return False
 
 
 def _registrar_cedula_fallo(cedula: str) -> None:
-    FAILED_CEDULAS_CACHE[cedula] = time.time()
+    try:
+        FAILED_CEDULAS_CACHE.add(str(cedula))
+    except Exception as e:
+        logger.warning(f"Error registrando cédula bloqueada: {e}")
+
+
+def _reclamar(cedula: str) -> Optional[bool]:
+    """
+    Reclama la consulta remota de la cédula en el estado compartido (un solo intento, sin esperar).
+    True si esta réplica la reclamó, False si otra réplica ya la tiene en vuelo, None si el estado
+    no está disponible (se consulta igual, sin reclamo que soltar).
+    """
+    try:
+        return _get_estado().add('en_vuelo', str(cedula), settings.WORKER_ID, EN_VUELO_TTL)
+    except Exception as e:
+        logger.warning(f"Error coordinando consulta en vuelo: {e}")
+        return None
+
+
+def en_vuelo_en_otra_replica(cedula: str) -> bool:
+    """True si otra réplica tiene reclamada la consulta remota de la cédula (hasta que la suelte o venza)."""
+    try:
+        duenio = _get_estado().get('en_vuelo', str(cedula))
+    except Exception as e:
+        logger.warning(f"Error leyendo consulta en vuelo: {e}")
+        return False
+    return duenio is not None and duenio != settings.WORKER_ID
+
+
+def _soltar_reclamo(cedula: str) -> None:
+    try:
+        _get_estado().delete('en_vuelo', str(cedula))
+    except Exception as e:
+        logger.warning(f"Error liberando consulta en vuelo: {e}")
+
+
+def _libreria_2captcha():
+    """(TwoCaptcha, ApiException) de la librería 2captcha, o None si no está instalada."""
+    global _twocaptcha
+    if _twocaptcha is None:
+        try:
+            from twocaptcha import TwoCaptcha
+            from twocaptcha.api import ApiException
+            _twocaptcha = (TwoCaptcha, ApiException)
+        except ImportError:
+            _twocaptcha = False
+    return _twocaptcha or None
 
 
 def _solve_recaptcha_direct(site_key: str, page_url: str) -> Optional[str]:
     if not TWOCAPTCHA_API_KEY:
         return None
-    if HAS_2CAPTCHA_LIB:
+    libreria = _libreria_2captcha()
+    if libreria is not None:
+        TwoCaptcha, ApiException = libreria
         try:
             solver = TwoCaptcha(TWOCAPTCHA_API_KEY, pollingInterval=1, defaultTimeout=60)
             result = solver.recaptcha(sitekey=site_key, url=page_url, invisible=0, pollingInterval=1)
@@ -179,7 +311,10 @@ def solve_recaptcha(site_key: str, page_url: str) -> Optional[str]:
 
 
 def _query_registraduria_with_code(cedula: str, election_code: str) -> Optional[Dict[str, Any]]:
-    """Consulta API con un election_code especifico. Retorna None si status_code 13 (para reintentar)."""
+    """
+    Consulta API con un election_code especifico. Retorna None si no hubo respuesta usable
+    (sin captcha o 200 sin data) y {"status": "diferida"} si la API responde 5xx/429 (sin reintentos en el thread).
+    """
     session = _get_session()
     payload = {
         "identification": str(cedula),
@@ -202,134 +337,124 @@ def _query_registraduria_with_code(cedula: str, election_code: str) -> Optional[
             'Sec-Fetch-Mode': 'cors',
             'Sec-Fetch-Site': 'cross-site',
         }
-        resp = None
-        for intento in range(3):
-            resp = session.post(API_URL, json=payload, headers=headers, timeout=15)
-            if resp.status_code == 200:
-                break
-            if resp.status_code == 404:
-                try:
-                    data = resp.json()
-                    if data.get('status_code') == 13:
-                        return {"status": "not_found", "no_censo": True}  # Respuesta definitiva, no probar otros codes
-                except Exception:
-                    pass
-                _registrar_cedula_fallo(cedula)
-                return {"status": "api_error", "error": "API no disponible (404)"}
-            if resp.status_code == 403:
-                break
-            if resp.status_code == 500 and intento < 2:
-                time.sleep(10 + 5 * intento)
-                continue
-            if resp.status_code != 403:
-                resp.raise_for_status()
-                break
-
-        if resp and resp.status_code == 200:
-            break
-        if resp and resp.status_code == 403:
+        resp = session.post(API_URL, json=payload, headers=headers, timeout=15)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            # Servicio caído o saturado: sin sleep en el thread; la consulta vuelve a la cola
+            API_BREAKER.fallo()
+            return {"status": "diferida", "error": f"API no disponible ({resp.status_code})"}
+        API_BREAKER.exito()
+        if resp.status_code == 404:
+            try:
+                if es_no_censo(resp.json()):
+                    return {"status": "not_found", "no_censo": True}  # Respuesta definitiva, no probar otros codes
+            except Exception:
+                pass
+            _registrar_cedula_fallo(cedula)
+            return {"status": "api_error", "error": "API no disponible (404)"}
+        if resp.status_code == 403:
             if intento_token < 1:
                 time.sleep(5)
                 continue
             _registrar_cedula_fallo(cedula)
             return {"status": "api_error", "error": "API no disponible (403 Forbidden)"}
-        if resp and resp.status_code != 200:
+        if resp.status_code != 200:
             resp.raise_for_status()
+        break
 
     if not resp or resp.status_code != 200:
         return None
 
-    data = resp.json()
-    if data.get('status') is False and data.get('status_code') == 13:
-        return {"status": "not_found", "no_censo": True}
-    if not data.get('status') or not data.get('data'):
-        return None
+    return normalizar_respuesta(resp.json(), cedula)
 
-    inner = data.get('data', {})
-    voter = inner.get('voter', {}) or {}
-    polling_place = inner.get('polling_place', {}) or {}
-    place_address = (polling_place.get('place_address') or {}) if polling_place else {}
-
-    has_voter = bool(voter.get('identification'))
-    has_place = bool(polling_place.get('stand') or place_address.get('address') or place_address.get('state'))
-    has_novelty = bool(inner.get('novelty'))
-    if not has_voter and not has_place and not has_novelty:
-        return {"status": "not_found"}
-
-    if not inner.get('is_in_census', True) and inner.get('novelty'):
-        nov = inner['novelty'][0]
-        return {
-            "nuip": str(voter.get('identification', '')),
-            "departamento": "NO HABILITADA",
-            "municipio": "NO HABILITADA",
-            "puesto": nov.get('name', 'NO HABILITADA'),
-            "direccion": "NO HABILITADA",
-            "mesa": "0",
-            "zona": "",
-        }
 
-    return {
-        "nuip": str(voter.get('identification', cedula)),
-        "departamento": place_address.get('state') or '',
-        "municipio": place_address.get('town') or '',
-        "puesto": polling_place.get('stand') or '',
-        "direccion": place_address.get('address') or '',
-        "mesa": str(polling_place.get('table', '')),
-        "zona": str(place_address.get('zone', '')),
-    }
+def query_registraduria(cedula: str) -> Optional[Dict[str, Any]]:
+    """Consulta lugar de votacion via API directa. Llamadas concurrentes para la misma cedula comparten resultado."""
+    return _consultas_en_vuelo.do(str(cedula), _query_registraduria, cedula)
+
+
+def _query_registraduria(cedula: str) -> Optional[Dict[str, Any]]:
+    """Consulta lugar de votacion, salvo que otra réplica ya la esté consultando (estado compartido)."""
+    if _cedula_fallo_reciente(cedula):
+        return {"status": "api_error", "error": "Reintento bloqueado 20min"}
+    reclamada = _reclamar(cedula)
+    if reclamada is False:
+        # Otra réplica la está consultando: no esperar en este thread. Si ya dejó el resultado, usarlo;
+        # si no, diferir (la fila vuelve cuando vence su lease y para entonces el resultado está en cache)
+        cacheado = obtener_resultado_cacheado(cedula)
+        if cacheado is not None:
+            return cacheado
+        return {"status": "diferida", "error": "En vuelo en otra réplica", "en_otra_replica": True}
+    try:
+        return _consultar_api(cedula)
+    finally:
+        if reclamada:
+            _soltar_reclamo(cedula)
 
 
-def query_registraduria(cedula: str) -> Optional[Dict[str, Any]]:
+def _consultar_api(cedula: str) -> Optional[Dict[str, Any]]:
     """Consulta lugar de votacion via API directa. Intenta multiples election_code."""
+    permitida, prueba = API_BREAKER.permitir()
+    if not permitida:
+        return {"status": "diferida", "error": f"Circuito abierto ({API_BREAKER.segundos_abierto():.0f}s)"}
     try:
-        if _cedula_fallo_reciente(cedula):
-            return {"status": "api_error", "error": "Reintento bloqueado 20min"}
-        logger.info(f"Consultando Registraduria para cedula: {cedula}")
-
-        election_codes = getattr(settings, 'ELECTION_CODES_TO_TRY', ['congreso', 'presidencial', 'alcaldes'])
-        for ec in election_codes:
-            ec = ec.strip() if isinstance(ec, str) else str(ec)
-            if not ec:
-                continue
-            logger.info(f"Intentando election_code={ec}")
+        logger.info("Consultando Registraduria para cedula: %(cedula)s", {'cedula': cedula}, extra={'evento': 'consulta'})
+
+        sin_datos = None
+        for ec in _election_codes():
+            logger.debug("Intentando election_code=%s", ec)
             result = _query_registraduria_with_code(cedula, ec)
             if result is None:
                 continue
             if result.get('status') == 'not_found':
                 if result.get('no_censo'):
-                    return result  # Respuesta definitiva, no probar otros codes
+                    guardar_resultado_cache(cedula, ec, result)
+                    return result  # Respuesta definitiva (status_code 13), no probar otros codes
+                sin_datos = result
                 continue
-            if result.get('status') == 'api_error':
+            if result.get('status') in ('api_error', 'diferida'):
                 return result
+            guardar_resultado_cache(cedula, ec, result)
             return result
 
-        return {"status": "not_found", "no_censo": True}
+        # Ningún code dio respuesta definitiva: not_found sin no_censo (no se cachea) si la API
+        # respondió sin datos; None si no hubo respuesta usable (sin captcha, 200 sin data) -> reintento 'error'
+        return sin_datos
     except requests.RequestException as e:
         logger.error(f"Error API: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            code = e.response.status_code
-            if code == 404:
-                try:
-                    data = e.response.json()
-                    if data.get('status_code') == 13:
-                        return {"status": "not_found", "no_censo": True}
-                except Exception:
-                    pass
-            if code in (403, 404):
-                _registrar_cedula_fallo(cedula)
-            if code == 404:
-                return {"status": "api_error", "error": "API no disponible (404)"}
-            if code == 403:
-                return {"status": "api_error", "error": "API no disponible (403 Forbidden)"}
-            if code == 500:
-                return {"status": "api_error", "error": "API no disponible (500)"}
+        respuesta = getattr(e, 'response', None)
+        if respuesta is None or respuesta.status_code == 429 or respuesta.status_code >= 500:
+            # Timeout / error de conexión / 5xx: cuenta para el circuito y se difiere
+            API_BREAKER.fallo()
+            return {"status": "diferida", "error": str(e)}
+        code = respuesta.status_code
+        if code == 404:
+            try:
+                if es_no_censo(respuesta.json()):
+                    return {"status": "not_found", "no_censo": True}
+            except Exception:
+                pass
+        if code in (403, 404):
+            _registrar_cedula_fallo(cedula)
+        if code == 404:
+            return {"status": "api_error", "error": "API no disponible (404)"}
+        if code == 403:
+            return {"status": "api_error", "error": "API no disponible (403 Forbidden)"}
         return {"status": "api_error", "error": str(e)}
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
         return None
+    finally:
+        # Si la llamada de prueba no llegó a la API (sin captcha), otra puede probar
+        if prueba:
+            API_BREAKER.cancelar()
 
 
 def query_registraduria_scraper_fallback(cedula: str) -> Optional[Dict[str, Any]]:
+    """Fallback con scraper. Llamadas concurrentes para la misma cedula comparten resultado."""
+    return _fallbacks_en_vuelo.do(str(cedula), _query_registraduria_scraper_fallback, cedula)
+
+
+def _query_registraduria_scraper_fallback(cedula: str) -> Optional[Dict[str, Any]]:
     """Fallback con scraper Playwright cuando la API directa devuelve not_found."""
     if not getattr(settings, 'ENABLE_SCRAPER_FALLBACK', True):
         return None
@@ -345,16 +470,15 @@ def query_registraduria_scraper_fallback(cedula: str) -> Optional[Dict[str, Any]
             data_records = result.get('data', [])
             if not data_records:
                 return None
-            rec = data_records[0]
-            return {
-                'nuip': rec.get('NUIP', cedula),
-                'departamento': rec.get('DEPARTAMENTO', ''),
-                'municipio': rec.get('MUNICIPIO', ''),
-                'puesto': rec.get('PUESTO', ''),
-                'direccion': rec.get('DIRECCIÓN', rec.get('DIRECCION', '')),
-                'mesa': str(rec.get('MESA', '')),
-                'zona': str(rec.get('ZONA', '')),
-            }
+            registro = data_records[0]
+            if registro.get('DEPARTAMENTO') == NO_CENSO:
+                # Fila de registro_no_censo(): se marca como la API para que se cachee con el TTL de NO CENSO
+                resultado = {"status": "not_found", "no_censo": True}
+            else:
+                resultado = datos_desde_registro(registro)
+            # El scraper consulta siempre election_code=congreso
+            guardar_resultado_cache(cedula, 'congreso', resultado)
+            return resultado
         finally:
             scraper.close()
     except Exception as e:
@@ -362,29 +486,26 @@ def query_registraduria_scraper_fallback(cedula: str) -> Optional[Dict[str, Any]
         return None
 
 
-NO_CENSO_DATOS = {
-    'municipio_votacion': 'NO CENSO',
-    'departamento_votacion': 'NO CENSO',
-    'puesto_votacion': 'NO CENSO',
-    'direccion_puesto': 'NO CENSO',
-    'mesa': 'NO CENSO',
-    'zona_votacion': 'NO CENSO',
-}
-
+def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50, espera: float = 0,
+                                 lease_segundos: float = 0, worker_id: Optional[str] = None) -> List[Dict]:
+    """
+    Obtiene cedulas pendientes de Supabase.
 
-def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50) -> List[Dict]:
-    """Obtiene cedulas pendientes de Supabase."""
+    Con espera > 0 pide long-poll (parámetro wait, en segundos). Con lease_segundos > 0
+    reclama las filas para worker_id; cada fila devuelta trae su lease_id.
+    """
     if not CONSULTA_API_TOKEN or not SUPABASE_FUNCTIONS_URL:
         logger.error("CONSULTA_API_TOKEN o SUPABASE_FUNCTIONS_URL no configurados")
         return []
     url = f"{SUPABASE_FUNCTIONS_URL.rstrip('/')}/consultas-pendientes"
     try:
-        resp = requests.get(
-            url,
-            params={'tipo': tipo, 'limit': limit},
-            headers={'Authorization': f'Bearer {CONSULTA_API_TOKEN}'},
-            timeout=30
-        )
+        params = {'tipo': tipo, 'limit': limit}
+        if espera > 0:
+            params['wait'] = int(espera)
+        if lease_segundos > 0:
+            params['lease_seconds'] = int(lease_segundos)
+            params['worker_id'] = worker_id or settings.WORKER_ID
+        resp = supabase_get(url, CONSULTA_API_TOKEN, params=params, timeout=30 + espera)
         if resp.status_code == 401:
             logger.error("Supabase: Token invalido (401)")
             return []
@@ -394,9 +515,9 @@ def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50) -
         data = resp.json()
         consultas = data.get('consultas', [])
         if not consultas:
-            logger.info("Supabase OK (HTTP 200) pero 0 consultas pendientes en cola")
-        elif consultas:
-            logger.info(f"Consulta keys: {list(consultas[0].keys())}")
+            logger.debug("Supabase OK (HTTP 200) pero 0 consultas pendientes en cola")
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Consulta keys: %s", list(consultas[0].keys()))
         return consultas
     except requests.exceptions.Timeout:
         logger.error(f"Supabase: Timeout al conectar con {url}")
@@ -409,28 +530,61 @@ def obtener_consultas_pendientes(tipo: str = 'registraduria', limit: int = 50) -
         return []
 
 
-def enviar_resultado(cola_id: str, cedula: str, exito: bool, datos: Optional[Dict] = None, error: Optional[str] = None, elector_id: Optional[str] = None) -> bool:
-    """Envía resultado a Supabase."""
-    if not CONSULTA_API_TOKEN or not SUPABASE_FUNCTIONS_URL:
-        return False
+def construir_payload_resultado(cola_id: str, cedula: str, exito: bool, datos: Optional[Dict] = None, error: Optional[str] = None, elector_id: Optional[str] = None, lease_id: Optional[str] = None) -> Dict[str, Any]:
+    """Payload de recibir-datos para un resultado."""
     payload = {
         'cola_id': cola_id, 'cedula': cedula, 'numero_documento': cedula,
         'tipo': 'registraduria', 'exito': exito, 'datos': datos or {}, 'error': error
     }
     if elector_id is not None:
         payload['elector_id'] = elector_id
+    if lease_id:
+        payload['lease_id'] = lease_id
+    # Misma clave en todos los reenvíos (outbox) para que recibir-datos descarte duplicados
+    payload['idempotency_key'] = uuid.uuid4().hex
+    return payload
+
+
+def enviar_resultado(cola_id: str, cedula: str, exito: bool, datos: Optional[Dict] = None, error: Optional[str] = None, elector_id: Optional[str] = None) -> bool:
+    """Envía resultado a Supabase."""
+    return enviar_payload(construir_payload_resultado(cola_id, cedula, exito, datos=datos, error=error, elector_id=elector_id))
+
+
+def enviar_payload(payload: Dict[str, Any]) -> bool:
+    """Envía un payload ya construido a recibir-datos."""
+    return enviar_payload_detalle(payload)[0]
+
+
+def enviar_payload_detalle(payload: Dict[str, Any]) -> Tuple[bool, bool]:
+    """
+    Envía un payload a recibir-datos. Retorna (ok, reintentable).
+
+    reintentable=False cuando recibir-datos respondió y rechazó el resultado
+    (success=False o 4xx); True ante errores de red, timeout, 429 o 5xx.
+    """
+    if not CONSULTA_API_TOKEN or not SUPABASE_FUNCTIONS_URL:
+        return False, False
+    cedula = payload.get('cedula')
+    cola_id = payload.get('cola_id')
+    headers = {'Idempotency-Key': payload['idempotency_key']} if payload.get('idempotency_key') else None
     try:
-        resp = requests.post(
+        resp = supabase_post_json(
             f"{SUPABASE_FUNCTIONS_URL.rstrip('/')}/recibir-datos",
-            json=payload,
-            headers={'Authorization': f'Bearer {CONSULTA_API_TOKEN}', 'Content-Type': 'application/json'},
-            timeout=30
+            CONSULTA_API_TOKEN,
+            payload,
+            timeout=30,
+            headers=headers,
         )
         resp_body = resp.text[:500] if resp.text else ''
         if resp.status_code in (401, 404):
             logger.error(f"Error enviando: {resp.status_code} - {resp_body}")
-            return False
-        resp.raise_for_status()
+            return False, False
+        if resp.status_code == 429 or resp.status_code >= 500:
+            logger.error(f"Error enviando resultado: HTTP {resp.status_code} - {resp_body}")
+            return False, True
+        if resp.status_code >= 400:
+            logger.error(f"Error enviando resultado: HTTP {resp.status_code} - {resp_body}")
+            return False, False
         try:
             resp_json = resp.json()
         except Exception:
@@ -440,8 +594,114 @@ def enviar_resultado(cola_id: str, cedula: str, exito: bool, datos: Optional[Dic
         if not ok:
             logger.warning(f"recibir-datos success=False cedula={cedula} cola_id={cola_id} resp={resp_body}")
         elif msg:
-            logger.info(f"recibir-datos ok cedula={cedula} message={msg}")
-        return ok
+            logger.info("recibir-datos ok cedula=%(cedula)s message=%(message)s", {'cedula': cedula, 'message': str(msg)},
+                        extra={'evento': 'recibido'})
+        return ok, False
     except Exception as e:
         logger.error(f"Error enviando resultado: {e}", exc_info=True)
-        return False
+        return False, True
+
+
+def enviar_resultados_lote(payloads: List[Dict[str, Any]]) -> List[Tuple[bool, bool]]:
+    """
+    Envía varios resultados en una sola petición a recibir-datos.
+
+    Contrato del lote:
+    - Petición: {"resultados": [<payload>, ...]}, cada payload con su idempotency_key; el header
+      Idempotency-Key del lote se deriva de ellas (mismo lote -> misma clave)
+    - Respuesta: {"success": bool, "resultados": [{"cola_id": ..., "success": bool, "error": str?}, ...]}
+      (mismo orden que la petición; si falta "resultados", "success" aplica a todos)
+
+    Si la Edge Function no acepta lotes (HTTP 400/404/405/415/422), envía uno a uno.
+    Retorna (ok, reintentable) de cada payload, en el mismo orden, como enviar_payload_detalle:
+    un resultado rechazado (success=False o 4xx) no es reintentable; red, timeout, 429 o 5xx sí.
+    """
+    if not payloads:
+        return []
+    if not CONSULTA_API_TOKEN or not SUPABASE_FUNCTIONS_URL:
+        return [(False, False)] * len(payloads)
+    if len(payloads) == 1:
+        return [enviar_payload_detalle(payloads[0])]
+    claves = [str(p.get('idempotency_key') or p.get('cola_id')) for p in payloads]
+    headers = {'Idempotency-Key': hashlib.sha256(','.join(claves).encode('utf-8')).hexdigest()[:32]}
+    try:
+        resp = supabase_post_json(
+            f"{SUPABASE_FUNCTIONS_URL.rstrip('/')}/recibir-datos",
+            CONSULTA_API_TOKEN,
+            {'resultados': payloads},
+            timeout=30,
+            headers=headers,
+        )
+        if resp.status_code == 401:
+            logger.error("Error enviando lote: 401 - token invalido")
+            return [(False, False)] * len(payloads)
+        if resp.status_code in (400, 404, 405, 415, 422):
+            logger.warning(f"recibir-datos no acepta lotes (HTTP {resp.status_code}), enviando uno a uno")
+            return [enviar_payload_detalle(p) for p in payloads]
+        if resp.status_code == 429 or resp.status_code >= 500:
+            logger.error(f"Error enviando lote: HTTP {resp.status_code} - {resp.text[:500]}")
+            return [(False, True)] * len(payloads)
+        if resp.status_code >= 400:
+            logger.error(f"Error enviando lote: HTTP {resp.status_code} - {resp.text[:500]}")
+            return [(False, False)] * len(payloads)
+        try:
+            resp_json = resp.json()
+        except Exception:
+            resp_json = {}
+        items = resp_json.get('resultados')
+        if not isinstance(items, list) or len(items) != len(payloads):
+            ok = bool(resp_json.get('success', False))
+            if not ok:
+                logger.warning(f"recibir-datos lote success=False resp={resp.text[:500]}")
+            return [(ok, False)] * len(payloads)
+        resultados = []
+        for payload, item in zip(payloads, items):
+            ok = bool(item.get('success', False)) if isinstance(item, dict) else False
+            if not ok:
+                err = item.get('error') if isinstance(item, dict) else item
+                logger.warning(f"recibir-datos lote success=False cedula={payload.get('cedula')} cola_id={payload.get('cola_id')} error={err}")
+            resultados.append((ok, False))
+        return resultados
+    except Exception as e:
+        logger.error(f"Error enviando lote de resultados: {e}", exc_info=True)
+        return [(False, True)] * len(payloads)
+
+
+def _lease_consultas(accion: str, leases: List[Dict[str, Any]], lease_segundos: float = 0,
+                     timeout: float = 15) -> Optional[Dict[str, Any]]:
+    """
+    POST a la Edge Function lease-consultas.
+
+    Petición: {"accion": "renovar"|"liberar", "worker_id": str, "lease_seconds": int,
+               "leases": [{"cola_id": ..., "lease_id": ...}, ...]}
+    Respuesta: {"success": bool, "leases": [{"cola_id": ..., "ok": bool}, ...]}
+    Retorna el JSON de respuesta o None si falla.
+    """
+    if not CONSULTA_API_TOKEN or not SUPABASE_FUNCTIONS_URL:
+        return None
+    body = {'accion': accion, 'worker_id': settings.WORKER_ID, 'leases': leases}
+    if lease_segundos > 0:
+        body['lease_seconds'] = int(lease_segundos)
+    try:
+        resp = supabase_post_json(f"{SUPABASE_FUNCTIONS_URL.rstrip('/')}/lease-consultas", CONSULTA_API_TOKEN, body, timeout=timeout)
+        if resp.status_code != 200:
+            logger.warning(f"lease-consultas ({accion}): HTTP {resp.status_code} - {resp.text[:200]}")
+            return None
+        return resp.json()
+    except Exception as e:
+        logger.warning(f"lease-consultas ({accion}): {e}")
+        return None
+
+
+def renovar_leases(leases: List[Dict[str, Any]], lease_segundos: float) -> Dict[Any, bool]:
+    """Renueva leases. Retorna {cola_id: renovado}; vacío si no hubo respuesta utilizable."""
+    data = _lease_consultas('renovar', leases, lease_segundos)
+    if not data:
+        return {}
+    return {l.get('cola_id'): bool(l.get('ok')) for l in data.get('leases', []) if isinstance(l, dict)}
+
+
+def liberar_leases(leases: List[Dict[str, Any]], timeout: float = 15) -> bool:
+    """Libera leases para que otra réplica pueda tomar las filas (`timeout`: al detener, lo que quede del plazo)."""
+    data = _lease_consultas('liberar', leases, timeout=timeout)
+    return bool(data and data.get('success'))
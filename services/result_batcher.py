@@ -0,0 +1,100 @@
+"""
+Envío de resultados a Supabase agrupados en lotes.
+
+Los resultados se acumulan hasta RESULT_BATCH_SIZE o hasta que pasa
+RESULT_BATCH_WINDOW desde el primero del lote, y se envían en una sola
+petición. Cada submit() devuelve un Future con (ok, reintentable) de ese
+resultado: reintentable=False si recibir-datos lo rechazó.
+"""
+
+import time
+import queue
+import logging
+from concurrent.futures import Future
+from threading import Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+class ResultBatcher:
+    """Agrupa payloads por cantidad o ventana de tiempo y los envía con enviar_lote."""
+
+    def __init__(self, enviar_lote: Callable[[List[Dict[str, Any]]], List[Tuple[bool, bool]]],
+                 max_items: int = 20, ventana: float = 1.0):
+        self.enviar_lote = enviar_lote
+        self.max_items = max(1, max_items)
+        self.ventana = max(0.0, ventana)
+        self._cola: "queue.Queue" = queue.Queue()
+        self._cerrado = False
+        self._en_envio: List[Tuple[Dict[str, Any], Future]] = []
+        self._thread = Thread(target=self._run, name='result-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Dict[str, Any]) -> "Future[Tuple[bool, bool]]":
+        """Encola un payload. El Future resuelve a (ok, reintentable) según lo que responda Supabase."""
+        future: "Future[Tuple[bool, bool]]" = Future()
+        if self._cerrado:
+            future.set_result((False, True))
+            return future
+        self._cola.put((payload, future))
+        return future
+
+    def close(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Envía lo pendiente y detiene el thread. Retorna los payloads sin respuesta al vencer
+        `timeout` (encolados o en un envío que no terminó), para guardarlos en otro lado.
+        """
+        if self._cerrado:
+            return []
+        self._cerrado = True
+        self._cola.put(_FIN)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            return []
+        sin_respuesta = [p for p, f in list(self._en_envio) if not f.done()]
+        while True:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FIN:
+                sin_respuesta.append(item[0])
+        return sin_respuesta
+
+    def _run(self) -> None:
+        fin = False
+        while not fin:
+            item = self._cola.get()
+            if item is _FIN:
+                break
+            lote: List[Tuple[Dict[str, Any], Future]] = [item]
+            limite = time.monotonic() + self.ventana
+            while len(lote) < self.max_items:
+                restante = limite - time.monotonic()
+                try:
+                    item = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _FIN:
+                    fin = True
+                    break
+                lote.append(item)
+            self._enviar(lote)
+
+    def _enviar(self, lote: List[Tuple[Dict[str, Any], Future]]) -> None:
+        payloads = [p for p, _ in lote]
+        self._en_envio = lote
+        try:
+            resultados = self.enviar_lote(payloads)
+        except Exception as e:
+            logger.error(f"Error enviando lote de {len(lote)} resultado(s): {e}", exc_info=True)
+            resultados = [(False, True)] * len(lote)
+        if len(resultados) != len(lote):
+            logger.error(f"Lote de {len(lote)} resultado(s) con {len(resultados)} respuesta(s); marcando como fallidos")
+            resultados = [(False, True)] * len(lote)
+        for (_, future), (ok, reintentable) in zip(lote, resultados):
+            future.set_result((bool(ok), bool(reintentable)))
+        self._en_envio = []
@@ -0,0 +1,69 @@
+"""
+Cache de resultados de Registraduría sobre el estado compartido (services/state_backend.py).
+
+Clave: (cedula, election_code). Cada clase de resultado tiene su propio TTL:
+- lugar: puesto de votación encontrado
+- no_censo: status_code 13
+- no_habilitada: is_in_census=false con novelty
+
+Los errores de API y not_found sin no_censo no se guardan.
+"""
+
+import logging
+from typing import Optional, Dict, Any
+
+from services.normalizer import NO_HABILITADA
+from services.state_backend import StateBackend
+
+logger = logging.getLogger(__name__)
+
+CLASE_LUGAR = 'lugar'
+CLASE_NO_CENSO = 'no_censo'
+CLASE_NO_HABILITADA = 'no_habilitada'
+
+
+def clasificar_resultado(resultado: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Retorna la clase cacheable del resultado o None si no debe guardarse."""
+    if not resultado:
+        return None
+    status = resultado.get('status')
+    if status in ('api_error', 'diferida'):
+        return None
+    if status == 'not_found':
+        return CLASE_NO_CENSO if resultado.get('no_censo') else None
+    if resultado.get('departamento_votacion') == NO_HABILITADA:
+        return CLASE_NO_HABILITADA
+    if any(v for k, v in resultado.items() if k != 'status' and v):
+        return CLASE_LUGAR
+    return None
+
+
+class ResultCache:
+    """Cache de resultados por (cedula, election_code) con TTL por clase, sobre un StateBackend."""
+
+    ESPACIO = 'resultados'
+
+    def __init__(self, backend: StateBackend, ttls: Dict[str, float]):
+        self.backend = backend
+        self.ttls = dict(ttls)
+
+    @staticmethod
+    def _clave(cedula: str, election_code: str) -> str:
+        return f"{election_code}:{cedula}"
+
+    def get(self, cedula: str, election_code: str) -> Optional[Dict[str, Any]]:
+        """Retorna el resultado vigente o None."""
+        return self.backend.get(self.ESPACIO, self._clave(cedula, election_code))
+
+    def put(self, cedula: str, election_code: str, resultado: Optional[Dict[str, Any]]) -> bool:
+        """Guarda el resultado si su clase es cacheable. Retorna True si se guardó."""
+        clase = clasificar_resultado(resultado)
+        ttl = self.ttls.get(clase, 0) if clase else 0
+        if ttl <= 0:
+            return False
+        self.backend.set(self.ESPACIO, self._clave(cedula, election_code), resultado, ttl)
+        return True
+
+    def purge(self) -> int:
+        """Elimina entradas expiradas. Retorna cuántas se borraron."""
+        return self.backend.purge(self.ESPACIO)
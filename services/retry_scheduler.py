@@ -0,0 +1,247 @@
+"""
+Reintentos locales de consultas fallidas con presupuesto por cédula.
+
+En lugar de enviar cada api_error a recibir-datos y depender de que la cola
+vuelva a ofrecer la fila (y del bloqueo de 20 min en memoria), el worker la
+retiene y la vuelve a consultar con backoff exponencial por clase de error
+('403', '404', 'bloqueada', 'error'). Cada cédula tiene un presupuesto de
+`max_intentos` consultas; recién al agotarlo se envía el fallo definitivo.
+
+- Las filas vencidas salen de un min-heap por hora de reintento.
+- Intentos y horas de reintento se guardan en un archivo JSON con un snapshot
+  periódico fuera del lock (utils.snapshot): tras reiniciar, una fila que la
+  cola vuelve a ofrecer antes de su hora queda retenida en lugar de
+  consultarse otra vez.
+- La fila retenida conserva su lease (LeaseManager lo sigue renovando), así
+  que la cola no la entrega a otra réplica mientras espera.
+"""
+
+import json
+import time
+import heapq
+import random
+import logging
+from itertools import count
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from utils.snapshot import SnapshotPeriodico
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_DEFAULT = {'403': 1200.0, '404': 1200.0, 'bloqueada': 1200.0, 'error': 60.0}
+
+
+def parse_backoff(texto: str) -> Dict[str, float]:
+    """'403=1200,error=60' -> {'403': 1200.0, 'error': 60.0} (clases no indicadas usan el default)."""
+    backoff = dict(BACKOFF_DEFAULT)
+    for parte in (texto or '').split(','):
+        if '=' in parte:
+            clase, segundos = parte.split('=', 1)
+            backoff[clase.strip()] = float(segundos)
+    return backoff
+
+
+def clase_reintento(resultado: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Clase de error reintentable del resultado, o None si el resultado es definitivo."""
+    if resultado is None:
+        return 'error'  # sin captcha o excepción inesperada
+    if resultado.get('status') != 'api_error':
+        return None
+    error = str(resultado.get('error') or '')
+    if 'bloqueado' in error:
+        return 'bloqueada'
+    if '403' in error:
+        return '403'
+    if '404' in error:
+        return '404'
+    if 'no especificada' in error:
+        return None
+    return 'error'
+
+
+def _id_fila(consulta: Dict[str, Any]) -> Hashable:
+    return consulta.get('id') or consulta.get('cola_id')
+
+
+def _cedula(consulta: Dict[str, Any]) -> str:
+    return str(consulta.get('cedula') or consulta.get('numero_documento', ''))
+
+
+class _Reintento:
+    __slots__ = ('proximo', 'intentos', 'clase', 'filas')
+
+    def __init__(self, proximo: float, intentos: int, clase: str):
+        self.proximo = proximo
+        self.intentos = intentos
+        self.clase = clase
+        # Filas retenidas de esta cédula (id -> consulta); no se persisten: tras reiniciar llegan de la cola
+        self.filas: Dict[Hashable, Dict[str, Any]] = {}
+
+
+class RetryScheduler:
+    """Heap thread-safe de reintentos por cédula con backoff por clase y persistencia opcional."""
+
+    def __init__(self, backoff: Optional[Dict[str, float]] = None, max_intentos: int = 3,
+                 backoff_max: float = 6 * 3600, path: Optional[str] = None, olvidar: float = 24 * 3600,
+                 intervalo_guardado: float = 5.0):
+        self.backoff = dict(backoff or BACKOFF_DEFAULT)
+        self.max_intentos = max(1, max_intentos)
+        self.backoff_max = backoff_max
+        self.path = path
+        # Registros sin actividad por más de `olvidar` s se descartan (la fila se resolvió en otra réplica)
+        self.olvidar = olvidar
+        self._lock = Lock()
+        self._entradas: Dict[str, _Reintento] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = count()
+        # Filas de cédulas ya resueltas que esperaban reintento: salen en el próximo vencidas()
+        self._listas: List[Dict[str, Any]] = []
+        self._ultima_purga = time.time()
+        self._snapshot: Optional[SnapshotPeriodico] = None
+        if path:
+            self._cargar()
+            self._snapshot = SnapshotPeriodico(path, self._capturar, intervalo_guardado, nombre='reintentos')
+
+    def programar(self, consulta: Dict[str, Any], clase: str) -> Optional[float]:
+        """
+        Registra un intento fallido y retiene la fila hasta su reintento.
+        Retorna los segundos de espera, o None si la cédula agotó su presupuesto (enviar el fallo).
+        """
+        cedula = _cedula(consulta)
+        now = time.time()
+        with self._lock:
+            entrada = self._entradas.get(cedula)
+            if entrada is not None and entrada.proximo > now:
+                # Otra fila de la misma cédula ya programó el reintento (misma consulta remota)
+                entrada.filas[_id_fila(consulta)] = consulta
+                return entrada.proximo - now
+            intentos = (entrada.intentos if entrada is not None else 0) + 1
+            if intentos >= self.max_intentos:
+                if entrada is not None:
+                    self._listas.extend(f for i, f in entrada.filas.items() if i != _id_fila(consulta))
+                    del self._entradas[cedula]
+                    self._marcar_cambio()
+                return None
+            base = self.backoff.get(clase, self.backoff.get('error', 60.0))
+            # Jitter solo hacia arriba: con base >= 20 min el reintento no cae dentro del bloqueo de 403/404
+            espera = min(self.backoff_max, base * (2 ** (intentos - 1))) * random.uniform(1.0, 1.2)
+            if entrada is None:
+                entrada = self._entradas[cedula] = _Reintento(0.0, 0, clase)
+            entrada.proximo = now + espera
+            entrada.intentos = intentos
+            entrada.clase = clase
+            entrada.filas[_id_fila(consulta)] = consulta
+            heapq.heappush(self._heap, (entrada.proximo, next(self._seq), cedula))
+            self._marcar_cambio()
+        return espera
+
+    def retener(self, consulta: Dict[str, Any]) -> bool:
+        """True si la fila debe esperar su reintento (la cola la ofreció antes de hora); queda retenida."""
+        cedula = _cedula(consulta)
+        with self._lock:
+            entrada = self._entradas.get(cedula)
+            if entrada is None:
+                return False
+            fila = _id_fila(consulta)
+            if fila in entrada.filas:
+                return True  # ya retenida aquí (cola sin leases la vuelve a ofrecer)
+            if entrada.proximo <= time.time():
+                return False
+            entrada.filas[fila] = consulta
+            return True
+
+    def vencidas(self, limite: int) -> List[Dict[str, Any]]:
+        """Hasta `limite` filas retenidas cuyo reintento ya venció, en orden de vencimiento."""
+        now = time.time()
+        salida: List[Dict[str, Any]] = []
+        with self._lock:
+            while self._listas and len(salida) < limite:
+                salida.append(self._listas.pop())
+            while self._heap and self._heap[0][0] <= now and len(salida) < limite:
+                proximo, _, cedula = self._heap[0]
+                entrada = self._entradas.get(cedula)
+                if entrada is None or entrada.proximo != proximo or not entrada.filas:
+                    heapq.heappop(self._heap)
+                    continue
+                fila, consulta = next(iter(entrada.filas.items()))
+                del entrada.filas[fila]
+                salida.append(consulta)
+                if not entrada.filas:
+                    heapq.heappop(self._heap)
+            if now - self._ultima_purga >= 3600:
+                self._purgar_locked(now)
+        return salida
+
+    def completar(self, cedula: str) -> int:
+        """La cédula obtuvo un resultado definitivo. Retorna cuántos intentos fallidos llevaba."""
+        with self._lock:
+            entrada = self._entradas.pop(str(cedula), None)
+            if entrada is None:
+                return 0
+            # Otras filas de la misma cédula ya pueden salir (el resultado quedó en cache)
+            self._listas.extend(entrada.filas.values())
+            self._marcar_cambio()
+            return entrada.intentos
+
+    def resultado_agotado(self, resultado: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Copia del resultado para el fallo definitivo, con el error marcado como '(tras N intentos)'."""
+        if resultado is None:
+            return None
+        return {**resultado, 'error': f"{resultado.get('error', 'Error API')} (tras {self.max_intentos} intentos)"}
+
+    def intentos(self, cedula: str) -> int:
+        with self._lock:
+            entrada = self._entradas.get(str(cedula))
+            return entrada.intentos if entrada is not None else 0
+
+    def retenidas(self) -> int:
+        """Filas esperando reintento en este proceso."""
+        with self._lock:
+            return len(self._listas) + sum(len(e.filas) for e in self._entradas.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+    def _purgar_locked(self, now: float) -> None:
+        self._ultima_purga = now
+        viejas = [c for c, e in self._entradas.items() if not e.filas and e.proximo < now - self.olvidar]
+        for cedula in viejas:
+            del self._entradas[cedula]
+        if viejas:
+            self._heap = [(e.proximo, next(self._seq), c) for c, e in self._entradas.items()]
+            heapq.heapify(self._heap)
+            self._marcar_cambio()
+
+    def close(self) -> None:
+        """Escribe los cambios pendientes (sin persistencia no hace nada)."""
+        if self._snapshot is not None:
+            self._snapshot.cerrar()
+
+    def _marcar_cambio(self) -> None:
+        # Solo marca el cambio: el snapshot se escribe en background, fuera del lock
+        if self._snapshot is not None:
+            self._snapshot.marcar()
+
+    def _capturar(self) -> List[list]:
+        with self._lock:
+            return [[c, e.proximo, e.intentos, e.clase] for c, e in self._entradas.items()]
+
+    def _cargar(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entradas = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("No se pudieron cargar los reintentos desde %s: %s", self.path, e)
+            return
+        limite = time.time() - self.olvidar
+        for cedula, proximo, intentos, clase in entradas:
+            if proximo >= limite:
+                self._entradas[cedula] = _Reintento(proximo, intentos, clase)
+                self._heap.append((proximo, next(self._seq), cedula))
+        heapq.heapify(self._heap)
+        if self._entradas:
+            logger.info("Reintentos restaurados desde %s: %d cédula(s)", self.path, len(self._entradas))
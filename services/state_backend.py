@@ -0,0 +1,202 @@
+"""
+Estado compartido (clave -> valor con TTL) para los caches del worker.
+
+Interfaz StateBackend con dos implementaciones:
+- MemoryStateBackend: dentro del proceso (un TTLCache por espacio). Cada
+  réplica redescubre lo mismo, como antes.
+- SqliteStateBackend: archivo SQLite en modo WAL. Varias réplicas que montan
+  el mismo volumen comparten lo que cada una aprende (resultados, cédulas
+  bloqueadas, consultas en vuelo) sin un servicio de red. Cada operación es
+  una sentencia en autocommit; busy_timeout absorbe la contención entre
+  procesos. El volumen debe ser local al host (WAL no funciona sobre NFS/SMB).
+
+Los valores deben ser serializables a JSON; ambos backends devuelven una copia
+(get nunca entrega el mismo objeto a dos llamadas).
+
+Los datos se separan por `espacio` ('resultados', 'fallidas', 'en_vuelo').
+EspacioTTL adapta un espacio a la interfaz de TTLCache (`in`, add, pop, purge).
+"""
+
+import os
+import json
+import time
+import logging
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """Almacén clave -> valor con expiración, separado por espacio."""
+
+    @abstractmethod
+    def get(self, espacio: str, clave: str) -> Optional[Any]:
+        """Valor vigente o None."""
+
+    @abstractmethod
+    def set(self, espacio: str, clave: str, valor: Any, ttl: float) -> None:
+        """Guarda (o reemplaza) el valor por `ttl` segundos."""
+
+    @abstractmethod
+    def add(self, espacio: str, clave: str, valor: Any, ttl: float) -> bool:
+        """Guarda solo si no hay un valor vigente. True si quedó guardado (atómico entre réplicas)."""
+
+    @abstractmethod
+    def delete(self, espacio: str, clave: str) -> bool:
+        """Borra la clave. True si existía."""
+
+    @abstractmethod
+    def purge(self, espacio: Optional[str] = None) -> int:
+        """Elimina entradas vencidas (de un espacio o de todos). Retorna cuántas."""
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """Backend en memoria del proceso: un TTLCache acotado por espacio."""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._espacios: Dict[str, TTLCache] = {}
+
+    def _espacio(self, espacio: str) -> TTLCache:
+        with self._lock:
+            cache = self._espacios.get(espacio)
+            if cache is None:
+                cache = self._espacios[espacio] = TTLCache(0, maxsize=self.maxsize)
+            return cache
+
+    def get(self, espacio: str, clave: str) -> Optional[Any]:
+        texto = self._espacio(espacio).get(clave)
+        return None if texto is None else json.loads(texto)
+
+    def set(self, espacio: str, clave: str, valor: Any, ttl: float) -> None:
+        self._espacio(espacio).set(clave, json.dumps(valor, ensure_ascii=False), ttl=ttl)
+
+    def add(self, espacio: str, clave: str, valor: Any, ttl: float) -> bool:
+        cache = self._espacio(espacio)
+        # TTLCache no tiene set-if-absent: el lock del backend hace atómico get + set
+        with self._lock:
+            if cache.get(clave) is not None:
+                return False
+            cache.set(clave, json.dumps(valor, ensure_ascii=False), ttl=ttl)
+            return True
+
+    def delete(self, espacio: str, clave: str) -> bool:
+        return self._espacio(espacio).pop(clave) is not None
+
+    def purge(self, espacio: Optional[str] = None) -> int:
+        with self._lock:
+            caches = list(self._espacios.values()) if espacio is None else [self._espacios.get(espacio)]
+        return sum(c.purge() for c in caches if c is not None)
+
+
+class SqliteStateBackend(StateBackend):
+    """Backend en un archivo SQLite (WAL) compartible entre procesos del mismo host o volumen."""
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        import sqlite3
+        self.path = path
+        self._lock = Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS estado ('
+            ' espacio TEXT NOT NULL,'
+            ' clave TEXT NOT NULL,'
+            ' valor TEXT NOT NULL,'
+            ' expira REAL NOT NULL,'
+            ' PRIMARY KEY (espacio, clave)) WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS estado_expira ON estado (expira)')
+
+    def get(self, espacio: str, clave: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT valor FROM estado WHERE espacio = ? AND clave = ? AND expira > ?',
+                (espacio, str(clave), time.time()),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, espacio: str, clave: str, valor: Any, ttl: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO estado (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)',
+                (espacio, str(clave), json.dumps(valor, ensure_ascii=False), time.time() + ttl),
+            )
+
+    def add(self, espacio: str, clave: str, valor: Any, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # Reemplaza solo una entrada vencida: la sentencia es atómica también entre procesos
+            cur = self._conn.execute(
+                'INSERT INTO estado (espacio, clave, valor, expira) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT (espacio, clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira'
+                ' WHERE estado.expira <= ?',
+                (espacio, str(clave), json.dumps(valor, ensure_ascii=False), now + ttl, now),
+            )
+            return cur.rowcount == 1
+
+    def delete(self, espacio: str, clave: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute('DELETE FROM estado WHERE espacio = ? AND clave = ?', (espacio, str(clave)))
+            return cur.rowcount > 0
+
+    def purge(self, espacio: Optional[str] = None) -> int:
+        with self._lock:
+            if espacio is None:
+                cur = self._conn.execute('DELETE FROM estado WHERE expira <= ?', (time.time(),))
+            else:
+                cur = self._conn.execute('DELETE FROM estado WHERE espacio = ? AND expira <= ?', (espacio, time.time()))
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def crear_backend(path: Optional[str], memoria_max: int = 10000) -> StateBackend:
+    """SQLite en `path`; sin path (o si no se puede abrir), memoria del proceso."""
+    if path:
+        try:
+            backend = SqliteStateBackend(path)
+            logger.info(f"Estado compartido en {path}")
+            return backend
+        except Exception as e:
+            logger.warning(f"No se pudo abrir el estado compartido {path} ({e}); usando memoria del proceso")
+    return MemoryStateBackend(memoria_max)
+
+
+class EspacioTTL:
+    """Un espacio del backend con TTL fijo e interfaz de TTLCache. El backend se obtiene al primer uso."""
+
+    def __init__(self, backend: Callable[[], StateBackend], espacio: str, ttl: float):
+        self._backend = backend
+        self.espacio = espacio
+        self.ttl = ttl
+
+    def __contains__(self, clave: str) -> bool:
+        return self._backend().get(self.espacio, clave) is not None
+
+    def get(self, clave: str, default: Any = None) -> Any:
+        valor = self._backend().get(self.espacio, clave)
+        return default if valor is None else valor
+
+    def add(self, clave: str) -> None:
+        self._backend().set(self.espacio, clave, time.time(), self.ttl)
+
+    def pop(self, clave: str, default: Any = None) -> Any:
+        valor = self.get(clave, default)
+        self._backend().delete(self.espacio, clave)
+        return valor
+
+    def purge(self) -> int:
+        return self._backend().purge(self.espacio)
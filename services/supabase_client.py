@@ -0,0 +1,65 @@
+"""
+Cliente HTTP compartido para las Edge Functions de Supabase.
+
+Una sola requests.Session con keep-alive y pool de conexiones dimensionado al
+número de workers, para no repetir el handshake TCP+TLS en cada poll/resultado.
+Compresión gzip opcional del cuerpo JSON (SUPABASE_GZIP).
+"""
+
+import gzip
+import json
+import logging
+from threading import Lock
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_session: Optional[requests.Session] = None
+_session_lock = Lock()
+
+
+def get_supabase_session() -> requests.Session:
+    """Sesión HTTP persistente para Supabase (singleton)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            pool_size = max(1, settings.SUPABASE_POOL_SIZE)
+            adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, pool_block=False)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive',
+            })
+            _session = session
+        return _session
+
+
+def supabase_get(url: str, token: str, params: Optional[Dict[str, Any]] = None, timeout: float = 30) -> requests.Response:
+    """GET autenticado a una Edge Function."""
+    return get_supabase_session().get(
+        url,
+        params=params,
+        headers={'Authorization': f'Bearer {token}'},
+        timeout=timeout,
+    )
+
+
+def supabase_post_json(url: str, token: str, payload: Any, timeout: float = 30,
+                       headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """POST JSON autenticado a una Edge Function (cuerpo gzip si SUPABASE_GZIP y supera el umbral)."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    req_headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+    if headers:
+        req_headers.update(headers)
+    if settings.SUPABASE_GZIP and len(body) >= settings.SUPABASE_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        req_headers['Content-Encoding'] = 'gzip'
+    return get_supabase_session().post(url, data=body, headers=req_headers, timeout=timeout)
@@ -0,0 +1,325 @@
+"""
+Pipeline del worker: obtener -> consultar -> enviar, en etapas desacopladas.
+
+- Prefetch (1 thread): pide filas a la cola solo cuando hay espacio en `pendientes`.
+- Consulta (N threads): toma de `pendientes`, ejecuta la consulta, deja el resultado en `hechos`.
+- Envío (1 thread): toma de `hechos` y publica el resultado.
+
+Las colas entre etapas son acotadas: si el envío se atrasa, las consultas
+esperan; si las consultas se atrasan, el prefetch deja de pedir filas. La
+concurrencia hacia la Registraduría sigue siendo N (WORKER_MAX_WORKERS).
+
+Al detener (SIGTERM) el pipeline se drena con un plazo: las filas sin empezar
+se devuelven, las consultas en curso pueden terminar y sus resultados se
+envían; lo que no alcanza a enviarse antes del plazo pasa a `al_vencer`
+(p.ej. el outbox) en lugar de perderse.
+"""
+
+import time
+import queue
+import logging
+from concurrent.futures import Future
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from services.poller import AdaptivePoller
+from services.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def id_consulta(consulta: Dict[str, Any]) -> Optional[Hashable]:
+    """Identificador de la fila en la cola (id o cola_id)."""
+    return consulta.get('id') or consulta.get('cola_id')
+
+
+class WorkerPipeline:
+    """Pipeline acotado de tres etapas con backpressure."""
+
+    def __init__(self,
+                 obtener: Callable[[int], List[Dict[str, Any]]],
+                 procesar: Callable[[Dict[str, Any]], Tuple[Dict[str, Any], Any]],
+                 enviar: Callable[[Dict[str, Any], Any], Any],
+                 lookup_workers: int = 2,
+                 fetch_limit: int = 2,
+                 poller: Optional[AdaptivePoller] = None,
+                 espera_duplicados: float = 2.0,
+                 antes_de_obtener: Optional[Callable[[], None]] = None,
+                 al_liberar: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 pausa_obtener: Optional[Callable[[], float]] = None,
+                 plazo_drenado: Optional[float] = None,
+                 al_vencer: Optional[Callable[[Dict[str, Any], Any], Optional[bool]]] = None):
+        self.obtener = obtener
+        self.procesar = procesar
+        self.enviar = enviar
+        self.lookup_workers = max(1, lookup_workers)
+        self.fetch_limit = max(1, fetch_limit)
+        self.poller = poller or AdaptivePoller()
+        self.espera_duplicados = espera_duplicados
+        self.antes_de_obtener = antes_de_obtener
+        # Se llama cuando una fila sale del pipeline (enviada, fallida o descartada)
+        self.al_liberar = al_liberar
+        # Segundos que el prefetch debe esperar antes de pedir filas (p.ej. circuito de la API abierto)
+        self.pausa_obtener = pausa_obtener
+        # Segundos para drenar al detener (None = esperar a que terminen todas las consultas en curso)
+        self.plazo_drenado = plazo_drenado
+        # Resultado listo que no se alcanzó a enviar en el plazo: (consulta, resultado) -> True si quedó
+        # guardado, False si se perdió, None si la fila vuelve a la cola sin resultado que guardar
+        self.al_vencer = al_vencer
+        # Un "frente" de consultas en espera como máximo; resultados hasta 2 frentes
+        self.pendientes: "queue.Queue" = queue.Queue(maxsize=self.lookup_workers)
+        self.hechos: "queue.Queue" = queue.Queue(maxsize=2 * self.lookup_workers)
+        self._en_pipeline: Set[Hashable] = set()
+        self._en_pipeline_lock = Lock()
+        self._detener = Event()
+        self._consultas_terminadas = Event()
+        self._threads: List[Thread] = []
+        self._ciclos_idle = 0
+        self._en_consulta = 0
+        # (consulta, resultado) que la etapa de envío está publicando; None si está libre
+        self._en_envio: Optional[Tuple[Dict[str, Any], Any]] = None
+        self._limite_drenado: Optional[float] = None
+        self.resumen_drenado: Dict[str, float] = {
+            'enviadas': 0, 'guardadas': 0, 'devueltas': 0, 'abandonadas': 0, 'perdidas': 0, 'segundos': 0,
+        }
+
+    # --- Control ---
+
+    def detener(self) -> None:
+        """Pide detener el pipeline: no se obtienen ni inician consultas nuevas."""
+        self._detener.set()
+        self.poller.despertar()
+
+    @property
+    def detenido(self) -> bool:
+        return self._detener.is_set()
+
+    def run(self) -> Dict[str, float]:
+        """Ejecuta el pipeline hasta detener() y lo drena. Bloquea el thread que llama; retorna el resumen del drenado."""
+        prefetch = Thread(target=self._etapa_prefetch, name='pipeline-prefetch', daemon=True)
+        consultas = [
+            Thread(target=self._etapa_consulta, name=f'pipeline-consulta-{i}', daemon=True)
+            for i in range(self.lookup_workers)
+        ]
+        envio = Thread(target=self._etapa_envio, name='pipeline-envio', daemon=True)
+        self._threads = [prefetch, *consultas, envio]
+        for t in self._threads:
+            t.start()
+        # Espera con timeout para que el thread principal atienda señales
+        while not self._detener.wait(1.0):
+            pass
+        return self._drenar(prefetch, consultas, envio)
+
+    def _drenar(self, prefetch: Thread, consultas: List[Thread], envio: Thread) -> Dict[str, float]:
+        inicio = time.monotonic()
+        if self.plazo_drenado is not None:
+            self._limite_drenado = inicio + self.plazo_drenado
+        resumen = self.resumen_drenado
+        logger.info(f"Drenando pipeline: {self.en_pipeline()} fila(s) en proceso"
+                    f"{f', plazo {self.plazo_drenado:g}s' if self.plazo_drenado is not None else ''}")
+        prefetch.join(self._restante())
+        # Filas sin empezar: salen del pipeline sin al_liberar (su lease se libera al cerrar el worker)
+        self._vaciar_pendientes()
+        for t in consultas:
+            t.join(self._restante())
+        self._vaciar_pendientes()
+        with self._en_pipeline_lock:
+            resumen['abandonadas'] = self._en_consulta
+        self._consultas_terminadas.set()
+        envio.join(self._restante())
+        with self._en_pipeline_lock:
+            en_envio, self._en_envio = self._en_envio, None
+        if en_envio is not None:
+            # Envío todavía en curso al vencer el plazo: guardarlo igual antes de que se liberen los leases
+            # (si el envío termina después, la idempotency_key evita el duplicado)
+            logger.warning("Plazo de drenado cumplido con un envío en curso; se guarda con al_vencer")
+            self._vencer(en_envio)
+        # Resultados listos que no se alcanzaron a enviar
+        while True:
+            try:
+                self._vencer(self.hechos.get_nowait())
+            except queue.Empty:
+                break
+        resumen['segundos'] = round(time.monotonic() - inicio, 1)
+        return resumen
+
+    def _restante(self) -> Optional[float]:
+        if self._limite_drenado is None:
+            return None
+        return max(0.0, self._limite_drenado - time.monotonic())
+
+    def _vencido(self) -> bool:
+        return self._limite_drenado is not None and time.monotonic() >= self._limite_drenado
+
+    def _vaciar_pendientes(self) -> None:
+        while True:
+            try:
+                consulta = self.pendientes.get_nowait()
+            except queue.Empty:
+                return
+            self._descartar(consulta)
+            self._contar('devueltas')
+
+    def _vencer(self, item: Tuple[Dict[str, Any], Any]) -> None:
+        consulta, resultado = item
+        guardado: Optional[bool] = False
+        if self.al_vencer is not None:
+            try:
+                guardado = self.al_vencer(consulta, resultado)
+            except Exception as e:
+                guardado = False
+                logger.error(f"Error guardando resultado pendiente: {e}", exc_info=True)
+        self._descartar(consulta)
+        self._contar('devueltas' if guardado is None else 'guardadas' if guardado else 'perdidas')
+
+    def _contar(self, clave: str) -> None:
+        with self._en_pipeline_lock:
+            self.resumen_drenado[clave] += 1
+
+    def en_pipeline(self) -> int:
+        with self._en_pipeline_lock:
+            return len(self._en_pipeline)
+
+    # --- Etapas ---
+
+    def _etapa_prefetch(self) -> None:
+        while not self._detener.is_set():
+            try:
+                libres = self.pendientes.maxsize - self.pendientes.qsize()
+                if libres <= 0:
+                    self._detener.wait(0.1)
+                    continue
+                pausa = self.pausa_obtener() if self.pausa_obtener is not None else 0
+                if pausa > 0:
+                    # No reclamar filas que solo se diferirían; detener() interrumpe la espera
+                    with METRICS.medir('worker_stage_seconds', stage='idle', outcome='pausa'):
+                        self._detener.wait(min(pausa, 5.0))
+                    continue
+                if self.antes_de_obtener is not None:
+                    self.antes_de_obtener()
+                consultas = self.obtener(min(self.fetch_limit, libres))
+                nuevas = self._registrar_nuevas(consultas or [])
+                if not consultas:
+                    espera = self.poller.siguiente_espera()
+                    self._ciclos_idle += 1
+                    if self._ciclos_idle == 1 or self._ciclos_idle % 10 == 0:
+                        logger.info(f"Escuchando... sin consultas pendientes (próximo poll en {espera:.1f}s)")
+                    inicio = time.perf_counter()
+                    despertado = self.poller.esperar(espera)
+                    METRICS.observar('worker_stage_seconds', time.perf_counter() - inicio,
+                                     stage='idle', outcome='woken' if despertado else 'timeout')
+                    if despertado and not self._detener.is_set():
+                        logger.info("Poll anticipado: notificación de nuevas consultas")
+                    continue
+                self._ciclos_idle = 0
+                self.poller.con_trabajo()
+                if not nuevas:
+                    # La cola devolvió filas que ya están en proceso aquí
+                    with METRICS.medir('worker_stage_seconds', stage='idle', outcome='duplicados'):
+                        self._detener.wait(self.espera_duplicados)
+                    continue
+                for consulta in nuevas:
+                    self._poner(self.pendientes, consulta)
+            except Exception as e:
+                logger.error(f"Error obteniendo consultas (continuando): {type(e).__name__}: {e}", exc_info=True)
+                self._detener.wait(10)
+
+    def _etapa_consulta(self) -> None:
+        while not self._detener.is_set():
+            try:
+                consulta = self.pendientes.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if self._detener.is_set():
+                # Tomada justo al detener: no iniciar la consulta
+                self._descartar(consulta)
+                self._contar('devueltas')
+                return
+            with self._en_pipeline_lock:
+                self._en_consulta += 1
+            try:
+                item = self.procesar(consulta)
+            except Exception as e:
+                logger.error(f"Error procesando consulta: {e}", exc_info=True)
+                self._liberar(consulta)
+                continue
+            finally:
+                with self._en_pipeline_lock:
+                    self._en_consulta -= 1
+            self.hechos.put(item)
+
+    def _etapa_envio(self) -> None:
+        while True:
+            try:
+                item = self.hechos.get(timeout=0.5)
+            except queue.Empty:
+                if self._consultas_terminadas.is_set() or self._vencido():
+                    return
+                continue
+            if self._vencido():
+                # Plazo de drenado cumplido: no enviar, pasar a al_vencer
+                self._vencer(item)
+                continue
+            consulta, resultado = item
+            with self._en_pipeline_lock:
+                self._en_envio = item
+            try:
+                enviado = self.enviar(consulta, resultado)
+            except Exception as e:
+                logger.error(f"Error enviando resultado: {e}", exc_info=True)
+                enviado = None
+            with self._en_pipeline_lock:
+                # None: el drenado ya lo dio por vencido y lo contó (al_vencer)
+                vencido = self._en_envio is None
+                self._en_envio = None
+            if enviado is None:
+                self._liberar(consulta)
+                continue
+            if self._detener.is_set() and not vencido:
+                self._contar('enviadas')
+            if isinstance(enviado, Future):
+                enviado.add_done_callback(lambda _f, c=consulta: self._liberar(c))
+            else:
+                self._liberar(consulta)
+
+    # --- Auxiliares ---
+
+    def _registrar_nuevas(self, consultas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        nuevas = []
+        with self._en_pipeline_lock:
+            for consulta in consultas:
+                cid = id_consulta(consulta)
+                if cid is not None and cid in self._en_pipeline:
+                    continue
+                if cid is not None:
+                    self._en_pipeline.add(cid)
+                nuevas.append(consulta)
+        return nuevas
+
+    def _liberar(self, consulta: Dict[str, Any]) -> None:
+        cid = id_consulta(consulta)
+        if cid is not None:
+            with self._en_pipeline_lock:
+                self._en_pipeline.discard(cid)
+        if self.al_liberar is not None:
+            try:
+                self.al_liberar(consulta)
+            except Exception as e:
+                logger.warning(f"Error liberando consulta {cid}: {e}")
+
+    def _descartar(self, consulta: Dict[str, Any]) -> None:
+        """Saca del pipeline una fila que no se llegó a consultar (sin al_liberar: el lease sigue registrado)."""
+        cid = id_consulta(consulta)
+        if cid is not None:
+            with self._en_pipeline_lock:
+                self._en_pipeline.discard(cid)
+
+    def _poner(self, cola: "queue.Queue", item: Any) -> None:
+        while True:
+            try:
+                cola.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self._detener.is_set():
+                    self._descartar(item)
+                    return
@@ -0,0 +1,135 @@
+"""
+Escritura y lectura de resultados en JSON Lines (un objeto JSON por línea).
+
+- JsonlWriter agrega cada resultado apenas se produce (flush por línea) y
+  hace fsync por lotes: cada `fsync_cada` líneas o `fsync_intervalo` segundos.
+  Si el proceso muere, solo se pierde lo que el SO no alcanzó a escribir.
+- Rotación por tamaño: al superar `max_bytes` se continúa en
+  `<base>.0001.jsonl`, `<base>.0002.jsonl`, ...
+- leer_jsonl() itera los objetos de todos los segmentos sin cargarlos en
+  memoria; una línea truncada (caída a mitad de escritura) se ignora.
+"""
+
+import os
+import re
+import json
+import glob
+import time
+import logging
+from threading import Lock
+from typing import Any, Iterator, List, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+
+def _base(path: str) -> str:
+    return path[:-len('.jsonl')] if path.endswith('.jsonl') else path
+
+
+def segmentos(path: str) -> List[str]:
+    """Archivos de un JSONL rotado, en orden de escritura (el base primero)."""
+    base = _base(path)
+    patron = re.compile(re.escape(base) + r'\.(\d{4,})\.jsonl$')
+    numerados = []
+    for candidato in glob.glob(glob.escape(base) + '.*.jsonl'):
+        m = patron.match(candidato)
+        if m:
+            numerados.append((int(m.group(1)), candidato))
+    return ([path] if os.path.exists(path) else []) + [p for _, p in sorted(numerados)]
+
+
+class JsonlWriter:
+    """Escritor JSONL thread-safe con fsync por lotes y rotación por tamaño."""
+
+    def __init__(self, path: str, fsync_cada: int = 50, fsync_intervalo: float = 5.0,
+                 max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.fsync_cada = max(1, fsync_cada)
+        self.fsync_intervalo = fsync_intervalo
+        self.max_bytes = max_bytes
+        self.escritos = 0
+        self._lock = Lock()
+        self._sin_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        directorio = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directorio, exist_ok=True)
+        # Continuar en el último segmento si el archivo ya existía (reanudar tras una caída)
+        existentes = segmentos(path)
+        self._segmento = len(existentes) - 1 if existentes else 0
+        self._f: Optional[TextIO] = None
+        self._abrir()
+
+    def _ruta_segmento(self, n: int) -> str:
+        return self.path if n == 0 else f"{_base(self.path)}.{n:04d}.jsonl"
+
+    def _abrir(self) -> None:
+        ruta = self._ruta_segmento(self._segmento)
+        self._f = open(ruta, 'a', encoding='utf-8')
+        if self._f.tell() > 0:
+            with open(ruta, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                truncado = f.read(1) != b'\n'
+            if truncado:
+                # Caída a mitad de una línea: cerrarla para no pegarle la siguiente
+                self._f.write('\n')
+
+    def escribir(self, obj: Any) -> None:
+        linea = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+        with self._lock:
+            if self._f is None:
+                raise ValueError(f"JsonlWriter cerrado: {self.path}")
+            if self.max_bytes and self._f.tell() > 0 and self._f.tell() + len(linea.encode('utf-8')) > self.max_bytes:
+                self._rotar()
+            self._f.write(linea)
+            self._f.flush()
+            self.escritos += 1
+            self._sin_fsync += 1
+            if self._sin_fsync >= self.fsync_cada or time.monotonic() - self._ultimo_fsync >= self.fsync_intervalo:
+                self._fsync()
+
+    def _fsync(self) -> None:
+        os.fsync(self._f.fileno())
+        self._sin_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+
+    def _rotar(self) -> None:
+        self._fsync()
+        self._f.close()
+        self._segmento += 1
+        self._abrir()
+        logger.info(f"Resultados: rotado a {self._ruta_segmento(self._segmento)}")
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._f is not None and self._sin_fsync:
+                self._fsync()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is None:
+                return
+            if self._sin_fsync:
+                self._fsync()
+            self._f.close()
+            self._f = None
+
+    def __enter__(self) -> 'JsonlWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def leer_jsonl(path: str) -> Iterator[Any]:
+    """Itera los objetos de `path` y sus segmentos rotados, uno a la vez."""
+    for archivo in segmentos(path):
+        with open(archivo, encoding='utf-8') as f:
+            for n, linea in enumerate(f, 1):
+                if not linea.strip():
+                    continue
+                try:
+                    obj = json.loads(linea)
+                except json.JSONDecodeError:
+                    logger.warning(f"{archivo}:{n}: línea incompleta (escritura interrumpida), ignorada")
+                    continue
+                yield obj
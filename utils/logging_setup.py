@@ -0,0 +1,133 @@
+"""
+Logging del proceso: handler en cola, formato texto o JSON y muestreo por evento.
+
+- Los threads del worker solo encolan el LogRecord (QueueHandler). Un thread
+  aparte (QueueListener) lo formatea y escribe en stderr, así la E/S de logs
+  nunca corre en las etapas del pipeline. El mensaje se formatea recién ahí:
+  los argumentos deben ser valores que no cambien después (str, números).
+- LOG_FORMAT=json escribe una línea JSON por registro. Si el mensaje usa
+  argumentos con nombre (`logger.info("cedula=%(cedula)s", {'cedula': ...})`),
+  cada argumento sale además como campo propio, igual que los `extra`.
+- Muestreo: los registros INFO/DEBUG con `extra={'evento': nombre}` se emiten
+  1 de cada N según LOG_SAMPLE ('enviado=10,consulta=10'). WARNING y ERROR
+  nunca se muestrean. El registro emitido indica la tasa (`muestreo`).
+- logging.shutdown() (registrado en atexit por logging) cierra el handler
+  y vacía la cola.
+"""
+
+import sys
+import json
+import queue
+import logging
+import logging.handlers
+from itertools import count
+from threading import Lock
+from typing import Any, Dict, Optional
+
+FORMATO_TEXTO = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Atributos propios de LogRecord: lo demás viene de `extra`
+_ATRIBUTOS_RECORD = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+def parse_muestreo(texto: str) -> Dict[str, int]:
+    """'enviado=10,consulta=5' -> {'enviado': 10, 'consulta': 5} (1 = sin muestreo)."""
+    tasas = {}
+    for parte in (texto or '').split(','):
+        if '=' in parte:
+            evento, n = parte.split('=', 1)
+            tasas[evento.strip()] = max(1, int(n))
+    return tasas
+
+
+class MuestreoFilter(logging.Filter):
+    """Deja pasar 1 de cada N registros INFO/DEBUG de cada evento (contador, no azar: la tasa es exacta)."""
+
+    def __init__(self, tasas: Dict[str, int]):
+        super().__init__()
+        self.tasas = {e: n for e, n in tasas.items() if n > 1}
+        self._contadores = {e: count() for e in self.tasas}
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        evento = getattr(record, 'evento', None)
+        if evento is None or record.levelno >= logging.WARNING:
+            return True
+        n = self.tasas.get(evento)
+        if n is None:
+            return True
+        with self._lock:
+            i = next(self._contadores[evento])
+        if i % n:
+            return False
+        record.muestreo = n
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro: ts, nivel, logger, msg, campos de `extra` y argumentos con nombre."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            'ts': self.formatTime(record),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if isinstance(record.args, dict):
+            data.update(record.args)
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                data[clave] = valor
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _TextoFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        texto = super().format(record)
+        n = getattr(record, 'muestreo', None)
+        return f"{texto} [1 de cada {n}]" if n else texto
+
+
+class _ColaHandler(logging.handlers.QueueHandler):
+    """QueueHandler que deja el formateo al listener y lo detiene al cerrarse (logging.shutdown)."""
+
+    def __init__(self, cola: "queue.SimpleQueue", listener: Optional[logging.handlers.QueueListener] = None):
+        super().__init__(cola)
+        self.listener = listener
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Solo el traceback se resuelve aquí (retiene frames del thread); msg y args se formatean en el listener
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self) -> None:
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+        super().close()
+
+
+def configurar_logging(nivel: str = 'INFO', formato: str = 'text', muestreo: str = '') -> None:
+    """Reemplaza los handlers del root logger por un QueueHandler con escritura en stderr desde otro thread."""
+    salida = logging.StreamHandler(sys.stderr)
+    salida.setFormatter(JsonFormatter() if formato.lower() == 'json' else _TextoFormatter(FORMATO_TEXTO))
+    cola: "queue.SimpleQueue" = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=False)
+    handler = _ColaHandler(cola, listener)
+    tasas = parse_muestreo(muestreo)
+    if tasas:
+        handler.addFilter(MuestreoFilter(tasas))
+    root = logging.getLogger()
+    for anterior in list(root.handlers):
+        root.removeHandler(anterior)
+        anterior.close()
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, nivel.upper(), logging.INFO))
+    listener.start()
@@ -0,0 +1,67 @@
+"""
+Single-flight: coalesce llamadas concurrentes con la misma clave.
+
+Solo una llamada por clave se ejecuta a la vez; las demás esperan y reciben
+el mismo resultado (o la misma excepción).
+"""
+
+import copy
+import logging
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Llamada:
+    __slots__ = ('evento', 'resultado', 'error', 'esperando')
+
+    def __init__(self):
+        self.evento = Event()
+        self.resultado = None
+        self.error = None
+        self.esperando = 0
+
+
+class SingleFlight:
+    """Grupo thread-safe de llamadas en vuelo, indexadas por clave."""
+
+    def __init__(self, nombre: str = ''):
+        self.nombre = nombre
+        self._lock = Lock()
+        self._en_vuelo: Dict[Hashable, _Llamada] = {}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecuta fn(*args, **kwargs) o espera a la llamada en vuelo con la misma clave."""
+        with self._lock:
+            llamada = self._en_vuelo.get(key)
+            lider = llamada is None
+            if lider:
+                llamada = _Llamada()
+                self._en_vuelo[key] = llamada
+            else:
+                llamada.esperando += 1
+
+        if not lider:
+            logger.info(f"[{self.nombre}] Esperando consulta en vuelo para {key}")
+            llamada.evento.wait()
+            if llamada.error is not None:
+                raise llamada.error
+            # Copia: cada llamador puede modificar su resultado sin afectar a los demás
+            return copy.deepcopy(llamada.resultado)
+
+        try:
+            llamada.resultado = fn(*args, **kwargs)
+        except BaseException as e:
+            llamada.error = e
+            raise
+        finally:
+            with self._lock:
+                self._en_vuelo.pop(key, None)
+                compartido = llamada.esperando > 0
+            llamada.evento.set()
+        return copy.deepcopy(llamada.resultado) if compartido else llamada.resultado
+
+    def en_vuelo(self) -> int:
+        with self._lock:
+            return len(self._en_vuelo)
@@ -0,0 +1,81 @@
+"""
+Snapshot JSON periódico en background para estructuras en memoria.
+
+Quien lo usa llama `marcar()` al modificar su estado (O(1), sin E/S); un
+thread escribe el archivo como mucho cada `intervalo` segundos, fuera del
+lock del dueño: `capturar()` solo copia los datos bajo ese lock y la
+serialización y el disco corren después. La escritura es atómica (tmp +
+os.replace). `cerrar()` (también al salir del proceso) escribe lo pendiente;
+un corte abrupto pierde a lo sumo los cambios de los últimos `intervalo` s.
+"""
+
+import os
+import json
+import atexit
+import logging
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotPeriodico:
+    """Escribe `capturar()` en `path` como JSON, agrupando los cambios de cada `intervalo`."""
+
+    def __init__(self, path: str, capturar: Callable[[], Any], intervalo: float = 5.0, nombre: str = 'snapshot'):
+        self.path = path
+        self.capturar = capturar
+        self.intervalo = max(0.0, intervalo)
+        self.nombre = nombre
+        self._lock = Lock()
+        self._io_lock = Lock()
+        self._sucio = False
+        self._cambio = Event()
+        self._cerrado = Event()
+        self._thread: Optional[Thread] = None
+        atexit.register(self.cerrar)
+
+    def marcar(self) -> None:
+        """El estado cambió: se escribirá en el próximo ciclo."""
+        with self._lock:
+            self._sucio = True
+            if self._thread is None and not self._cerrado.is_set():
+                self._thread = Thread(target=self._run, name=f'{self.nombre}-snapshot', daemon=True)
+                self._thread.start()
+        self._cambio.set()
+
+    def escribir(self) -> bool:
+        """Escribe ya si hay cambios pendientes. Retorna True si escribió."""
+        with self._io_lock:
+            with self._lock:
+                if not self._sucio:
+                    return False
+                # Limpiar antes de capturar: un cambio durante la escritura vuelve a marcar
+                self._sucio = False
+            datos = self.capturar()
+            tmp = f"{self.path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(datos, f)
+                os.replace(tmp, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"No se pudo persistir {self.nombre} en {self.path}: {e}")
+                with self._lock:
+                    self._sucio = True
+                return False
+            return True
+
+    def cerrar(self) -> None:
+        """Detiene el thread y escribe lo pendiente."""
+        self._cerrado.set()
+        self._cambio.set()
+        self.escribir()
+
+    def _run(self) -> None:
+        while not self._cerrado.is_set():
+            self._cambio.wait()
+            self._cambio.clear()
+            # Agrupar los cambios del intervalo en una sola escritura; cerrar() corta la espera
+            self._cerrado.wait(self.intervalo)
+            self.escribir()
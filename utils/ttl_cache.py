@@ -0,0 +1,146 @@
+"""
+Cache TTL acotado y thread-safe.
+
+- Un único lock protege dict + heap de expiraciones.
+- Expiración O(log n) amortizado: el heap se consume solo hasta la primera
+  entrada vigente (entradas obsoletas se descartan de forma perezosa).
+- Al superar maxsize se expulsa la entrada que vence primero.
+- Persistencia opcional a un archivo JSON para no perder la lista de bloqueo
+  al reiniciar el contenedor: set/pop solo marcan el cambio y un snapshot
+  periódico (utils.snapshot) escribe el archivo fuera del lock, como mucho
+  cada `intervalo_guardado` segundos.
+"""
+
+import json
+import time
+import heapq
+import logging
+from itertools import count
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from utils.snapshot import SnapshotPeriodico
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Mapa clave -> valor con TTL fijo, tamaño máximo y persistencia opcional."""
+
+    def __init__(self, ttl: float, maxsize: int = 10000, path: Optional[str] = None,
+                 intervalo_guardado: float = 5.0):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.path = path
+        self._lock = Lock()
+        self._datos: Dict[Hashable, Tuple[float, Any]] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._seq = count()
+        self._snapshot: Optional[SnapshotPeriodico] = None
+        if path:
+            self._cargar()
+            self._snapshot = SnapshotPeriodico(path, self._capturar, intervalo_guardado, nombre='cache TTL')
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _AUSENTE) is not _AUSENTE
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._purgar_locked(time.time())
+            return len(self._datos)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Valor vigente para key, o default."""
+        with self._lock:
+            entrada = self._datos.get(key)
+            if entrada is None:
+                return default
+            if entrada[0] <= time.time():
+                del self._datos[key]
+                return default
+            return entrada[1]
+
+    def set(self, key: Hashable, value: Any = None, ttl: Optional[float] = None) -> None:
+        """Guarda key con TTL (por defecto el del cache)."""
+        expira = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._datos[key] = (expira, value)
+            heapq.heappush(self._heap, (expira, next(self._seq), key))
+            while len(self._datos) > self.maxsize:
+                self._expulsar_siguiente_locked()
+            self._compactar_locked()
+            if self._snapshot is not None:
+                self._snapshot.marcar()
+
+    def add(self, key: Hashable) -> None:
+        """Marca key como presente (uso tipo set con expiración)."""
+        self.set(key, time.time())
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entrada = self._datos.pop(key, None)
+            if entrada is not None and self._snapshot is not None:
+                self._snapshot.marcar()
+        return default if entrada is None else entrada[1]
+
+    def purge(self) -> int:
+        """Elimina entradas expiradas. Costo proporcional a las expiradas, no al total."""
+        with self._lock:
+            eliminadas = self._purgar_locked(time.time())
+            if eliminadas and self._snapshot is not None:
+                self._snapshot.marcar()
+            return eliminadas
+
+    def close(self) -> None:
+        """Escribe los cambios pendientes (sin persistencia no hace nada)."""
+        if self._snapshot is not None:
+            self._snapshot.cerrar()
+
+    def _purgar_locked(self, now: float) -> int:
+        eliminadas = 0
+        while self._heap and self._heap[0][0] <= now:
+            expira, _, key = heapq.heappop(self._heap)
+            entrada = self._datos.get(key)
+            if entrada is not None and entrada[0] == expira:
+                del self._datos[key]
+                eliminadas += 1
+        return eliminadas
+
+    def _expulsar_siguiente_locked(self) -> None:
+        while self._heap:
+            expira, _, key = heapq.heappop(self._heap)
+            entrada = self._datos.get(key)
+            if entrada is not None and entrada[0] == expira:
+                del self._datos[key]
+                return
+
+    def _compactar_locked(self) -> None:
+        # Re-registros dejan entradas obsoletas en el heap; reconstruir si crecen demasiado
+        if len(self._heap) > 2 * len(self._datos) + 64:
+            self._heap = [(exp, next(self._seq), k) for k, (exp, _) in self._datos.items()]
+            heapq.heapify(self._heap)
+
+    def _capturar(self) -> List[list]:
+        with self._lock:
+            return [[k, exp, v] for k, (exp, v) in self._datos.items()]
+
+    def _cargar(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entradas = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo cargar cache TTL desde {self.path}: {e}")
+            return
+        now = time.time()
+        vigentes = sorted((e for e in entradas if e[1] > now), key=lambda e: e[1])[-self.maxsize:]
+        for key, expira, value in vigentes:
+            self._datos[key] = (expira, value)
+            self._heap.append((expira, next(self._seq), key))
+        heapq.heapify(self._heap)
+        if vigentes:
+            logger.info(f"Cache TTL restaurado desde {self.path}: {len(vigentes)} entrada(s)")
+
+
+_AUSENTE = object()
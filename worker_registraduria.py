@@ -12,23 +12,26 @@ Variables de entorno (.env):
 Ejecutar: python worker_registraduria.py
 """
 
-import os
 import sys
 import time
 import random
 import signal
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed, CancelledError
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Any, Optional, Tuple
 
-# Cargar .env
-try:
-    from dotenv import load_dotenv
-    _dir = os.path.dirname(os.path.abspath(__file__))
-    load_dotenv(os.path.join(_dir, '.env'))
-except ImportError:
-    pass
-
-from config import settings
+from config import settings  # carga .env
+from utils.logging_setup import configurar_logging
+from services.result_batcher import ResultBatcher
+from services.worker_pipeline import WorkerPipeline
+from services.poller import AdaptivePoller
+from services.lease_manager import LeaseManager
+from services.outbox import ResultOutbox
+from services.retry_scheduler import RetryScheduler, clase_reintento, parse_backoff
+from services.metrics import METRICS, clase_resultado
+from services.profiler import Perfilador
+if TYPE_CHECKING:
+    from services.admin_server import AdminServer
 from services.registraduria_supabase import (
     TWOCAPTCHA_API_KEY,
     CONSULTA_API_TOKEN,
@@ -37,19 +40,35 @@ from services.registraduria_supabase import (
     BASE_URL,
     query_registraduria,
     query_registraduria_scraper_fallback,
+    obtener_resultado_cacheado,
     NO_CENSO_DATOS,
     obtener_consultas_pendientes,
-    enviar_resultado,
+    construir_payload_resultado,
+    enviar_payload_detalle,
+    enviar_resultados_lote,
+    renovar_leases,
+    liberar_leases,
+    API_BREAKER,
     TokenCache,
     ENABLE_TOKEN_POOL,
-    FAILED_CEDULAS_CACHE,
-    FAILED_CACHE_TTL,
+    purgar_estado,
+    en_vuelo_en_otra_replica,
+    EN_VUELO_TTL,
     _solve_recaptcha_direct,
 )
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configurar_logging(settings.LOG_LEVEL, settings.LOG_FORMAT, settings.LOG_SAMPLE)
 logger = logging.getLogger(__name__)
 
+# Del plazo de drenado (WORKER_DRAIN_SECONDS), segundos reservados para el cierre (lotes, outbox, leases)
+# y, dentro de esa reserva, para liberar los leases
+RESERVA_CIERRE = 2.0
+RESERVA_LEASES = 1.0
+
+# Filas extra (como máximo) que se piden a una cola que vuelve a ofrecer filas ya conocidas aquí
+# (esperando en el outbox o aplazadas por estar en vuelo en otra réplica), para que no tapen a las demás
+SOBREPEDIDO_MAX = 50
+
 
 def _warmup_token_pool(num_tokens: int = 2) -> None:
     if not ENABLE_TOKEN_POOL or not TWOCAPTCHA_API_KEY:
@@ -57,38 +76,258 @@ def _warmup_token_pool(num_tokens: int = 2) -> None:
     token_cache = TokenCache()
     if token_cache.get_pool_size() > 0:
         return
-    logger.info(f"Warmup: pre-llenando pool con {num_tokens} token(s)...")
+    logger.info("Warmup: pre-llenando pool con %d token(s)...", num_tokens)
     for _ in range(num_tokens):
         token = _solve_recaptcha_direct(SITE_KEY, BASE_URL)
         if token:
             token_cache.put_token(token)
-    logger.info(f"Warmup completo. Pool: {token_cache.get_pool_size()} token(s)")
-
-
-def _limpiar_cache_fallidas() -> None:
-    now = time.time()
-    # Copia para evitar RuntimeError si otro thread modifica durante iteración
-    expiradas = [c for c, ts in list(FAILED_CEDULAS_CACHE.items()) if now - ts >= FAILED_CACHE_TTL]
-    for c in expiradas:
-        FAILED_CEDULAS_CACHE.pop(c, None)
+    logger.info("Warmup completo. Pool: %d token(s)", token_cache.get_pool_size())
 
 
 def procesar_consulta(consulta: dict) -> tuple:
-    time.sleep(random.uniform(0, 0.5))
     cedula = consulta.get('cedula') or consulta.get('numero_documento', '')
     if not cedula:
+        METRICS.incrementar('worker_consultas_total', outcome='api_error', source='invalida')
         return (consulta, {"status": "api_error", "error": "Cedula no especificada"})
-    resultado = query_registraduria(cedula)
+    # Repetidas (re-importaciones de la cola): responder desde cache sin consulta remota
+    with METRICS.medir('worker_stage_seconds', stage='cache') as m:
+        cacheado = obtener_resultado_cacheado(cedula)
+        m.outcome = 'miss' if cacheado is None else clase_resultado(cacheado)
+    if cacheado is not None:
+        logger.info("Resultado desde cache para cedula=%(cedula)s", {'cedula': cedula}, extra={'evento': 'cache'})
+        METRICS.incrementar('worker_consultas_total', outcome=m.outcome, source='cache')
+        return (consulta, cacheado)
+    time.sleep(random.uniform(0, 0.5))
+    origen = 'api'
+    with METRICS.medir('worker_stage_seconds', stage='lookup') as m:
+        resultado = query_registraduria(cedula)
+        m.outcome = clase_resultado(resultado)
     # Solo scraper si not_found SIN no_censo (scraper usa misma API, no aporta si ya sabemos no_censo)
     if resultado and resultado.get('status') == 'not_found' and not resultado.get('no_censo') and settings.ENABLE_SCRAPER_FALLBACK:
-        logger.info(f"Intentando scraper fallback para cedula={cedula}")
-        fallback = query_registraduria_scraper_fallback(cedula)
+        logger.info("Intentando scraper fallback para cedula=%(cedula)s", {'cedula': cedula})
+        with METRICS.medir('worker_stage_seconds', stage='fallback') as m:
+            fallback = query_registraduria_scraper_fallback(cedula)
+            m.outcome = clase_resultado(fallback)
         if fallback and any(v for k, v in fallback.items() if k != 'status' and v):
             resultado = fallback
-            logger.info(f"Scraper fallback obtuvo datos para cedula={cedula}")
+            origen = 'scraper'
+            logger.info("Scraper fallback obtuvo datos para cedula=%(cedula)s", {'cedula': cedula})
+    METRICS.incrementar('worker_consultas_total', outcome=clase_resultado(resultado), source=origen)
     return (consulta, resultado)
 
 
+def construir_envio(consulta: dict, resultado: Optional[dict]) -> Optional[Tuple[dict, str, Any]]:
+    """
+    (payload, etiqueta, detalle) para recibir-datos. None si la consulta no trae id/cola_id.
+    `detalle` es lo que acompaña al log del envío (error o resultado); los datos de un éxito solo van a DEBUG.
+    """
+    cola_id = consulta.get('id') or consulta.get('cola_id')
+    cedula = consulta.get('cedula') or consulta.get('numero_documento', '')
+    elector_id = consulta.get('elector_id') or consulta.get('electorId')
+    lease_id = consulta.get('lease_id')
+    if cola_id is None:
+        logger.error("Consulta sin id/cola_id: %s", list(consulta.keys()))
+        return None
+
+    def _payload(ok_flag, err=None, d=None):
+        return construir_payload_resultado(cola_id, cedula, ok_flag, datos=d, error=err, elector_id=elector_id, lease_id=lease_id)
+
+    if resultado and resultado.get('status') == 'api_error':
+        err_msg = resultado.get('error', 'Error API')
+        return _payload(False, err=err_msg), 'api_error', err_msg
+    if resultado and resultado.get('status') == 'not_found':
+        if resultado.get('no_censo'):
+            return _payload(True, d=NO_CENSO_DATOS), 'NO CENSO', None
+        return _payload(False, err='Cedula no encontrada'), 'not_found', None
+    if resultado and any(v for k, v in resultado.items() if k != 'status' and v):
+        # El resultado ya viene normalizado con las claves de `datos` (services/normalizer.py)
+        return _payload(True, d=resultado), 'exito', resultado
+    return _payload(False, err='No se encontraron datos'), 'sin datos', resultado
+
+
+def enviar_consulta(consulta: dict, resultado: Optional[dict], batcher: Optional[ResultBatcher] = None,
+                    outbox: Optional[ResultOutbox] = None, reintentos: Optional[RetryScheduler] = None):
+    """
+    Envía el resultado de una consulta. Con batcher retorna un Future[(ok, reintentable)]; sin él, el bool ok.
+    Si el envío falla y hay outbox, el payload queda guardado para reenvío (la fila queda marcada
+    `en_outbox`: su lease se sigue renovando hasta que el outbox la entrega).
+    Una consulta diferida (API caída) no se envía: queda marcada para devolver la fila a la cola.
+    Con reintentos, un api_error de una fila con lease no se envía hasta agotar el presupuesto de la
+    cédula: la fila queda retenida. Sin lease (la cola la vuelve a ofrecer en cada poll) se envía como antes.
+    """
+    cedula = consulta.get('cedula') or consulta.get('numero_documento', '')
+    if resultado and resultado.get('status') == 'diferida':
+        # En vuelo en otra réplica: no devolver la fila ya (se volvería a tomar en el próximo poll);
+        # su lease vence solo y para entonces el resultado está en el cache compartido
+        consulta['diferida'] = not resultado.get('en_otra_replica')
+        if resultado.get('en_otra_replica'):
+            consulta['en_otra_replica'] = True
+        METRICS.incrementar('worker_envios_total', outcome='diferida')
+        logger.info("Diferida cedula=%(cedula)s (%(error)s)", {'cedula': cedula, 'error': resultado.get('error')})
+        return False
+    if reintentos is not None and cedula:
+        clase = clase_reintento(resultado)
+        if clase is None:
+            reintentos.completar(cedula)
+        elif consulta.get('lease_id'):
+            espera = reintentos.programar(consulta, clase)
+            if espera is not None:
+                consulta['reprogramada'] = True
+                METRICS.incrementar('worker_reintentos_total', clase=clase, outcome='programado')
+                logger.info("Reintento (%(clase)s) cedula=%(cedula)s en %(espera).0fs (intento %(intento)d/%(max_intentos)d)",
+                            {'clase': clase, 'cedula': cedula, 'espera': espera,
+                             'intento': reintentos.intentos(cedula), 'max_intentos': reintentos.max_intentos})
+                return False
+            METRICS.incrementar('worker_reintentos_total', clase=clase, outcome='agotado')
+            consulta['reintentos_agotados'] = True
+            resultado = reintentos.resultado_agotado(resultado)
+    envio = construir_envio(consulta, resultado)
+    if envio is None:
+        return False
+    payload, etiqueta, detalle = envio
+
+    inicio = time.perf_counter()
+
+    def _log(ok: bool) -> None:
+        outcome = 'ok' if ok else 'error'
+        METRICS.observar('worker_stage_seconds', time.perf_counter() - inicio, stage='submit', outcome=outcome)
+        METRICS.incrementar('worker_envios_total', outcome=outcome)
+        campos = {'etiqueta': etiqueta, 'cedula': payload['cedula'], 'cola_id': payload['cola_id'], 'ok': ok}
+        if etiqueta in ('exito', 'NO CENSO'):
+            # Alto volumen: muestreado (LOG_SAMPLE 'enviado') y sin los datos personales del votante
+            logger.info("Enviado (%(etiqueta)s) cedula=%(cedula)s cola_id=%(cola_id)s ok=%(ok)s", campos,
+                        extra={'evento': 'enviado'} if ok else None)
+            if detalle is not None:
+                logger.debug("Datos cedula=%(cedula)s: %(datos)s", {'cedula': payload['cedula'], 'datos': detalle})
+        else:
+            campos['detalle'] = detalle
+            logger.info("Enviado (%(etiqueta)s) cedula=%(cedula)s cola_id=%(cola_id)s ok=%(ok)s detalle=%(detalle)s", campos)
+
+    if batcher is None:
+        ok, reintentable = enviar_payload_detalle(payload)
+        _log(ok)
+        if not ok and reintentable and outbox is not None:
+            outbox.agregar(payload)
+            consulta['en_outbox'] = True
+        return ok
+
+    def _al_terminar(future) -> None:
+        ok, reintentable = future.result()
+        _log(ok)
+        if not ok and reintentable and outbox is not None:
+            outbox.agregar(payload)
+            consulta['en_outbox'] = True
+
+    # Este callback corre antes que el del pipeline (al_liberar), que ya ve la marca en_outbox
+    future = batcher.submit(payload)
+    future.add_done_callback(_al_terminar)
+    return future
+
+
+def _iniciar_admin(poller: AdaptivePoller, perfilador: Perfilador) -> Optional['AdminServer']:
+    """
+    Servidor admin local opcional (WORKER_ADMIN_PORT).
+    POST /wake adelanta el próximo poll; GET /metrics expone las métricas en formato Prometheus.
+    POST /profile/cpu?segundos=N inicia una captura de cProfile; POST /profile/memoria toma un
+    snapshot de tracemalloc (?detener=1 lo apaga).
+    """
+    if settings.WORKER_ADMIN_PORT <= 0:
+        return None
+    # http.server solo se importa si el servidor admin está habilitado
+    from services.admin_server import AdminServer, respuesta_json
+    admin = AdminServer(settings.WORKER_ADMIN_HOST, settings.WORKER_ADMIN_PORT, settings.WORKER_ADMIN_TOKEN)
+
+    def _wake(params, cuerpo):
+        poller.despertar()
+        return respuesta_json({'ok': True})
+
+    def _metrics(params, cuerpo):
+        return 200, 'text/plain; version=0.0.4; charset=utf-8', METRICS.render().encode('utf-8')
+
+    def _perfil_cpu(params, cuerpo):
+        segundos = float(params.get('segundos') or settings.PROFILE_SECONDS)
+        try:
+            ruta = perfilador.iniciar_cpu(segundos)
+        except ValueError as e:
+            return respuesta_json({'error': str(e)}, 409)
+        return respuesta_json({'archivo': ruta, 'segundos': segundos})
+
+    def _perfil_memoria(params, cuerpo):
+        if params.get('detener') in ('1', 'true'):
+            return respuesta_json({'estado': 'detenido' if perfilador.detener_memoria() else 'inactivo'})
+        return respuesta_json(perfilador.snapshot_memoria())
+
+    admin.ruta('POST', '/wake', _wake)
+    admin.ruta('GET', '/metrics', _metrics)
+    admin.ruta('POST', '/profile/cpu', _perfil_cpu)
+    admin.ruta('POST', '/profile/memoria', _perfil_memoria)
+    try:
+        admin.start()
+    except OSError as e:
+        logger.error(f"No se pudo iniciar admin HTTP en {settings.WORKER_ADMIN_HOST}:{settings.WORKER_ADMIN_PORT}: {e}")
+        return None
+    return admin
+
+
+def _senales_perfil(perfilador: Perfilador) -> None:
+    """SIGUSR1 inicia una captura de CPU de PROFILE_SECONDS; SIGUSR2 toma un snapshot de memoria."""
+    if not hasattr(signal, 'SIGUSR1'):
+        return
+
+    def _cpu(sig, frame):
+        try:
+            perfilador.iniciar_cpu(settings.PROFILE_SECONDS)
+        except ValueError as e:
+            logger.warning(f"SIGUSR1 ignorada: {e}")
+
+    def _memoria(sig, frame):
+        # tracemalloc.take_snapshot puede tardar: fuera del handler para no frenar el thread principal
+        Thread(target=perfilador.snapshot_memoria, name='perfil-memoria', daemon=True).start()
+
+    signal.signal(signal.SIGUSR1, _cpu)
+    signal.signal(signal.SIGUSR2, _memoria)
+
+
+def _cerrar(resumen: dict, admin: Optional['AdminServer'], batcher: Optional[ResultBatcher],
+            outbox: Optional[ResultOutbox], leases: Optional[LeaseManager]) -> None:
+    """
+    Cierre tras drenar el pipeline, dentro de lo que quede de WORKER_DRAIN_SECONDS (al menos RESERVA_CIERRE);
+    la liberación de leases siempre tiene RESERVA_LEASES. Registra qué pasó con cada fila.
+    """
+    limite = time.monotonic() + max(RESERVA_CIERRE, settings.WORKER_DRAIN_SECONDS - resumen.get('segundos', 0))
+
+    def _restante(reserva: float = 0.0) -> float:
+        return max(0.2, limite - reserva - time.monotonic())
+
+    if admin is not None:
+        admin.stop()
+    if batcher is not None:
+        # Resultados encolados o en un lote sin respuesta: al outbox (idempotency_key evita duplicados)
+        for payload in batcher.close(timeout=_restante(RESERVA_LEASES)):
+            if outbox is not None:
+                outbox.agregar(payload, espera=0)
+                if leases is not None:
+                    leases.soltar(payload)
+                resumen['guardadas'] += 1
+            else:
+                resumen['perdidas'] += 1
+    if outbox is not None:
+        if leases is not None:
+            # Filas con resultado en el outbox: sin liberar (se reenvía al reiniciar; el lease vence solo)
+            en_outbox = outbox.cola_ids()
+            for lease in leases.vigentes():
+                if str(lease['cola_id']) in en_outbox:
+                    leases.soltar(lease)
+        outbox.stop(timeout=_restante(RESERVA_LEASES))
+    liberadas = leases.stop(liberar=True, timeout=_restante()) if leases is not None else 0
+    logger.info(
+        f"Worker finalizado: {resumen['enviadas']:.0f} resultado(s) pasaron a envío al drenar, "
+        f"{resumen['guardadas']:.0f} guardados en outbox, {resumen['perdidas']:.0f} perdidos, "
+        f"{resumen['devueltas']:.0f} fila(s) sin empezar devueltas, {resumen['abandonadas']:.0f} consulta(s) "
+        f"abandonadas por plazo, {liberadas} lease(s) liberados"
+    )
+
+
 def main():
     if not TWOCAPTCHA_API_KEY:
         logger.error("Configura TWOCAPTCHA_API_KEY en .env")
@@ -103,11 +342,191 @@ def main():
         _warmup_token_pool(num_tokens=1)
     except BaseException as e:
         logger.warning(f"Warmup falló (continuando): {e}")
-    running = True
+
+    batcher = None
+    if settings.RESULT_BATCH_SIZE > 1:
+        batcher = ResultBatcher(enviar_resultados_lote, max_items=settings.RESULT_BATCH_SIZE, ventana=settings.RESULT_BATCH_WINDOW)
+        logger.info(f"Envío por lotes: hasta {settings.RESULT_BATCH_SIZE} resultados o {settings.RESULT_BATCH_WINDOW}s")
+
+    leases = None
+    if settings.QUEUE_LEASE_SECONDS > 0:
+        leases = LeaseManager(
+            renovar=lambda l: renovar_leases(l, settings.QUEUE_LEASE_SECONDS),
+            liberar=liberar_leases,
+            lease_seconds=settings.QUEUE_LEASE_SECONDS,
+        )
+        leases.start()
+        logger.info(f"Leases de cola: {settings.QUEUE_LEASE_SECONDS:g}s (worker_id={settings.WORKER_ID})")
+
+    outbox = None
+    if settings.OUTBOX_PATH:
+        try:
+            outbox = ResultOutbox(
+                settings.OUTBOX_PATH,
+                enviar_payload_detalle,
+                backoff_base=settings.OUTBOX_BACKOFF_BASE,
+                backoff_max=settings.OUTBOX_BACKOFF_MAX,
+                max_intentos=settings.OUTBOX_MAX_INTENTOS,
+                # El lease de la fila se renueva mientras su resultado espera en el outbox
+                al_resolver=leases.soltar if leases is not None else None,
+            )
+            outbox.start()
+        except Exception as e:
+            logger.error(f"Outbox deshabilitado ({settings.OUTBOX_PATH}): {e}")
+            outbox = None
+
+    reintentos = None
+    if settings.RETRY_MAX_INTENTOS > 1:
+        reintentos = RetryScheduler(
+            parse_backoff(settings.RETRY_BACKOFF),
+            max_intentos=settings.RETRY_MAX_INTENTOS,
+            backoff_max=settings.RETRY_BACKOFF_MAX,
+            path=settings.RETRY_PATH or None,
+        )
+        logger.info(f"Reintentos locales: hasta {settings.RETRY_MAX_INTENTOS} consultas por cédula ({settings.RETRY_BACKOFF})")
+
+    # Filas sin lease diferidas porque otra réplica consulta su cédula: cola_id -> (cédula, hasta).
+    # La cola las vuelve a ofrecer en cada poll; se retienen aquí hasta que la otra réplica suelte
+    # (o venza) el reclamo, así el poll no vuelve a traer solo filas diferidas y el poller puede espaciar.
+    aplazadas: dict = {}
+    aplazadas_lock = Lock()
+
+    def _aplazada(consulta: dict) -> bool:
+        cid = consulta.get('id') or consulta.get('cola_id')
+        with aplazadas_lock:
+            entrada = aplazadas.get(cid)
+        if entrada is None:
+            return False
+        cedula, hasta = entrada
+        if time.monotonic() < hasta and en_vuelo_en_otra_replica(cedula):
+            return True
+        with aplazadas_lock:
+            aplazadas.pop(cid, None)
+        return False
+
+    def _aplazar(consulta: dict) -> None:
+        cid = consulta.get('id') or consulta.get('cola_id')
+        cedula = consulta.get('cedula') or consulta.get('numero_documento', '')
+        now = time.monotonic()
+        with aplazadas_lock:
+            # Filas que la cola dejó de ofrecer (resueltas): se olvidan al vencer su plazo
+            for vieja in [k for k, (_, hasta) in aplazadas.items() if hasta <= now]:
+                del aplazadas[vieja]
+            aplazadas[cid] = (cedula, now + EN_VUELO_TTL)
+
+    def _obtener(limit: int) -> list:
+        # Primero las filas retenidas cuyo reintento venció; el resto, de la cola
+        vencidas = reintentos.vencidas(limit) if reintentos is not None else []
+        if len(vencidas) >= limit:
+            return vencidas
+        pedir = limit - len(vencidas)
+        extra = len(aplazadas)
+        if outbox is not None and leases is None:
+            # Sin leases la cola vuelve a ofrecer las filas que esperan en el outbox: pedir de más para pasarlas
+            extra += outbox.pendientes()
+        pedir += min(extra, SOBREPEDIDO_MAX)
+        with METRICS.medir('worker_stage_seconds', stage='fetch') as m:
+            consultas = obtener_consultas_pendientes(
+                tipo='registraduria', limit=pedir, espera=settings.QUEUE_LONG_POLL,
+                lease_segundos=settings.QUEUE_LEASE_SECONDS,
+            )
+            m.outcome = 'rows' if consultas else 'empty'
+        if leases is not None:
+            consultas = leases.registrar(consultas)
+        if outbox is not None and consultas:
+            # Filas cuyo resultado ya está en el outbox: no repetir la consulta. Su lease (registrado
+            # arriba) se renueva hasta que el outbox las entrega (al_resolver).
+            consultas = [c for c in consultas if not outbox.contiene(c.get('id') or c.get('cola_id'))]
+        if aplazadas and consultas:
+            consultas = [c for c in consultas if not _aplazada(c)]
+        consultas = consultas[:limit - len(vencidas)]
+        if reintentos is not None and consultas:
+            # Filas que la cola ofrece antes de su hora de reintento: quedan retenidas (con su lease).
+            # Solo con lease: sin él la cola las vuelve a ofrecer y taparían a las demás filas.
+            consultas = [c for c in consultas if not (c.get('lease_id') and reintentos.retener(c))]
+        return vencidas + consultas
+
+    def _liberar_fila(consulta: dict) -> None:
+        if consulta.pop('en_otra_replica', False) and not consulta.get('lease_id'):
+            _aplazar(consulta)
+        if consulta.pop('reprogramada', False):
+            return  # retenida hasta su reintento: el lease se sigue renovando
+        if consulta.pop('en_outbox', False):
+            return  # el outbox suelta el lease al entregar el resultado (al_resolver)
+        diferida = consulta.pop('diferida', False)
+        if leases is None:
+            return
+        # Diferida: liberar el lease ya (después de salir del pipeline) para que la fila se reintente
+        if diferida:
+            leases.devolver(consulta)
+        else:
+            leases.soltar(consulta)
+
+    poller = AdaptivePoller(
+        minimo=settings.POLL_MIN_INTERVAL,
+        maximo=settings.POLL_MAX_INTERVAL,
+        factor=settings.POLL_BACKOFF_FACTOR,
+        jitter=settings.POLL_JITTER,
+    )
+    def _guardar_pendiente(consulta: dict, resultado: Optional[dict]) -> Optional[bool]:
+        """
+        Resultado listo que no alcanzó a enviarse en el plazo de drenado: al outbox para enviarlo al reiniciar.
+        None = la fila vuelve a la cola sin resultado (diferida, o reintento registrado en RETRY_PATH).
+        """
+        if resultado and resultado.get('status') == 'diferida':
+            return None
+        cedula = consulta.get('cedula') or consulta.get('numero_documento', '')
+        clase = clase_reintento(resultado)
+        if consulta.get('reintentos_agotados'):
+            # Envío del fallo definitivo en curso al vencer el plazo: el presupuesto ya se consumió
+            clase = None
+            resultado = reintentos.resultado_agotado(resultado)
+        if reintentos is not None and cedula and consulta.get('lease_id'):
+            if clase is None:
+                reintentos.completar(cedula)
+            elif reintentos.programar(consulta, clase) is not None:
+                return None  # el intento queda registrado: al reiniciar la fila espera su hora de reintento
+            else:
+                resultado = reintentos.resultado_agotado(resultado)
+        if outbox is None:
+            return False
+        envio = construir_envio(consulta, resultado)
+        if envio is None:
+            return False
+        outbox.agregar(envio[0], espera=0)
+        if leases is not None:
+            leases.soltar(consulta)  # sin liberar: la fila no se vuelve a consultar mientras el outbox la envía
+        return True
+
+    # Etapas envueltas para el perfilado bajo demanda (sin captura activa no agrega costo medible)
+    perfilador = Perfilador(settings.PROFILE_DIR, frames=settings.PROFILE_TRACEMALLOC_FRAMES)
+    pipeline = WorkerPipeline(
+        obtener=perfilador.envolver(_obtener),
+        procesar=perfilador.envolver(procesar_consulta),
+        enviar=perfilador.envolver(
+            lambda consulta, resultado: enviar_consulta(consulta, resultado, batcher, outbox, reintentos)),
+        lookup_workers=settings.WORKER_MAX_WORKERS,
+        fetch_limit=settings.WORKER_MAX_WORKERS,
+        poller=poller,
+        antes_de_obtener=purgar_estado,
+        al_liberar=_liberar_fila,
+        pausa_obtener=API_BREAKER.segundos_abierto,
+        plazo_drenado=max(1.0, settings.WORKER_DRAIN_SECONDS - RESERVA_CIERRE),
+        al_vencer=_guardar_pendiente,
+    )
+    METRICS.gauge('worker_consultas_en_proceso', pipeline.en_pipeline, 'Filas tomadas de la cola y aún sin enviar')
+    if outbox is not None:
+        METRICS.gauge('worker_outbox_pendientes', outbox.pendientes, 'Resultados esperando reenvío en el outbox')
+    if reintentos is not None:
+        METRICS.gauge('worker_reintentos_retenidas', reintentos.retenidas, 'Filas retenidas esperando su reintento local')
+    if leases is not None:
+        METRICS.gauge('worker_leases_vigentes', lambda: len(leases.vigentes()), 'Leases de cola renovados por este worker')
+    METRICS.gauge('worker_api_circuito_estado', API_BREAKER.codigo_estado, 'Circuito de la API: 0 closed, 1 open, 2 half_open')
+    METRICS.gauge('worker_api_circuito_rechazadas', lambda: API_BREAKER.rechazadas, 'Consultas diferidas sin llamar a la API (circuito abierto)')
+    admin = _iniciar_admin(poller, perfilador)
 
     def stop(sig, frame):
-        nonlocal running
-        running = False
+        pipeline.detener()
         logger.info("Deteniendo...")
 
     signal.signal(signal.SIGINT, stop)
@@ -115,89 +534,17 @@ def main():
         signal.signal(signal.SIGTERM, stop)
     if hasattr(signal, 'SIGHUP'):
         signal.signal(signal.SIGHUP, lambda s, f: None)  # Ignorar SIGHUP para no terminar por desconexión
+    _senales_perfil(perfilador)
 
-    ciclos_idle = 0
-    while running:
-        try:
-            _limpiar_cache_fallidas()
-            consultas = obtener_consultas_pendientes(tipo='registraduria', limit=2)
-
-            if consultas:
-                with ThreadPoolExecutor(max_workers=2) as executor:
-                    futures = {executor.submit(procesar_consulta, c): c for c in consultas}
-                    for future in as_completed(futures):
-                        if not running:
-                            try:
-                                executor.shutdown(wait=False, cancel_futures=True)
-                            except TypeError:
-                                executor.shutdown(wait=False)
-                            break
-                        try:
-                            consulta, resultado = future.result()
-                        except CancelledError:
-                            logger.debug("Consulta cancelada")
-                            continue
-                        except Exception as e:
-                            logger.error(f"Error procesando consulta: {e}", exc_info=True)
-                            continue
-                        try:
-                            cola_id = consulta.get('id') or consulta.get('cola_id')
-                            cedula = consulta.get('cedula') or consulta.get('numero_documento', '')
-                            elector_id = consulta.get('elector_id') or consulta.get('electorId')
-                            if cola_id is None:
-                                logger.error(f"Consulta sin id/cola_id: {list(consulta.keys())}")
-                                continue
-                            def _send(ok_flag, err=None, d=None):
-                                return enviar_resultado(cola_id, cedula, ok_flag, datos=d, error=err, elector_id=elector_id)
-
-                            if resultado and resultado.get('status') == 'api_error':
-                                err_msg = resultado.get('error', 'Error API')
-                                ok = _send(False, err=err_msg)
-                                logger.info(f"Enviado (api_error) cedula={cedula} cola_id={cola_id} ok={ok} error={err_msg}")
-                            elif resultado and resultado.get('status') == 'not_found':
-                                if resultado.get('no_censo'):
-                                    ok = _send(True, d=NO_CENSO_DATOS)
-                                    logger.info(f"Enviado (NO CENSO) cedula={cedula} cola_id={cola_id} ok={ok}")
-                                else:
-                                    ok = _send(False, err='Cedula no encontrada')
-                                    logger.info(f"Enviado (not_found) cedula={cedula} cola_id={cola_id} ok={ok}")
-                            elif resultado and any(v for k, v in resultado.items() if k != 'status' and v):
-                                datos = {
-                                    'municipio_votacion': resultado.get('municipio'),
-                                    'departamento_votacion': resultado.get('departamento'),
-                                    'puesto_votacion': resultado.get('puesto'),
-                                    'direccion_puesto': resultado.get('direccion'),
-                                    'mesa': resultado.get('mesa'),
-                                    'zona_votacion': resultado.get('zona'),
-                                }
-                                datos = {k: v for k, v in datos.items() if v is not None}
-                                ok = _send(True, d=datos)
-                                logger.info(f"Enviado (exito) cedula={cedula} cola_id={cola_id} ok={ok} datos={datos}")
-                            else:
-                                ok = _send(False, err='No se encontraron datos')
-                                logger.info(f"Enviado (sin datos) cedula={cedula} cola_id={cola_id} ok={ok} resultado={resultado}")
-                        except Exception as e:
-                            logger.error(f"Error enviando resultado: {e}", exc_info=True)
-                time.sleep(5)
-
-            if not consultas:
-                ciclos_idle += 1
-                if ciclos_idle == 1 or ciclos_idle % 10 == 0:
-                    logger.info("Escuchando... sin consultas pendientes (reintento cada 30s)")
-                time.sleep(30)
-            else:
-                ciclos_idle = 0
-
-        except KeyboardInterrupt:
-            break
-        except SystemExit:
-            raise
-        except BaseException as e:
-            # Capturar cualquier error para mantener ejecución perpetua (solo salir con SIGINT/SIGTERM)
-            logger.error(f"Error (continuando): {type(e).__name__}: {e}", exc_info=True)
-            time.sleep(10)
-
-    logger.info("Worker finalizado")
+    # Cada etapa captura sus propios errores y sigue (ejecución perpetua hasta SIGINT/SIGTERM)
+    try:
+        resumen = pipeline.run()
+    except KeyboardInterrupt:
+        pipeline.detener()
+        resumen = pipeline.resumen_drenado
+    _cerrar(resumen, admin, batcher, outbox, leases)
+    if reintentos is not None:
+        reintentos.close()
 
 
 if __name__ == "__main__":